@@ -2,10 +2,33 @@ import streamlit as st
 import pandas as pd
 import os
 import json
-import hashlib
 from datetime import date, datetime, timedelta
 import calendar
 
+from asesor import metricas
+from asesor.analytics import PERIODOS, RESOLUCIONES, rango_periodo
+from asesor.etiquetas import categoria_sugerida, sugerir
+from asesor.exportacion import FORMATOS, exportar, nombre_archivo
+from asesor.historial import consultar_movimientos
+from asesor.importacion import CAMPOS, importar_csv
+from asesor.recurrentes import FRECUENCIAS
+from asesor.servicio import (
+    CATEGORIAS,
+    TIPOS,
+    actualizar_presupuesto,
+    agregar_recurrente,
+    autenticar,
+    eliminar_recurrente,
+    obtener_indice_usuario,
+    obtener_panel,
+    obtener_recurrentes,
+    obtener_resumen_usuario,
+    registrar_movimientos,
+    registrar_usuario,
+    terminar_recurrente,
+)
+from asesor.storage import load_user
+
 
 # ---------------------------------------------------------
 # Config general
@@ -15,38 +38,56 @@ st.set_page_config(
     layout="wide",
 )
 
-DATA_DIR = "data"
-USERS_FILE = os.path.join(DATA_DIR, "users.json")
-MOV_FILE = os.path.join(DATA_DIR, "movimientos.csv")
-
-os.makedirs(DATA_DIR, exist_ok=True)
+# Días que abarca la tabla de movimientos recientes del panel
+DIAS_RECIENTES = 30
+# Rangos de las gráficas de tendencia -> días hacia atrás (None = todo)
+RANGOS_TENDENCIA = {
+    "Últimos 90 días": 90,
+    "Último año": 365,
+    "Últimos 3 años": 3 * 365,
+    "Todo el historial": None,
+}
+# Filas por página en las tablas de movimientos
+FILAS_POR_PAGINA = 50
+# Movimientos que se ofrecen para descargar desde la app; más allá, la API o
+# python -m asesor.exportacion, que envían el archivo por trozos
+MAX_FILAS_DESCARGA = 200_000
+# Usuarios que ven la página de rendimiento, p. ej. ASESOR_ADMINS="ana,luis"
+ADMINS = {u.strip() for u in os.environ.get("ASESOR_ADMINS", "").split(",") if u.strip()}
 
 # ---------------------------------------------------------
-# Utilidades de almacenamiento
+# Utilidades
 # ---------------------------------------------------------
-def load_users():
-    if not os.path.exists(USERS_FILE):
-        return {}
-    with open(USERS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_users(users):
-    with open(USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump(users, f, ensure_ascii=False, indent=2)
-
-def load_movimientos():
-    if not os.path.exists(MOV_FILE):
-        return pd.DataFrame(columns=["username", "fecha", "tipo", "categoria", "etiqueta", "monto"])
-    df = pd.read_csv(MOV_FILE)
-    if not df.empty:
-        df["fecha"] = pd.to_datetime(df["fecha"])
-    return df
-
-def save_movimientos(df):
-    df.to_csv(MOV_FILE, index=False)
-
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+def tabla_paginada(username, clave, **filtros):
+    """Muestra una página de movimientos con su selector de página.
+
+    Solo se lee y se envía al navegador la página visible. Devuelve el total
+    de movimientos que cumplen los filtros.
+    """
+    estado = f"{clave}_pagina"
+    pagina = st.session_state.get(estado, 1)
+    df, total = consultar_movimientos(username, pagina=pagina - 1, por_pagina=FILAS_POR_PAGINA, **filtros)
+    paginas = max(1, -(-total // FILAS_POR_PAGINA))
+    if pagina > paginas:
+        # Los filtros cambiaron y la página guardada ya no existe
+        pagina = 1
+        st.session_state[estado] = 1
+        df, total = consultar_movimientos(username, pagina=0, por_pagina=FILAS_POR_PAGINA, **filtros)
+
+    if total:
+        with metricas.medir("app.st_dataframe", filas=len(df)):
+            st.dataframe(df, use_container_width=True)
+        col1, col2 = st.columns([1, 3])
+        col1.number_input("Página", min_value=1, max_value=paginas, step=1, key=estado)
+        inicio = (pagina - 1) * FILAS_POR_PAGINA
+        col2.caption(f"Movimientos {inicio + 1:,}–{inicio + len(df):,} de {total:,}")
+    return total
+
+def usar_sugerencia():
+    # Callback de las sugerencias: corre antes del rerun, cuando aún se puede
+    # cambiar el valor del campo de etiqueta
+    st.session_state.reg_etiqueta = st.session_state.reg_sugerencia
+    st.session_state.reg_sugerencia = None
 
 # ---------------------------------------------------------
 # Estado de sesión
@@ -65,8 +106,6 @@ def mostrar_login_register():
 
     tab_login, tab_register = st.tabs(["Iniciar sesión", "Crear cuenta"])
 
-    users = load_users()
-
     with tab_register:
         st.markdown("### Crear nueva cuenta")
         new_user = st.text_input("Nombre de usuario")
@@ -76,18 +115,15 @@ def mostrar_login_register():
         if st.button("Registrarme"):
             if not new_user or not new_pass:
                 st.warning("Debes ingresar usuario y contraseña.")
-            elif new_user in users:
+            elif load_user(new_user) is not None:
                 st.error("Ese nombre de usuario ya existe.")
             elif new_pass != new_pass2:
                 st.error("Las contraseñas no coinciden.")
             else:
-                users[new_user] = {
-                    "password_hash": hash_password(new_pass),
-                    "monthly_income": 0.0,
-                    "created_at": datetime.now().isoformat()
-                }
-                save_users(users)
-                st.success("Cuenta creada correctamente. Ahora puedes iniciar sesión.")
+                if registrar_usuario(new_user, new_pass):
+                    st.success("Cuenta creada correctamente. Ahora puedes iniciar sesión.")
+                else:
+                    st.error("Ese nombre de usuario ya existe.")
 
     with tab_login:
         st.markdown("### Iniciar sesión")
@@ -95,10 +131,10 @@ def mostrar_login_register():
         password = st.text_input("Contraseña", type="password", key="login_pass")
 
         if st.button("Entrar"):
-            if user not in users:
+            if load_user(user) is None:
                 st.error("Usuario no encontrado.")
             else:
-                if hash_password(password) == users[user]["password_hash"]:
+                if autenticar(user, password):
                     st.session_state.logged_in = True
                     st.session_state.username = user
                     st.success(f"Bienvenido, {user} 👋")
@@ -107,134 +143,16 @@ def mostrar_login_register():
                 else:
                     st.error("Contraseña incorrecta.")
 
-# ---------------------------------------------------------
-# Funciones de negocio
-# ---------------------------------------------------------
-def obtener_resumen_usuario(username: str):
-    users = load_users()
-    user_info = users.get(username, {})
-
-    ingreso_mensual = float(user_info.get("monthly_income", 0.0))
-    vivienda = float(user_info.get("housing_budget", 0.0))
-    mercado = float(user_info.get("market_budget", 0.0))
-    transporte_diario = float(user_info.get("transport_daily", 0.0))
-
-    DIAS_MES = 30
-    transporte_mensual = transporte_diario * DIAS_MES
-
-    df_mov = load_movimientos()
-    df_user = df_mov[df_mov["username"] == username].copy()
-
-    hoy = date.today()
-
-    # ================== CASO 1: SIN MOVIMIENTOS ==================
-    if df_user.empty:
-        gastos_mes_total = vivienda + mercado + transporte_mensual
-        porcentaje_gasto = (
-            (gastos_mes_total / ingreso_mensual) * 100
-            if ingreso_mensual > 0
-            else 0.0
-        )
-
-        gasto_hoy = 0.0
-        gastos_semana = 0.0
-
-        # Dinero disponible tras gastos fijos
-        disponible = max(
-            0.0, ingreso_mensual - (vivienda + mercado + transporte_mensual)
-        )
-        ocio_sugerido = disponible * 0.4
-        ahorro_sugerido = disponible * 0.6
-        ahorro_estimado = ahorro_sugerido
-
-        # Sin movimientos, el saldo según movimientos es 0
-        saldo_actual = 0.0
-
-        return (
-            float(ingreso_mensual),
-            float(gasto_hoy),
-            float(gastos_semana),
-            float(ahorro_estimado),
-            float(porcentaje_gasto),
-            df_user,
-            float(vivienda),
-            float(mercado),
-            float(transporte_mensual),
-            float(disponible),
-            float(ocio_sugerido),
-            float(ahorro_sugerido),
-            float(saldo_actual),
-        )
-
-    # ================== CASO 2: CON MOVIMIENTOS ==================
-    df_user["fecha"] = pd.to_datetime(df_user["fecha"])
-    df_user["solo_fecha"] = df_user["fecha"].dt.date
-
-    gastos = df_user[df_user["tipo"] == "Gasto"].copy()
-    ingresos = df_user[df_user["tipo"] == "Ingreso"].copy()
-
-    # Gasto del día
-    gasto_hoy = gastos[gastos["solo_fecha"] == hoy]["monto"].sum()
-
-    # Gasto últimos 7 días
-    hace_7_dias = hoy - timedelta(days=7)
-    gastos_semana = gastos[gastos["solo_fecha"] >= hace_7_dias]["monto"].sum()
-
-    # Gasto del mes actual (por movimientos)
-    mes_actual = hoy.month
-    año_actual = hoy.year
-    gastos_mes_mov = gastos[
-        (gastos["fecha"].dt.month == mes_actual)
-        & (gastos["fecha"].dt.year == año_actual)
-    ]["monto"].sum()
-
-    # Sumamos gastos fijos para el % de gasto
-    gastos_mes_total = gastos_mes_mov + vivienda + mercado + transporte_mensual
-
-    # Dinero disponible tras gastos fijos (para ocio/ahorro)
-    disponible = max(0.0, ingreso_mensual - (vivienda + mercado + transporte_mensual))
-
-    ocio_sugerido = disponible * 0.4
-    ahorro_sugerido = disponible * 0.6
-    ahorro_estimado = ahorro_sugerido
-
-    porcentaje_gasto = (
-        (gastos_mes_total / ingreso_mensual) * 100 if ingreso_mensual > 0 else 0.0
-    )
-
-    # Saldo tipo “banca en línea”: ingresos - gastos registrados
-    total_ingresos_mov = ingresos["monto"].sum()
-    total_gastos_mov = gastos["monto"].sum()
-    saldo_actual = total_ingresos_mov - total_gastos_mov
-
-    return (
-        float(ingreso_mensual),
-        float(gasto_hoy),
-        float(gastos_semana),
-        float(ahorro_estimado),
-        float(porcentaje_gasto),
-        df_user,
-        float(vivienda),
-        float(mercado),
-        float(transporte_mensual),
-        float(disponible),
-        float(ocio_sugerido),
-        float(ahorro_sugerido),
-        float(saldo_actual),
-    )
-
-
-
 # ---------------------------------------------------------
 # UI principal del sistema (ya logueado)
 # ---------------------------------------------------------
 def app_principal():
     username = st.session_state.username
     st.sidebar.markdown(f"**Usuario:** {username}")
-    opcion = st.sidebar.radio(
-        "Menú",
-        ["Panel principal", "Registrar movimiento", "Configurar presupuesto fijo", "Historial de gastos", "Generar gráficas"]
-    )
+    opciones = ["Panel principal", "Registrar movimiento", "Movimientos recurrentes", "Importar extracto", "Configurar presupuesto fijo", "Historial de gastos", "Generar gráficas"]
+    if username in ADMINS:
+        opciones.append("Rendimiento")
+    opcion = st.sidebar.radio("Menú", opciones)
 
 
     if st.sidebar.button("Cerrar sesión"):
@@ -246,237 +164,217 @@ def app_principal():
     if opcion == "Panel principal":
         st.title("Panel financiero")
 
-        (
-            ingreso_mensual,
-            gasto_hoy,
-            gasto_semana,
-            ahorro_estimado,
-            porcentaje_gasto,
-            df_user,
-            vivienda,
-            mercado,
-            transporte_mensual,
-            disponible,
-            ocio_sugerido,
-            ahorro_sugerido,
-            saldo_actual,
-        ) = obtener_resumen_usuario(username)
+        # Del lote nocturno si sigue vigente; si no, se calcula al momento
+        resumen, mensajes, proyeccion_mes = obtener_panel(username)
 
         # Métricas principales (incluye saldo actual)
         col1, col2, col3, col4, col5, col6 = st.columns(6)
-        col1.metric("Ingreso mensual", f"${ingreso_mensual:,.2f}")
-        col2.metric("Gasto hoy", f"${gasto_hoy:,.2f}")
-        col3.metric("Gasto últimos 7 días", f"${gasto_semana:,.2f}")
-        col4.metric("Ahorro sugerido del mes", f"${ahorro_sugerido:,.2f}")
-        col5.metric("% gasto vs ingreso", f"{porcentaje_gasto:.1f}%")
-        col6.metric("Saldo según movimientos", f"${saldo_actual:,.2f}")
+        col1.metric("Ingreso mensual", f"${resumen.ingreso_mensual:,.2f}")
+        col2.metric("Gasto hoy", f"${resumen.gasto_hoy:,.2f}")
+        col3.metric("Gasto últimos 7 días", f"${resumen.gasto_semana:,.2f}")
+        col4.metric("Ahorro sugerido del mes", f"${resumen.ahorro_sugerido:,.2f}")
+        col5.metric("% gasto vs ingreso", f"{resumen.porcentaje_gasto:.1f}%")
+        col6.metric("Saldo según movimientos", f"${resumen.saldo_actual:,.2f}")
 
         st.markdown("### Presupuesto fijo configurado")
 
         c1, c2, c3, c4 = st.columns(4)
-        c1.metric("Vivienda (mensual)", f"${vivienda:,.2f}")
-        c2.metric("Mercado (mensual)", f"${mercado:,.2f}")
-        c3.metric("Transporte (mensual)", f"${transporte_mensual:,.2f}")
-        c4.metric("Dinero disponible", f"${disponible:,.2f}")
+        c1.metric("Vivienda (mensual)", f"${resumen.vivienda:,.2f}")
+        c2.metric("Mercado (mensual)", f"${resumen.mercado:,.2f}")
+        c3.metric("Transporte (mensual)", f"${resumen.transporte_mensual:,.2f}")
+        c4.metric("Dinero disponible", f"${resumen.disponible:,.2f}")
 
         st.markdown("### Recomendación basada en tu dinero disponible")
-        if disponible <= 0:
+        if resumen.disponible <= 0:
             st.error(
                 "Con el ingreso y los gastos fijos configurados, no queda dinero disponible. "
                 "Intenta reducir gastos fijos o aumentar tus ingresos para poder generar ahorro."
             )
         else:
             st.write(
-                f"Después de cubrir vivienda, mercado y transporte, te quedan **${disponible:,.2f}** "
+                f"Después de cubrir vivienda, mercado y transporte, te quedan **${resumen.disponible:,.2f}** "
                 f"para otros gastos. El sistema sugiere destinar aproximadamente:\n\n"
-                f"- **${ocio_sugerido:,.2f}** para ocio y gastos flexibles.\n"
-                f"- **${ahorro_sugerido:,.2f}** para ahorro o fondo de emergencia."
+                f"- **${resumen.ocio_sugerido:,.2f}** para ocio y gastos flexibles.\n"
+                f"- **${resumen.ahorro_sugerido:,.2f}** para ahorro o fondo de emergencia."
             )
 
+        # ----- Proyección a fin de mes -----
+        if proyeccion_mes.gasto_mes > 0 or proyeccion_mes.gasto_diario > 0:
+            st.markdown("### Proyección a fin de mes")
+            p1, p2, p3 = st.columns(3)
+            p1.metric("Gasto proyectado del mes", f"${proyeccion_mes.gasto_proyectado:,.2f}")
+            p2.metric("Ritmo diario reciente", f"${proyeccion_mes.gasto_diario:,.2f}")
+            p3.metric("Saldo proyectado a fin de mes", f"${proyeccion_mes.saldo_fin_mes:,.2f}")
+            if proyeccion_mes.por_categoria:
+                por_categoria = pd.DataFrame.from_dict(
+                    proyeccion_mes.por_categoria, orient="index", columns=["Proyectado", "Presupuesto"]
+                ).rename_axis("Categoría")
+                st.dataframe(por_categoria.sort_values("Proyectado", ascending=False), use_container_width=True)
+
         # ---------------- Recomendaciones 1,2,6,7 ----------------
         st.markdown("### Recomendaciones adicionales")
 
-        if df_user.empty:
-            st.info(
-                "Aún no hay suficientes movimientos registrados para generar recomendaciones adicionales."
-            )
-        else:
-            hoy = date.today()
-            df_gastos = df_user[df_user["tipo"] == "Gasto"].copy()
-            if df_gastos.empty:
-                st.info(
-                    "Aún no has registrado gastos. Cuando registres algunos, el sistema podrá analizar patrones."
-                )
-            else:
-                df_gastos["fecha"] = pd.to_datetime(df_gastos["fecha"])
-                df_gastos["solo_fecha"] = df_gastos["fecha"].dt.date
-
-                mes_actual = hoy.month
-                año_actual = hoy.year
-                dias_mes = calendar.monthrange(año_actual, mes_actual)[1]
-                dia_actual = hoy.day
-
-                # ---- (1) Gastas demasiado rápido en el mes
-                gastos_mes_actual = df_gastos[
-                    (df_gastos["fecha"].dt.month == mes_actual)
-                    & (df_gastos["fecha"].dt.year == año_actual)
-                ]["monto"].sum()
-
-                gastos_fijos = vivienda + mercado + transporte_mensual
-                presupuesto_variable = max(0.0, ingreso_mensual - gastos_fijos)
-
-                if presupuesto_variable > 0 and gastos_mes_actual > 0:
-                    ritmo_gasto = gastos_mes_actual / presupuesto_variable
-                    ritmo_tiempo = dia_actual / dias_mes  # % del mes transcurrido
-
-                    if ritmo_gasto > ritmo_tiempo * 1.2:
-                        st.warning(
-                            "💡 Estás gastando más rápido de lo esperado este mes. "
-                            "Si mantienes este ritmo, podrías quedarte sin dinero disponible antes de final de mes. "
-                            "Intenta reducir gastos discrecionales en los próximos días."
-                        )
-
-                # ---- (2) Categoría más “peligrosa” del mes
-                gastos_cat_hist = df_gastos.groupby("categoria")["monto"].sum()
-                gastos_cat_mes = df_gastos[
-                    (df_gastos["fecha"].dt.month == mes_actual)
-                    & (df_gastos["fecha"].dt.year == año_actual)
-                ].groupby("categoria")["monto"].sum()
-
-                if not gastos_cat_mes.empty:
-                    ratios = {}
-                    n_meses = max(1, df_gastos["fecha"].dt.to_period("M").nunique())
-                    for cat, val_mes in gastos_cat_mes.items():
-                        hist_total = gastos_cat_hist.get(cat, 0.0)
-                        prom_mensual_cat = (
-                            hist_total / n_meses if hist_total > 0 else 0.0
-                        )
-                        if prom_mensual_cat > 0:
-                            ratios[cat] = val_mes / prom_mensual_cat
-
-                    if ratios:
-                        cat_peligrosa = max(ratios, key=ratios.get)
-                        factor = ratios[cat_peligrosa]
-                        if factor > 1.2:
-                            st.info(
-                                f"📊 Este mes tu categoría más exigente es **{cat_peligrosa}**. "
-                                f"Estás gastando aproximadamente un { (factor - 1) * 100:.1f}% más que tu promedio en esa categoría."
-                            )
-
-                # ---- (6) Recomendación diaria
-                gastos_por_dia = (
-                    df_gastos.groupby("solo_fecha")["monto"].sum().sort_index()
-                )
-                if len(gastos_por_dia) >= 3:  # al menos 3 días con datos
-                    prom_diario = gastos_por_dia.mean()
-                    gasto_hoy_val = gastos_por_dia.get(hoy, 0.0)
-
-                    if prom_diario > 0 and gasto_hoy_val > prom_diario * 1.3:
-                        st.warning(
-                            "📅 Hoy has gastado más de lo habitual. "
-                            "Considera no hacer más gastos por hoy para mantenerte dentro de tu presupuesto semanal."
-                        )
-                    elif prom_diario > 0 and 0 < gasto_hoy_val < prom_diario * 0.7:
-                        st.success(
-                            "✅ Hoy has mantenido un buen control de tus gastos. "
-                            "Vas por buen camino para cumplir tus metas semanales."
-                        )
-
-                # ---- (7) Recomendación semanal
-                hace_7 = hoy - timedelta(days=7)
-                hace_14 = hoy - timedelta(days=14)
-
-                gastos_semana_actual = df_gastos[
-                    (df_gastos["solo_fecha"] >= hace_7)
-                ]["monto"].sum()
-                gastos_semana_anterior = df_gastos[
-                    (df_gastos["solo_fecha"] >= hace_14)
-                    & (df_gastos["solo_fecha"] < hace_7)
-                ]["monto"].sum()
-
-                if gastos_semana_anterior > 0 and gastos_semana_actual > 0:
-                    cambio = (
-                        (gastos_semana_actual - gastos_semana_anterior)
-                        / gastos_semana_anterior
-                        * 100
-                    )
-                    if cambio > 10:
-                        st.warning(
-                            f"📈 Esta semana has gastado un {cambio:.1f}% más que la semana pasada. "
-                            "Revisa especialmente los gastos opcionales."
-                        )
-                    elif cambio < -10:
-                        st.success(
-                            f"📉 Esta semana has gastado un {abs(cambio):.1f}% menos que la semana pasada. "
-                            "Sigue así para acercarte a tus metas de ahorro."
-                        )
+        for nivel, mensaje in mensajes:
+            getattr(st, nivel)(mensaje)
 
         # ----- Movimientos recientes -----
         st.markdown("---")
         st.subheader("Movimientos recientes")
 
-        if df_user.empty:
+        hoy = date.today()
+
+        if resumen.movimientos == 0:
             st.info("Aún no has registrado movimientos.")
-        else:
-            df_user = df_user.sort_values("fecha", ascending=False)
-            st.dataframe(
-                df_user[["fecha", "tipo", "categoria", "etiqueta", "monto"]],
-                use_container_width=True,
-            )
+        elif tabla_paginada(username, "recientes", desde=hoy - timedelta(days=DIAS_RECIENTES)) == 0:
+            st.info(f"No tienes movimientos en los últimos {DIAS_RECIENTES} días.")
 
     # -------- REGISTRAR MOVIMIENTO --------
     elif opcion == "Registrar movimiento":
         st.title("Registrar movimiento")
 
-        df_mov = load_movimientos()
+        # La categoría se propone a partir de la etiqueta, que se dibuja
+        # después: se lee de la sesión antes de dibujar el selector
+        escrita = st.session_state.get("reg_etiqueta", "")
+        prevista = categoria_sugerida(username, escrita) if escrita.strip() else None
+        categorias = CATEGORIAS + ([prevista] if prevista and prevista not in CATEGORIAS else [])
 
         col1, col2 = st.columns(2)
         with col1:
             fecha = st.date_input("Fecha", value=date.today())
-            tipo = st.selectbox("Tipo", ["Gasto", "Ingreso"])
-            categoria = st.selectbox(
-                "Categoría",
-                [
-                    "Vivienda",
-                    "Comida",
-                    "Transporte",
-                    "Servicios",
-                    "Ocio",
-                    "Salud",
-                    "Deudas",
-                    "Otros",
-                ],
-            )
+            tipo = st.selectbox("Tipo", TIPOS)
+            # Sin key: al cambiar la categoría prevista el selector se reinicia en ella
+            categoria = st.selectbox("Categoría", categorias, index=categorias.index(prevista) if prevista else 0)
+            if prevista:
+                st.caption(f"Sugerida por tus movimientos anteriores con «{escrita.strip()}».")
         with col2:
             monto = st.number_input("Monto", min_value=0.0, step=10.0)
-            etiqueta = st.text_input("Etiqueta / descripción")
+            etiqueta = st.text_input("Etiqueta / descripción", key="reg_etiqueta")
+            sugerencias = [s for s in sugerir(username, etiqueta) if s != etiqueta.strip()]
+            if sugerencias:
+                st.pills("Sugerencias", sugerencias, key="reg_sugerencia", on_change=usar_sugerencia)
 
         if st.button("Guardar movimiento"):
             if monto <= 0:
                 st.warning("El monto debe ser mayor que 0.")
             else:
-                nuevo = pd.DataFrame(
-                    [
-                        {
-                            "username": username,
-                            "fecha": datetime.combine(fecha, datetime.min.time()),
-                            "tipo": tipo,
-                            "categoria": categoria,
-                            "etiqueta": etiqueta,
-                            "monto": float(monto),
-                        }
-                    ]
-                )
-                df_mov = pd.concat([df_mov, nuevo], ignore_index=True)
-                save_movimientos(df_mov)
+                registrar_movimientos(username, [{
+                    "fecha": fecha,
+                    "tipo": tipo,
+                    "categoria": categoria,
+                    "etiqueta": etiqueta,
+                    "monto": monto,
+                }])
                 st.success("Movimiento guardado correctamente.")
 
+    # -------- MOVIMIENTOS RECURRENTES --------
+    elif opcion == "Movimientos recurrentes":
+        st.title("Movimientos recurrentes")
+        st.caption(
+            "Arriendo, sueldo, suscripciones... Se definen una vez y cuentan en el panel, "
+            "las gráficas y el historial en cada fecha que les toca, sin registrarlos a mano."
+        )
+
+        col1, col2 = st.columns(2)
+        with col1:
+            tipo = st.selectbox("Tipo", TIPOS, key="rec_tipo")
+            categoria = st.selectbox("Categoría", CATEGORIAS, key="rec_categoria")
+            monto = st.number_input("Monto", min_value=0.0, step=10.0, key="rec_monto")
+            etiqueta = st.text_input("Etiqueta / descripción", key="rec_etiqueta")
+        with col2:
+            frecuencia = st.selectbox("Frecuencia", list(FRECUENCIAS), key="rec_frecuencia")
+            inicio = st.date_input("Primera fecha", value=date.today(), key="rec_inicio")
+            con_fin = st.checkbox("Tiene fecha final", key="rec_con_fin")
+            fin = st.date_input("Última fecha", value=inicio, key="rec_fin") if con_fin else None
+
+        if st.button("Guardar recurrente"):
+            try:
+                agregar_recurrente(username, tipo, categoria, monto, frecuencia, inicio, fin, etiqueta)
+            except ValueError as e:
+                st.warning(str(e))
+            else:
+                st.success("Movimiento recurrente guardado.")
+
+        st.markdown("### Tus recurrentes")
+        definiciones = obtener_recurrentes(username)
+        if not definiciones:
+            st.info("Aún no tienes movimientos recurrentes.")
+        for r in definiciones:
+            col1, col2, col3 = st.columns([4, 1, 1])
+            vigencia = f"desde {r.inicio:%d/%m/%Y}" + (f" hasta {r.fin:%d/%m/%Y}" if r.fin else "")
+            col1.markdown(
+                f"**{r.etiqueta or r.categoria}** · {r.tipo} de ${r.monto:,.2f} · "
+                f"{r.frecuencia.lower()} {vigencia}"
+            )
+            # Terminar conserva las ocurrencias pasadas; eliminar las borra todas
+            if (r.fin is None or r.fin > date.today()) and col2.button("Terminar hoy", key=f"rec_terminar_{r.id}"):
+                terminar_recurrente(username, r.id)
+                st.rerun()
+            if col3.button("Eliminar", key=f"rec_eliminar_{r.id}"):
+                eliminar_recurrente(username, r.id)
+                st.rerun()
+
+    # -------- IMPORTAR EXTRACTO --------
+    elif opcion == "Importar extracto":
+        st.title("Importar extracto bancario")
+
+        archivo = st.file_uploader("Archivo CSV exportado por tu banco", type=["csv"])
+        col1, col2, col3, col4 = st.columns(4)
+        sep = col1.selectbox("Separador", [",", ";", "\t"], format_func=lambda s: "tabulador" if s == "\t" else s)
+        decimal = col2.selectbox("Separador decimal", [".", ","])
+        encoding = col3.selectbox("Codificación", ["utf-8", "latin-1"])
+        dayfirst = col4.checkbox("Fechas DD/MM/AAAA", value=True)
+
+        if archivo is not None:
+            try:
+                muestra = pd.read_csv(archivo, sep=sep, encoding=encoding, nrows=5, dtype=str)
+            except (ValueError, UnicodeDecodeError) as e:
+                st.error(f"No se pudo leer el archivo: {e}")
+            else:
+                st.markdown("### Vista previa")
+                st.dataframe(muestra, use_container_width=True)
+
+                st.markdown("### ¿Qué columna corresponde a cada dato?")
+                st.caption(
+                    "Fecha y monto son obligatorios. Sin columna de tipo, los montos "
+                    "negativos se registran como gastos y los positivos como ingresos."
+                )
+                opciones = ["(ninguna)"] + list(muestra.columns)
+                mapeo = {}
+                for col, campo in zip(st.columns(len(CAMPOS)), CAMPOS):
+                    elegida = col.selectbox(campo.capitalize(), opciones, key=f"importar_{campo}")
+                    mapeo[campo] = None if elegida == "(ninguna)" else elegida
+
+                if st.button("Importar movimientos"):
+                    archivo.seek(0)
+                    progreso = st.empty()
+                    try:
+                        stats = importar_csv(
+                            archivo,
+                            username,
+                            mapeo,
+                            sep=sep,
+                            decimal=decimal,
+                            dayfirst=dayfirst,
+                            encoding=encoding,
+                            al_avanzar=lambda s: progreso.write(f"{s['leidas']:,} filas leídas..."),
+                        )
+                    except ValueError as e:
+                        st.warning(str(e))
+                    else:
+                        progreso.empty()
+                        st.success(
+                            f"Importados {stats['nuevas']:,} movimientos nuevos de {stats['leidas']:,} filas."
+                        )
+                        if stats["duplicadas"]:
+                            st.info(f"Se omitieron {stats['duplicadas']:,} movimientos que ya estaban registrados.")
+                        if stats["invalidas"]:
+                            st.warning(f"Se descartaron {stats['invalidas']:,} filas sin fecha o monto válidos.")
+
     # -------- CONFIG PRESUPUESTO FIJO --------
     elif opcion == "Configurar presupuesto fijo":
         st.title("Configuración de presupuesto fijo")
 
-        users = load_users()
-        user_info = users.get(username, {"monthly_income": 0.0})
+        user_info = load_user(username) or {"monthly_income": 0.0}
 
         ingreso_actual = float(user_info.get("monthly_income", 0.0))
         vivienda_actual = float(user_info.get("housing_budget", 0.0))
@@ -523,82 +421,224 @@ def app_principal():
         )
 
         if st.button("Guardar configuración"):
-            users[username]["monthly_income"] = float(nuevo_ingreso)
-            users[username]["housing_budget"] = float(gasto_vivienda)
-            users[username]["market_budget"] = float(gasto_mercado)
-            users[username]["transport_daily"] = float(gasto_transporte_diario)
-            save_users(users)
+            actualizar_presupuesto(
+                username, nuevo_ingreso, gasto_vivienda, gasto_mercado, gasto_transporte_diario
+            )
             st.success("Presupuesto fijo actualizado correctamente.")
 
-    # -------- HISTORIAL DE GASTOS DEL MES --------
+    # -------- HISTORIAL DE GASTOS --------
     elif opcion == "Historial de gastos":
-        st.title("Historial de Gastos del Mes")
-
-        # Cargar movimientos
-        df_mov = load_movimientos()
-        df_user = df_mov[df_mov["username"] == username].copy()
+        # El título depende de los filtros, que se dibujan debajo
+        titulo = st.empty()
 
         hoy = date.today()
-        mes_actual = hoy.month
-        año_actual = hoy.year
-
-        # Filtrar movimientos del mes actual
-        df_mes = df_user[(df_user["fecha"].dt.month == mes_actual) & (df_user["fecha"].dt.year == año_actual)]
-
-        if df_mes.empty:
-            st.info("No tienes movimientos registrados este mes.")
+        inicio_mes = hoy.replace(day=1)
+        fin_mes = hoy.replace(day=calendar.monthrange(hoy.year, hoy.month)[1])
+
+        # Filtros y orden; la consulta devuelve solo la página visible
+        col1, col2, col3 = st.columns(3)
+        periodo = col1.selectbox("Período", PERIODOS)
+        if periodo == "Personalizado":
+            rango = col1.date_input("Fechas", value=(inicio_mes, fin_mes))
+            desde, hasta = (rango[0], rango[-1]) if rango else (inicio_mes, fin_mes)
         else:
-            df_mes_sorted = df_mes.sort_values("fecha", ascending=False)
-            st.dataframe(df_mes_sorted[["fecha", "tipo", "categoria", "etiqueta", "monto"]])
+            desde, hasta = rango_periodo(periodo, hoy)
+        tipo = col2.selectbox("Tipo", ["Todos", "Gasto", "Ingreso"])
+        categorias = col3.multiselect("Categorías", CATEGORIAS)
+        col4, col5, col6 = st.columns(3)
+        texto = col4.text_input("Buscar en la etiqueta")
+        orden = col5.selectbox("Ordenar por", ["fecha", "monto"])
+        descendente = col6.selectbox("Dirección", ["Descendente", "Ascendente"]) == "Descendente"
+        que = {"Todos": "movimientos", "Gasto": "gastos", "Ingreso": "ingresos"}[tipo]
+        cuando = f"del {desde:%d/%m/%Y} al {hasta:%d/%m/%Y}" if periodo == "Personalizado" else periodo.lower()
+        titulo.title(f"Historial de {que}: {cuando}")
+
+        filtrando = tipo != "Todos" or categorias or texto or (desde, hasta) != (inicio_mes, fin_mes)
+        total = tabla_paginada(
+            username,
+            "historial",
+            desde=desde,
+            hasta=hasta,
+            tipo=None if tipo == "Todos" else tipo,
+            categorias=categorias,
+            texto=texto.strip(),
+            orden=orden,
+            descendente=descendente,
+        )
+        if total == 0:
+            if filtrando:
+                st.info("No hay movimientos que cumplan los filtros.")
+            else:
+                st.info("No tienes movimientos registrados este mes.")
 
-        # Sumar el total de gastos e ingresos del mes
-        total_gastos = df_mes[df_mes["tipo"] == "Gasto"]["monto"].sum()
-        total_ingresos = df_mes[df_mes["tipo"] == "Ingreso"]["monto"].sum()
+        # Totales del período elegido y del anterior comparable
+        actual, anterior = obtener_indice_usuario(username).comparar(desde, hasta)
+        total_gastos = actual.gasto
+        total_ingresos = actual.ingreso
 
-        st.markdown("### Resumen del Mes")
+        st.markdown("### Resumen del Mes" if periodo == "Este mes" else "### Resumen del período")
         st.write(f"**Total de Gastos:** ${total_gastos:,.2f}")
         st.write(f"**Total de Ingresos:** ${total_ingresos:,.2f}")
         st.write(f"**Balance (Ingresos - Gastos):** ${total_ingresos - total_gastos:,.2f}")
 
+        st.markdown(
+            f"### Comparación con el período anterior "
+            f"({anterior.desde:%d/%m/%Y} – {anterior.hasta:%d/%m/%Y})"
+        )
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric(
+            "Gastos", f"${actual.gasto:,.2f}",
+            delta=f"{actual.gasto - anterior.gasto:+,.2f}", delta_color="inverse",
+        )
+        c2.metric("Ingresos", f"${actual.ingreso:,.2f}", delta=f"{actual.ingreso - anterior.ingreso:+,.2f}")
+        c3.metric("Balance", f"${actual.balance:,.2f}", delta=f"{actual.balance - anterior.balance:+,.2f}")
+        c4.metric(
+            "Gasto diario promedio", f"${actual.gasto_diario:,.2f}",
+            delta=f"{actual.gasto_diario - anterior.gasto_diario:+,.2f}", delta_color="inverse",
+        )
+        if actual.gastos_cat or anterior.gastos_cat:
+            por_categoria = pd.DataFrame({
+                "Período": pd.Series(actual.gastos_cat, dtype=float),
+                "Anterior": pd.Series(anterior.gastos_cat, dtype=float),
+            }).fillna(0.0)
+            por_categoria["Variación"] = por_categoria["Período"] - por_categoria["Anterior"]
+            st.dataframe(
+                por_categoria.rename_axis("Categoría").sort_values("Período", ascending=False),
+                use_container_width=True,
+            )
+
+        st.markdown("### Exportar movimientos")
+        col1, col2 = st.columns(2)
+        formato = col1.radio("Formato", list(FORMATOS), horizontal=True, format_func=str.upper)
+        solo_periodo = col2.checkbox(f"Solo del {desde:%d/%m/%Y} al {hasta:%d/%m/%Y}")
+        rango_exportar = (desde, hasta) if solo_periodo else (None, None)
+        # download_button no envía por trozos: el archivo entero pasa por
+        # memoria. Con una función se arma solo al hacer clic, pero el tamaño
+        # se acota con los conteos del índice (que incluyen los recurrentes)
+        filas = (
+            actual if solo_periodo else obtener_indice_usuario(username).totales(date.min, date.max)
+        ).movimientos
+        if filas > MAX_FILAS_DESCARGA:
+            st.info(
+                f"Son {filas:,} movimientos: elige un período más corto o usa "
+                "la exportación de la API para el historial completo."
+            )
+        else:
+            st.download_button(
+                "Descargar",
+                data=lambda: b"".join(exportar(username, formato, *rango_exportar)),
+                file_name=nombre_archivo(username, formato, *rango_exportar),
+                mime=FORMATOS[formato],
+            )
+
     # -------- GENERAR GRÁFICAS --------
     elif opcion == "Generar gráficas":
         st.title("Generar Gráficas de Gastos e Ingresos")
 
-        # Cargar movimientos
-        df_mov = load_movimientos()
-        df_user = df_mov[df_mov["username"] == username].copy()
-
-        hoy = date.today()
-        mes_actual = hoy.month
-        año_actual = hoy.year
-
-        # Filtrar movimientos del mes actual
-        df_mes = df_user[(df_user["fecha"].dt.month == mes_actual) & (df_user["fecha"].dt.year == año_actual)]
+        # Las gráficas salen de los totales del resumen, sin leer movimientos
+        resumen = obtener_resumen_usuario(username)
 
-        if df_mes.empty:
+        if resumen.movimientos_mes == 0:
             st.info("No tienes movimientos registrados este mes para generar gráficas.")
         else:
             # 1. Gráfico de gastos por categoría
-            gastos_categoria = df_mes[df_mes["tipo"] == "Gasto"].groupby("categoria")["monto"].sum().sort_values()
+            gastos_categoria = (
+                pd.Series(resumen.gastos_cat_mes, name="monto", dtype=float)
+                .rename_axis("categoria")
+                .sort_values()
+            )
 
             st.subheader("Gastos por Categoría")
             st.bar_chart(gastos_categoria)
 
             # 2. Gráfico de ingresos vs gastos
-            ingresos = df_mes[df_mes["tipo"] == "Ingreso"]["monto"].sum()
-            gastos = df_mes[df_mes["tipo"] == "Gasto"]["monto"].sum()
+            ingresos = resumen.ingreso_mes
+            gastos = resumen.gasto_mes
 
             st.subheader("Ingresos vs Gastos")
             st.write(f"**Total Ingresos:** ${ingresos:,.2f}")
             st.write(f"**Total Gastos:** ${gastos:,.2f}")
             st.write(f"**Balance:** ${ingresos - gastos:,.2f}")
 
+        # 3. Tendencias: series ya agregadas por día y reducidas a lo que la
+        # gráfica puede dibujar, por largo que sea el historial
+        indice = obtener_indice_usuario(username)
+        if indice.primer_dia is not None:
+            st.subheader("Tendencias")
+            col1, col2 = st.columns(2)
+            rango = col1.selectbox("Rango", list(RANGOS_TENDENCIA), index=1)
+            resolucion = col2.radio("Resolución", list(RESOLUCIONES), horizontal=True)
+
+            hoy = date.today()
+            dias = RANGOS_TENDENCIA[rango]
+            desde = indice.primer_dia if dias is None else max(indice.primer_dia, hoy - timedelta(days=dias - 1))
+            serie = indice.serie(min(desde, hoy), hoy, RESOLUCIONES[resolucion])
+            if serie.periodos_por_punto > 1:
+                unidad = {"Diaria": "días", "Semanal": "semanas", "Mensual": "meses"}[resolucion]
+                st.caption(f"Cada punto suma {serie.periodos_por_punto} {unidad}.")
+
+            st.markdown("**Ingresos vs gastos**")
+            st.line_chart(serie.flujo[["Ingresos", "Gastos"]])
+            st.markdown("**Balance**")
+            st.bar_chart(serie.flujo["Balance"])
+            if not serie.categorias.empty:
+                st.markdown("**Gastos por categoría**")
+                st.area_chart(serie.categorias)
+
+    # -------- RENDIMIENTO (solo administradores) --------
+    elif opcion == "Rendimiento" and username in ADMINS:
+        st.title("Rendimiento")
+        st.caption(
+            "Latencias de las funciones de datos y análisis en este proceso, "
+            "sumando todas las sesiones. Los percentiles son el límite del cubo "
+            "del histograma en que caen."
+        )
+
+        informe = metricas.exportar()
+        if informe["metricas"]:
+            tabla = pd.DataFrame.from_dict(informe["metricas"], orient="index").drop(columns="cubos")
+            st.dataframe(
+                tabla.rename_axis("Función").sort_values("total_ms", ascending=False),
+                use_container_width=True,
+            )
+        else:
+            st.info("Todavía no hay mediciones.")
+
+        st.markdown("### Cachés")
+        st.dataframe(pd.DataFrame(informe["caches"]).T, use_container_width=True)
+
+        col1, col2 = st.columns(2)
+        col1.download_button(
+            "Exportar JSON",
+            json.dumps(informe, ensure_ascii=False, indent=2),
+            file_name=f"metricas-{datetime.now():%Y%m%d-%H%M%S}.json",
+            mime="application/json",
+        )
+        if col2.button("Reiniciar métricas"):
+            metricas.reiniciar()
+            st.rerun()
+
+        st.markdown("### Perfil de una ejecución")
+        if st.button("Perfilar la próxima ejecución"):
+            st.session_state.perfilar = True
+            st.info("Se perfilará la siguiente interacción; vuelve a esta página para ver el resultado.")
+        if st.session_state.get("ultimo_perfil"):
+            st.code(st.session_state.ultimo_perfil, language="text")
+
 
 
 # ---------------------------------------------------------
 # Punto de entrada de la app
 # ---------------------------------------------------------
-if not st.session_state.logged_in:
-    mostrar_login_register()
-else:
-    app_principal()
+# Con "Perfilar la próxima ejecución", esta ejecución completa pasa por
+# cProfile; el finally guarda el perfil también si termina con st.rerun()
+perfil = None
+try:
+    with metricas.perfilar(st.session_state.pop("perfilar", False)) as perfil, metricas.medir("app.rerun"):
+        if not st.session_state.logged_in:
+            mostrar_login_register()
+        else:
+            app_principal()
+finally:
+    if perfil is not None and perfil.texto:
+        st.session_state.ultimo_perfil = perfil.texto
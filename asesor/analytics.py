@@ -0,0 +1,440 @@
+import calendar
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from asesor import metricas, recurrentes
+
+
+DIAS_MES = 30
+
+
+@dataclass(slots=True)
+class ResumenUsuario:
+    """Métricas del panel y datos de entrada de las recomendaciones."""
+
+    ingreso_mensual: float = 0.0
+    vivienda: float = 0.0
+    mercado: float = 0.0
+    transporte_mensual: float = 0.0
+    # Movimientos registrados
+    movimientos: int = 0
+    total_gastos: float = 0.0
+    total_ingresos: float = 0.0
+    gasto_hoy: float = 0.0
+    gasto_semana: float = 0.0
+    gasto_semana_anterior: float = 0.0
+    movimientos_mes: int = 0
+    gasto_mes: float = 0.0
+    ingreso_mes: float = 0.0
+    dias_con_gasto: int = 0
+    meses_con_gasto: int = 0
+    # {categoria: monto}, ordenados por categoría
+    gastos_cat_mes: dict = field(default_factory=dict)
+    gastos_cat_hist: dict = field(default_factory=dict)
+
+    @property
+    def gastos_fijos(self):
+        return self.vivienda + self.mercado + self.transporte_mensual
+
+    @property
+    def disponible(self):
+        # Dinero disponible tras gastos fijos (para ocio/ahorro)
+        return max(0.0, self.ingreso_mensual - self.gastos_fijos)
+
+    @property
+    def ocio_sugerido(self):
+        return self.disponible * 0.4
+
+    @property
+    def ahorro_sugerido(self):
+        return self.disponible * 0.6
+
+    @property
+    def ahorro_estimado(self):
+        return self.ahorro_sugerido
+
+    @property
+    def porcentaje_gasto(self):
+        # Gastos del mes por movimientos más gastos fijos, sobre el ingreso
+        if self.ingreso_mensual <= 0:
+            return 0.0
+        return (self.gasto_mes + self.gastos_fijos) / self.ingreso_mensual * 100
+
+    @property
+    def saldo_actual(self):
+        # Saldo tipo “banca en línea”: ingresos - gastos registrados
+        return self.total_ingresos - self.total_gastos
+
+    @property
+    def prom_diario(self):
+        # Promedio de gasto en los días con algún gasto
+        return self.total_gastos / self.dias_con_gasto if self.dias_con_gasto else 0.0
+
+
+@metricas.medido()
+def resumir(df_rollup, user_info, hoy=None):
+    """Calcula todas las métricas en una sola pasada sobre los totales diarios.
+
+    `df_rollup` tiene columnas dia, tipo, categoria, monto y n (ver
+    asesor.rollups); `user_info` es el registro del usuario en users.json.
+    Los movimientos recurrentes del usuario cuentan hasta `hoy` incluido.
+    """
+    hoy = hoy or date.today()
+    df_rollup = recurrentes.combinar(df_rollup, recurrentes.definiciones(user_info), hoy)
+    r = ResumenUsuario(
+        ingreso_mensual=float(user_info.get("monthly_income", 0.0)),
+        vivienda=float(user_info.get("housing_budget", 0.0)),
+        mercado=float(user_info.get("market_budget", 0.0)),
+        transporte_mensual=float(user_info.get("transport_daily", 0.0)) * DIAS_MES,
+    )
+    if df_rollup.empty:
+        return r
+
+    dias = df_rollup["dia"].to_numpy().astype("datetime64[D]")
+    monto = df_rollup["monto"].to_numpy(dtype=float)
+    n = df_rollup["n"].to_numpy()
+    tipo = df_rollup["tipo"].to_numpy()
+    es_gasto = tipo == "Gasto"
+    es_ingreso = tipo == "Ingreso"
+
+    hoy64 = np.datetime64(hoy, "D")
+    hace_7 = hoy64 - np.timedelta64(7, "D")
+    hace_14 = hoy64 - np.timedelta64(14, "D")
+    inicio_mes = np.datetime64(hoy.replace(day=1), "D")
+    fin_mes = inicio_mes + np.timedelta64(calendar.monthrange(hoy.year, hoy.month)[1], "D")
+    en_mes = (dias >= inicio_mes) & (dias < fin_mes)
+
+    gasto = np.where(es_gasto, monto, 0.0)
+    ingreso = np.where(es_ingreso, monto, 0.0)
+
+    r.movimientos = int(n.sum())
+    r.total_gastos = float(gasto.sum())
+    r.total_ingresos = float(ingreso.sum())
+    r.gasto_hoy = float(gasto[dias == hoy64].sum())
+    r.gasto_semana = float(gasto[dias >= hace_7].sum())
+    r.gasto_semana_anterior = float(gasto[(dias >= hace_14) & (dias < hace_7)].sum())
+    r.movimientos_mes = int(n[en_mes].sum())
+    r.gasto_mes = float(gasto[en_mes].sum())
+    r.ingreso_mes = float(ingreso[en_mes].sum())
+
+    dias_gasto = dias[es_gasto]
+    r.dias_con_gasto = int(np.unique(dias_gasto).size)
+    r.meses_con_gasto = int(np.unique(dias_gasto.astype("datetime64[M]")).size)
+
+    # Totales por categoría (histórico y del mes) con un único np.unique
+    categorias, idx = np.unique(
+        df_rollup["categoria"].to_numpy()[es_gasto].astype(str), return_inverse=True
+    )
+    k = len(categorias)
+    hist = np.bincount(idx, weights=monto[es_gasto], minlength=k)
+    mes = np.bincount(idx, weights=np.where(en_mes[es_gasto], monto[es_gasto], 0.0), minlength=k)
+    n_mes = np.bincount(idx, weights=np.where(en_mes[es_gasto], n[es_gasto], 0), minlength=k)
+    r.gastos_cat_hist = {str(c): float(v) for c, v in zip(categorias, hist)}
+    r.gastos_cat_mes = {str(c): float(v) for c, v, m in zip(categorias, mes, n_mes) if m > 0}
+    return r
+
+
+# ---------------------------------------------------------
+# Totales de cualquier período
+# ---------------------------------------------------------
+PERIODOS = [
+    "Este mes",
+    "Mes anterior",
+    "Este trimestre",
+    "Trimestre anterior",
+    "Este año",
+    "Últimos 90 días",
+    "Personalizado",
+]
+
+
+def _sumar_meses(dia, meses):
+    # Primer día del mes que queda `meses` después (o antes) del de `dia`
+    total = dia.year * 12 + dia.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+def _fin_de_mes(dia):
+    return dia.replace(day=calendar.monthrange(dia.year, dia.month)[1])
+
+def rango_periodo(nombre, hoy=None):
+    """(desde, hasta) de uno de los PERIODOS predefinidos, ambos incluidos."""
+    hoy = hoy or date.today()
+    mes = hoy.replace(day=1)
+    trimestre = _sumar_meses(mes, -((hoy.month - 1) % 3))
+    if nombre == "Este mes":
+        return mes, _fin_de_mes(hoy)
+    if nombre == "Mes anterior":
+        return _sumar_meses(mes, -1), mes - timedelta(days=1)
+    if nombre == "Este trimestre":
+        return trimestre, _fin_de_mes(_sumar_meses(trimestre, 2))
+    if nombre == "Trimestre anterior":
+        return _sumar_meses(trimestre, -3), trimestre - timedelta(days=1)
+    if nombre == "Este año":
+        return date(hoy.year, 1, 1), date(hoy.year, 12, 31)
+    if nombre == "Últimos 90 días":
+        return hoy - timedelta(days=89), hoy
+    raise ValueError(f"Período desconocido: {nombre}")
+
+def periodo_anterior(desde, hasta):
+    """Período inmediatamente anterior y comparable a [desde, hasta].
+
+    Si el rango son meses completos se retrocede ese número de meses (un
+    trimestre se compara con el trimestre anterior); si no, la misma
+    cantidad de días.
+    """
+    if desde.day == 1 and hasta == _fin_de_mes(hasta):
+        meses = (hasta.year - desde.year) * 12 + hasta.month - desde.month + 1
+        return _sumar_meses(desde, -meses), desde - timedelta(days=1)
+    dias = (hasta - desde).days + 1
+    return desde - timedelta(days=dias), desde - timedelta(days=1)
+
+
+@dataclass(slots=True)
+class TotalesPeriodo:
+    desde: date
+    hasta: date
+    gasto: float = 0.0
+    ingreso: float = 0.0
+    movimientos: int = 0
+    dias_con_gasto: int = 0
+    # {categoria: monto}, solo categorías con gastos en el período
+    gastos_cat: dict = field(default_factory=dict)
+
+    @property
+    def balance(self):
+        return self.ingreso - self.gasto
+
+    @property
+    def dias(self):
+        return (self.hasta - self.desde).days + 1
+
+    @property
+    def gasto_diario(self):
+        # Sobre los días ya transcurridos: un período en curso no se diluye
+        dias = (min(self.hasta, date.today()) - self.desde).days + 1
+        return self.gasto / dias if dias > 0 else 0.0
+
+
+# Resolución de las series de las gráficas -> unidad de numpy de sus períodos
+RESOLUCIONES = {"Diaria": "D", "Semanal": "W", "Mensual": "M"}
+# Puntos por serie que se envían al navegador como máximo
+MAX_PUNTOS = 400
+
+
+@dataclass(slots=True)
+class Serie:
+    # Ingresos, Gastos y Balance por punto, indexados por el día en que empieza
+    flujo: pd.DataFrame
+    # Gasto de cada categoría por punto (mismo índice)
+    categorias: pd.DataFrame
+    # Períodos de la resolución pedida que suma cada punto
+    periodos_por_punto: int = 1
+
+
+class IndiceTemporal:
+    """Sumas acumuladas por día de los totales de un usuario.
+
+    El total de cualquier rango sale de dos búsquedas binarias sobre los días
+    ordenados y una resta, sin recorrer los movimientos.
+    """
+
+    @metricas.medido()
+    def __init__(self, df_rollup):
+        dias = df_rollup["dia"].to_numpy().astype("datetime64[D]")
+        self.dias, inversa = np.unique(dias, return_inverse=True)
+        monto = df_rollup["monto"].to_numpy(dtype=float)
+        n = df_rollup["n"].to_numpy()
+        es_gasto = df_rollup["tipo"].to_numpy() == "Gasto"
+        es_ingreso = df_rollup["tipo"].to_numpy() == "Ingreso"
+        d = len(self.dias)
+
+        def por_dia(valores):
+            return np.bincount(inversa, weights=valores, minlength=d)
+
+        def acumulado(valores_dia):
+            # Con un cero delante: el total de los días [i, j) es acum[j] - acum[i]
+            return np.concatenate(([0], np.cumsum(valores_dia)))
+
+        gasto_dia = por_dia(np.where(es_gasto, monto, 0.0))
+        self.gasto = acumulado(gasto_dia)
+        self.ingreso = acumulado(por_dia(np.where(es_ingreso, monto, 0.0)))
+        self.n = acumulado(por_dia(n))
+        self.dias_gasto = acumulado(por_dia(es_gasto) > 0)
+
+        # Matriz día x categoría (solo gastos) con montos y conteos acumulados
+        cats = df_rollup["categoria"].to_numpy()[es_gasto]
+        self.categorias, cat_idx = np.unique(cats, return_inverse=True)
+        forma = (d + 1, len(self.categorias))
+        self.gasto_cat = np.zeros(forma)
+        self.n_cat = np.zeros(forma)
+        if len(self.categorias):
+            celda = inversa[es_gasto] * len(self.categorias) + cat_idx
+            tam = d * len(self.categorias)
+            self.gasto_cat[1:] = np.bincount(celda, weights=monto[es_gasto], minlength=tam).reshape(d, -1)
+            self.n_cat[1:] = np.bincount(celda, weights=n[es_gasto], minlength=tam).reshape(d, -1)
+            self.gasto_cat = np.cumsum(self.gasto_cat, axis=0)
+            self.n_cat = np.cumsum(self.n_cat, axis=0)
+
+    def totales(self, desde, hasta):
+        i = int(np.searchsorted(self.dias, np.datetime64(desde, "D"), side="left"))
+        j = int(np.searchsorted(self.dias, np.datetime64(hasta, "D"), side="right"))
+        j = max(i, j)
+        gasto_cat = self.gasto_cat[j] - self.gasto_cat[i]
+        n_cat = self.n_cat[j] - self.n_cat[i]
+        return TotalesPeriodo(
+            desde=desde,
+            hasta=hasta,
+            gasto=float(self.gasto[j] - self.gasto[i]),
+            ingreso=float(self.ingreso[j] - self.ingreso[i]),
+            movimientos=int(round(self.n[j] - self.n[i])),
+            dias_con_gasto=int(self.dias_gasto[j] - self.dias_gasto[i]),
+            gastos_cat={
+                str(c): float(v)
+                for c, v, k in zip(self.categorias, gasto_cat, n_cat)
+                if k > 0
+            },
+        )
+
+    @metricas.medido()
+    def comparar(self, desde, hasta):
+        """(totales del período, totales del período anterior comparable)."""
+        return self.totales(desde, hasta), self.totales(*periodo_anterior(desde, hasta))
+
+    @property
+    def primer_dia(self):
+        return self.dias[0].astype(date) if len(self.dias) else None
+
+    @property
+    def nbytes(self):
+        arrays = (self.dias, self.gasto, self.ingreso, self.n, self.dias_gasto, self.gasto_cat, self.n_cat)
+        return sum(a.nbytes for a in arrays)
+
+    @metricas.medido()
+    def serie(self, desde, hasta, resolucion="D", max_puntos=MAX_PUNTOS):
+        """Totales de [desde, hasta] por día ("D"), semana ("W") o mes ("M").
+
+        Si salen más de `max_puntos` períodos se suman de a k consecutivos:
+        la gráfica nunca recibe más puntos de los que puede dibujar. Cada punto
+        es una resta de acumulados, así que el costo no depende de cuántos
+        días abarque.
+        """
+        desde = np.datetime64(desde, "D")
+        fin = np.datetime64(hasta, "D") + 1
+        if resolucion == "W":
+            # Semanas de lunes a domingo (el 1970-01-01 fue jueves)
+            lunes = desde - (desde.astype(np.int64) + 3) % 7
+            bordes = np.arange(lunes, fin, 7)
+        else:
+            bordes = np.arange(
+                desde.astype(f"datetime64[{resolucion}]"), fin.astype(f"datetime64[{resolucion}]") + 1
+            ).astype("datetime64[D]")
+        # El primer y el último período pueden quedar cortados por el rango
+        bordes = np.unique(np.clip(bordes, desde, fin))
+        bordes = np.concatenate((bordes[bordes < fin], [fin]))
+
+        k = max(1, -(-(len(bordes) - 1) // max_puntos))
+        if k > 1:
+            bordes = np.concatenate((bordes[:-1][::k], bordes[-1:]))
+        pos = np.searchsorted(self.dias, bordes, side="left")
+        indice = pd.DatetimeIndex(bordes[:-1].astype("datetime64[ns]"), name="fecha")
+        gasto = np.diff(self.gasto[pos])
+        ingreso = np.diff(self.ingreso[pos])
+        flujo = pd.DataFrame(
+            {"Ingresos": ingreso, "Gastos": gasto, "Balance": ingreso - gasto}, index=indice
+        )
+        categorias = pd.DataFrame(
+            np.diff(self.gasto_cat[pos], axis=0), index=indice, columns=[str(c) for c in self.categorias]
+        )
+        return Serie(flujo, categorias, k)
+
+
+# ---------------------------------------------------------
+# Recomendaciones 1, 2, 6 y 7
+# ---------------------------------------------------------
+@metricas.medido()
+def recomendaciones(r, hoy=None):
+    """Lista de (nivel, mensaje); nivel es "info", "warning" o "success"."""
+    hoy = hoy or date.today()
+    if r.movimientos == 0:
+        return [(
+            "info",
+            "Aún no hay suficientes movimientos registrados para generar recomendaciones adicionales.",
+        )]
+    if r.dias_con_gasto == 0:
+        return [(
+            "info",
+            "Aún no has registrado gastos. Cuando registres algunos, el sistema podrá analizar patrones.",
+        )]
+
+    mensajes = []
+    dias_mes = calendar.monthrange(hoy.year, hoy.month)[1]
+
+    # ---- (1) Gastas demasiado rápido en el mes
+    presupuesto_variable = r.disponible
+    if presupuesto_variable > 0 and r.gasto_mes > 0:
+        ritmo_gasto = r.gasto_mes / presupuesto_variable
+        ritmo_tiempo = hoy.day / dias_mes  # % del mes transcurrido
+
+        if ritmo_gasto > ritmo_tiempo * 1.2:
+            mensajes.append((
+                "warning",
+                "💡 Estás gastando más rápido de lo esperado este mes. "
+                "Si mantienes este ritmo, podrías quedarte sin dinero disponible antes de final de mes. "
+                "Intenta reducir gastos discrecionales en los próximos días.",
+            ))
+
+    # ---- (2) Categoría más “peligrosa” del mes
+    if r.gastos_cat_mes:
+        ratios = {}
+        n_meses = max(1, r.meses_con_gasto)
+        for cat, val_mes in r.gastos_cat_mes.items():
+            hist_total = r.gastos_cat_hist.get(cat, 0.0)
+            prom_mensual_cat = hist_total / n_meses if hist_total > 0 else 0.0
+            if prom_mensual_cat > 0:
+                ratios[cat] = val_mes / prom_mensual_cat
+
+        if ratios:
+            cat_peligrosa = max(ratios, key=ratios.get)
+            factor = ratios[cat_peligrosa]
+            if factor > 1.2:
+                mensajes.append((
+                    "info",
+                    f"📊 Este mes tu categoría más exigente es **{cat_peligrosa}**. "
+                    f"Estás gastando aproximadamente un { (factor - 1) * 100:.1f}% más que tu promedio en esa categoría.",
+                ))
+
+    # ---- (6) Recomendación diaria
+    if r.dias_con_gasto >= 3:  # al menos 3 días con datos
+        prom_diario = r.prom_diario
+        if prom_diario > 0 and r.gasto_hoy > prom_diario * 1.3:
+            mensajes.append((
+                "warning",
+                "📅 Hoy has gastado más de lo habitual. "
+                "Considera no hacer más gastos por hoy para mantenerte dentro de tu presupuesto semanal.",
+            ))
+        elif prom_diario > 0 and 0 < r.gasto_hoy < prom_diario * 0.7:
+            mensajes.append((
+                "success",
+                "✅ Hoy has mantenido un buen control de tus gastos. "
+                "Vas por buen camino para cumplir tus metas semanales.",
+            ))
+
+    # ---- (7) Recomendación semanal
+    if r.gasto_semana_anterior > 0 and r.gasto_semana > 0:
+        cambio = (r.gasto_semana - r.gasto_semana_anterior) / r.gasto_semana_anterior * 100
+        if cambio > 10:
+            mensajes.append((
+                "warning",
+                f"📈 Esta semana has gastado un {cambio:.1f}% más que la semana pasada. "
+                "Revisa especialmente los gastos opcionales.",
+            ))
+        elif cambio < -10:
+            mensajes.append((
+                "success",
+                f"📉 Esta semana has gastado un {abs(cambio):.1f}% menos que la semana pasada. "
+                "Sigue así para acercarte a tus metas de ahorro.",
+            ))
+    return mensajes
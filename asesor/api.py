@@ -0,0 +1,300 @@
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import re
+import socket
+import sys
+import traceback
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import numpy as np
+
+from asesor import etiquetas, exportacion, metricas, servicio
+from asesor.historial import consultar_movimientos
+from asesor.storage import load_user
+
+
+# ---------------------------------------------------------
+# API HTTP local en JSON
+# ---------------------------------------------------------
+# Resúmenes y escritura de movimientos sin pasar por Streamlit, para
+# integraciones y clientes móviles. Cada petición corre en su hilo y reutiliza
+# las cachés del proceso (movimientos, totales diarios, índices); las
+# escrituras concurrentes se agrupan en append_movimientos.
+#
+#   GET  /salud
+#   GET  /usuarios/<u>/resumen
+#   GET  /usuarios/<u>/movimientos?desde=&hasta=&tipo=&categoria=&texto=&orden=&descendente=&pagina=&por_pagina=
+#   POST /usuarios/<u>/movimientos      {"fecha", "tipo", "categoria", "monto", "etiqueta"} o una lista
+#   GET  /usuarios/<u>/etiquetas?prefijo=&limite=
+#   GET  /usuarios/<u>/exportar?formato=csv|jsonl&desde=&hasta=&recurrentes=   (por trozos)
+#   GET  /metricas
+#
+# La API no pide las contraseñas de los usuarios: si ASESOR_API_TOKEN está
+# definido se exige "Authorization: Bearer <token>", y sin él solo escucha en
+# la interfaz local (127.0.0.1, ::1).
+TOKEN = os.environ.get("ASESOR_API_TOKEN", "")
+MAX_CUERPO = 1 << 20
+MAX_POR_PAGINA = 500
+_RUTA_USUARIO = re.compile(r"^/usuarios/([^/]+)/(resumen|movimientos|etiquetas|exportar)$")
+_NO_ASCII_ARCHIVO = re.compile(r"[^A-Za-z0-9._-]")
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def _json(valor):
+    # Escalares de numpy y fechas que puedan colarse en los resultados
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if hasattr(valor, "isoformat"):
+        return valor.isoformat()
+    raise TypeError(f"No serializable: {type(valor).__name__}")
+
+def _es_local(host):
+    # True si todas las direcciones de `host` son de loopback
+    try:
+        direcciones = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except socket.gaierror:
+        return False
+    return bool(direcciones) and all(
+        ipaddress.ip_address(d.split("%")[0]).is_loopback for d in direcciones
+    )
+
+def _autorizado(cabecera):
+    # Comparación en tiempo constante: no revela cuántos caracteres acertó
+    return hmac.compare_digest((cabecera or "").encode("utf-8"), f"Bearer {TOKEN}".encode("utf-8"))
+
+def _usuario(username):
+    if load_user(username) is None:
+        raise ErrorHTTP(404, f"Usuario no encontrado: {username}")
+    return username
+
+def _adjunto(nombre):
+    # El nombre lleva el del usuario, que puede tener comillas, espacios o
+    # acentos: filename solo con ASCII seguro y el original en filename*
+    # (RFC 6266/5987), que es el que usan los navegadores
+    ascii_seguro = _NO_ASCII_ARCHIVO.sub("_", nombre)
+    return f"attachment; filename=\"{ascii_seguro}\"; filename*=UTF-8''{quote(nombre)}"
+
+
+# ---------------------------------------------------------
+# Rutas
+# ---------------------------------------------------------
+def resumen(username):
+    resumen_usuario, mensajes, proyeccion_mes = servicio.obtener_panel(_usuario(username))
+    return 200, {
+        "resumen": asdict(resumen_usuario),
+        "proyeccion": asdict(proyeccion_mes),
+        "recomendaciones": [{"nivel": nivel, "mensaje": mensaje} for nivel, mensaje in mensajes],
+    }
+
+def movimientos(username, consulta):
+    _usuario(username)
+
+    def valor(nombre, defecto=None):
+        return consulta.get(nombre, [defecto])[-1]
+
+    try:
+        pagina = int(valor("pagina", 0))
+        por_pagina = min(int(valor("por_pagina", 50)), MAX_POR_PAGINA)
+    except ValueError:
+        raise ValueError("pagina y por_pagina deben ser enteros") from None
+    if pagina < 0 or por_pagina < 1:
+        raise ValueError("pagina y por_pagina fuera de rango")
+    tipo = valor("tipo")
+    if tipo is not None and tipo not in servicio.TIPOS:
+        raise ValueError(f"Tipo desconocido: {tipo}")
+
+    df, total = consultar_movimientos(
+        username,
+        desde=valor("desde"),
+        hasta=valor("hasta"),
+        tipo=tipo,
+        categorias=consulta.get("categoria"),
+        texto=valor("texto"),
+        orden=valor("orden", "fecha"),
+        descendente=valor("descendente", "1").lower() not in ("0", "false", "no"),
+        pagina=pagina,
+        por_pagina=por_pagina,
+    )
+    filas = df.assign(fecha=df["fecha"].dt.strftime("%Y-%m-%d")).to_dict("records")
+    return 200, {"total": total, "pagina": pagina, "por_pagina": por_pagina, "movimientos": filas}
+
+def sugerencias(username, consulta):
+    # Pensada para llamarse en cada tecla: todo sale del índice en memoria
+    _usuario(username)
+    prefijo = consulta.get("prefijo", [""])[-1]
+    try:
+        limite = min(int(consulta.get("limite", [etiquetas.SUGERENCIAS])[-1]), 50)
+    except ValueError:
+        raise ValueError("limite debe ser un entero") from None
+    return 200, {
+        "sugerencias": etiquetas.sugerir(username, prefijo, limite),
+        "categoria": etiquetas.categoria_sugerida(username, prefijo) if prefijo.strip() else None,
+    }
+
+def exportar(username, consulta):
+    # Devuelve (nombre del archivo, tipo MIME, generador de trozos); los
+    # argumentos se validan aquí, antes de enviar las cabeceras
+    _usuario(username)
+    formato = consulta.get("formato", ["csv"])[-1]
+    desde = consulta.get("desde", [None])[-1]
+    hasta = consulta.get("hasta", [None])[-1]
+    con_recurrentes = consulta.get("recurrentes", ["1"])[-1].lower() not in ("0", "false", "no")
+    trozos = exportacion.exportar(username, formato, desde, hasta, recurrentes=con_recurrentes)
+    return 200, (exportacion.nombre_archivo(username, formato, desde, hasta), exportacion.FORMATOS[formato], trozos)
+
+def registrar(username, cuerpo):
+    _usuario(username)
+    if isinstance(cuerpo, dict):
+        cuerpo = [cuerpo]
+    if not isinstance(cuerpo, list) or not all(isinstance(m, dict) for m in cuerpo):
+        raise ValueError("Se espera un movimiento o una lista de movimientos")
+    return 201, {"registrados": servicio.registrar_movimientos(username, cuerpo)}
+
+
+class Manejador(BaseHTTPRequestHandler):
+    # Conexiones persistentes: un cliente puede encadenar peticiones sin
+    # abrir un socket nuevo para cada una
+    protocol_version = "HTTP/1.1"
+    server_version = "AsesorAPI/1.0"
+
+    def do_GET(self):
+        self._atender("GET")
+
+    def do_POST(self):
+        self._atender("POST")
+
+    def log_message(self, format, *args):
+        # Las latencias ya quedan en asesor.metricas
+        pass
+
+    def _atender(self, metodo):
+        url = urlsplit(self.path)
+        nombre = "api.otra"
+        try:
+            if TOKEN and not _autorizado(self.headers.get("Authorization")):
+                raise ErrorHTTP(401, "Token no válido")
+            coincide = _RUTA_USUARIO.match(url.path)
+            if coincide:
+                username, recurso = coincide.groups()
+                # "jos%C3%A9" -> "josé"
+                username = unquote(username)
+                nombre = f"api.{metodo.lower()}_{recurso}"
+            elif url.path in ("/salud", "/metricas") and metodo == "GET":
+                nombre = f"api.{url.path[1:]}"
+            with metricas.medir(nombre):
+                if nombre == "api.salud":
+                    estado, datos = 200, {"estado": "ok"}
+                elif nombre == "api.metricas":
+                    estado, datos = 200, metricas.exportar()
+                elif nombre == "api.get_resumen":
+                    estado, datos = resumen(username)
+                elif nombre == "api.get_movimientos":
+                    estado, datos = movimientos(username, parse_qs(url.query))
+                elif nombre == "api.get_etiquetas":
+                    estado, datos = sugerencias(username, parse_qs(url.query))
+                elif nombre == "api.get_exportar":
+                    estado, datos = exportar(username, parse_qs(url.query))
+                elif nombre == "api.post_movimientos":
+                    estado, datos = registrar(username, self._cuerpo())
+                else:
+                    raise ErrorHTTP(404, f"Ruta no encontrada: {metodo} {url.path}")
+        except ErrorHTTP as e:
+            estado, datos = e.estado, {"error": str(e)}
+        except ValueError as e:
+            estado, datos = 400, {"error": str(e)}
+        except Exception:
+            # Cualquier otro error: el cliente recibe un 500 en vez de una
+            # conexión cortada, y el detalle queda en la salida de errores
+            traceback.print_exc()
+            estado, datos = 500, {"error": "Error interno del servidor"}
+        if nombre == "api.get_exportar" and estado == 200:
+            self._enviar_trozos(*datos)
+        else:
+            self._responder(estado, datos)
+
+    def _cuerpo(self):
+        largo = int(self.headers.get("Content-Length") or 0)
+        if largo > MAX_CUERPO:
+            raise ErrorHTTP(413, f"Cuerpo mayor a {MAX_CUERPO} bytes")
+        try:
+            return json.loads(self.rfile.read(largo) or b"null")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON no válido: {e}") from None
+
+    def _responder(self, estado, datos):
+        contenido = json.dumps(datos, ensure_ascii=False, default=_json).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(contenido)))
+        if estado == 413:
+            # El cuerpo no se leyó: no se puede seguir usando la conexión
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(contenido)
+
+    def _enviar_trozos(self, nombre, tipo, trozos):
+        # Transferencia por trozos: no hace falta conocer el largo total y el
+        # cliente empieza a recibir mientras se genera el resto
+        self.send_response(200)
+        self.send_header("Content-Type", f"{tipo}; charset=utf-8")
+        self.send_header("Content-Disposition", _adjunto(nombre))
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for trozo in trozos:
+                if trozo:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(trozo), trozo))
+            self.wfile.write(b"0\r\n\r\n")
+        except OSError:
+            # El cliente cortó la descarga
+            self.close_connection = True
+        except Exception:
+            # Con las cabeceras ya enviadas no se puede responder un error:
+            # se corta la conexión y el cliente ve la descarga incompleta
+            self.close_connection = True
+            raise
+
+
+def servidor(host="127.0.0.1", puerto=8502):
+    """ThreadingHTTPServer de la API; ValueError si `host` no es local y no
+    hay ASESOR_API_TOKEN."""
+    if not TOKEN and not _es_local(host):
+        raise ValueError(
+            f"No se escucha en {host} sin ASESOR_API_TOKEN: cualquiera que llegue al "
+            "puerto podría leer y escribir los movimientos de cualquier usuario."
+        )
+    httpd = ThreadingHTTPServer((host, puerto), Manejador)
+    httpd.daemon_threads = True
+    return httpd
+
+
+if __name__ == "__main__":
+    # python -m asesor.api [--host 127.0.0.1] [--puerto 8502]
+    parser = argparse.ArgumentParser(description="API HTTP en JSON del asesor financiero.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8502)
+    args = parser.parse_args()
+
+    try:
+        httpd = servidor(args.host, args.puerto)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    print(f"Escuchando en http://{args.host}:{args.puerto}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
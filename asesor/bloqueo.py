@@ -0,0 +1,48 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo se serializan los hilos del proceso
+    fcntl = None
+
+
+class Bloqueo:
+    """Lock reentrante entre hilos del proceso y, con flock, entre procesos.
+
+    El flock se toma solo en la entrada más externa: flock es por descriptor
+    abierto y volver a pedirlo desde el mismo proceso se bloquearía.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._rlock = threading.RLock()
+        self._nivel = 0
+        self._f = None
+
+    def __enter__(self):
+        self._rlock.acquire()
+        try:
+            if self._nivel == 0:
+                os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+                self._f = open(self.ruta, "a+b")
+                if fcntl is not None:
+                    fcntl.flock(self._f.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+            self._rlock.release()
+            raise
+        self._nivel += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._nivel -= 1
+        if self._nivel == 0:
+            if fcntl is not None:
+                fcntl.flock(self._f.fileno(), fcntl.LOCK_UN)
+            self._f.close()
+            self._f = None
+        self._rlock.release()
+        return False
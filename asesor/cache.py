@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """Caché en memoria del proceso, compartida por todas las sesiones.
+
+    Cada entrada guarda la "firma" de los datos con que se cargó (p. ej.
+    mtime y tamaño de los archivos más un contador de versión); si la firma
+    cambia, la entrada se descarta y se vuelve a cargar. Se expulsan las
+    entradas menos usadas cuando se supera el número de entradas o de bytes.
+    """
+
+    def __init__(self, max_entradas=128, max_bytes=256 * 1024 * 1024):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._datos = OrderedDict()  # clave -> (firma, valor, tamaño)
+        self._cargas = {}  # clave -> lock de la carga en curso
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expulsiones = 0
+
+    def _buscar(self, clave, firma):
+        entrada = self._datos.get(clave)
+        if entrada is not None and entrada[0] == firma:
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return True, entrada[1]
+        return False, None
+
+    def obtener(self, clave, firma, cargar, medir=None):
+        """Valor de `clave` si su firma coincide; si no, `cargar()` una sola vez
+        aunque varios hilos lo pidan a la vez."""
+        with self._lock:
+            encontrado, valor = self._buscar(clave, firma)
+            if encontrado:
+                return valor
+            lock_carga = self._cargas.setdefault(clave, threading.Lock())
+
+        with lock_carga:
+            with self._lock:
+                encontrado, valor = self._buscar(clave, firma)
+                if encontrado:
+                    return valor
+                self.misses += 1
+            try:
+                valor = cargar()
+                tamaño = medir(valor) if medir else 0
+                with self._lock:
+                    self._guardar(clave, firma, valor, tamaño)
+            finally:
+                with self._lock:
+                    self._cargas.pop(clave, None)
+        return valor
+
+    def _guardar(self, clave, firma, valor, tamaño):
+        anterior = self._datos.pop(clave, None)
+        if anterior is not None:
+            self._bytes -= anterior[2]
+        if tamaño > self.max_bytes:
+            return
+        self._datos[clave] = (firma, valor, tamaño)
+        self._bytes += tamaño
+        while len(self._datos) > self.max_entradas or self._bytes > self.max_bytes:
+            _, (_, _, tam) = self._datos.popitem(last=False)
+            self._bytes -= tam
+            self.expulsiones += 1
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._datos),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expulsiones": self.expulsiones,
+                "tasa_hits": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+from collections import defaultdict
+
+from asesor import storage
+from asesor.cache import CacheLRU
+
+
+# ---------------------------------------------------------
+# Datos derivados de los movimientos, un archivo por usuario
+# ---------------------------------------------------------
+# Base de asesor.rollups (totales diarios) y asesor.etiquetas (conteos de
+# etiquetas): un JSON por usuario en `directorio`, que storage mantiene al día
+# con los hooks de registrar_derivado y que siempre se puede reconstruir desde
+# los movimientos (por eso se escribe sin fsync). Con BACKEND="sqlite" no hay
+# archivos: cada módulo lo calcula con una consulta y la firma es la versión
+# del usuario en la base.
+class DerivadoPorUsuario:
+    """Archivos por usuario derivados de los movimientos.
+
+    Las subclases definen `contenido` (la clave de los datos en el JSON) y
+    agregar(df) y de_filas(filas), que devuelven {username: nuevas} de un
+    lote de movimientos o de los dicts de append_movimientos, y
+    acumular(datos, nuevas), que suma `nuevas` a `datos` en el lugar.
+    """
+
+    contenido = "datos"
+
+    def __init__(self, directorio, max_entradas, max_bytes):
+        self.directorio = directorio
+        self.cache = CacheLRU(max_entradas=max_entradas, max_bytes=max_bytes)
+        # Sube con cada escritura de un usuario; junto al mtime invalida la caché
+        self._versiones = defaultdict(int)
+        storage.registrar_derivado(self)
+
+    def ruta(self, username, extension=".json"):
+        return storage.ruta_por_usuario(self.directorio, username, extension)
+
+    def archivos(self, username):
+        # Los que entran en la firma; el primero tiene que existir
+        return [self.ruta(username)]
+
+    def _nueva_version(self, username):
+        self._versiones[username] += 1
+
+    # ---------------- Lectura y escritura ----------------
+    def a_archivo(self, datos):
+        return {self.contenido: datos}
+
+    def desde_archivo(self, archivo):
+        # None hace que el usuario se reconstruya desde los movimientos
+        return archivo[self.contenido]
+
+    def leer(self, username):
+        try:
+            with open(self.ruta(username), "r", encoding="utf-8") as f:
+                return self.desde_archivo(json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def escribir(self, username, datos):
+        os.makedirs(self.directorio, exist_ok=True)
+        storage.escribir_json_atomico(
+            self.ruta(username), {"username": username, **self.a_archivo(datos)}, durable=False
+        )
+        self._nueva_version(username)
+
+    def firma(self, username):
+        if storage.BACKEND == "sqlite":
+            return ("sqlite", storage.version_usuario(username))
+        firma = [self._versiones[username]]
+        for i, ruta in enumerate(self.archivos(username)):
+            try:
+                st_ruta = os.stat(ruta)
+            except FileNotFoundError:
+                if i == 0:
+                    return None
+                st_ruta = None
+            firma.append(st_ruta and (st_ruta.st_mtime_ns, st_ruta.st_size))
+        return tuple(firma)
+
+    def obtener(self, username, cargar, medir=None):
+        """Lo que `cargar()` arma para el usuario, compartido entre sesiones
+        mientras sus archivos (o su versión en SQLite) no cambien."""
+        return self.cache.obtener(username, self.firma(username), cargar, medir=medir)
+
+    def limpiar_cache(self):
+        self.cache.limpiar()
+
+    # ---------------- Actualización (hooks de storage) ----------------
+    def anotar(self, username, nuevas):
+        """Suma `nuevas` a los datos guardados del usuario; False si no hay
+        datos que actualizar y hay que reconstruirlos."""
+        datos = self.leer(username)
+        if datos is None:
+            return False
+        self.acumular(datos, nuevas)
+        self.escribir(username, datos)
+        return True
+
+    def _sumar(self, por_usuario):
+        for username, nuevas in por_usuario.items():
+            if not self.anotar(username, nuevas):
+                # Primer uso con movimientos anteriores: se construye desde
+                # los movimientos, que ya incluyen los nuevos
+                self.reconstruir(username)
+
+    def actualizar(self, filas):
+        self._sumar(self.de_filas(filas))
+
+    def actualizar_desde(self, df):
+        self._sumar(self.agregar(df))
+
+    def reconstruir(self, username=None):
+        """Recalcula desde los movimientos (de un usuario o de todos)."""
+        with storage.bloqueo_movimientos():
+            if username is not None:
+                df = storage.load_movimientos(username)
+                self.escribir(username, self.agregar(df).get(username, {}))
+                return 1
+            # Mes archivado a mes archivado: no hace falta el histórico en memoria
+            por_usuario = defaultdict(dict)
+            for parte in storage.iterar_movimientos():
+                for u, nuevas in self.agregar(parte).items():
+                    self.acumular(por_usuario[u], nuevas)
+            return self._reemplazar(por_usuario)
+
+    def reconstruir_desde(self, df):
+        # Reemplaza los datos de todos por los de `df` (tras save_movimientos)
+        return self._reemplazar(self.agregar(df))
+
+    def _reemplazar(self, por_usuario):
+        with storage.bloqueo_movimientos():
+            if os.path.exists(self.directorio):
+                shutil.rmtree(self.directorio)
+            for username, datos in por_usuario.items():
+                self.escribir(username, datos)
+            self.cache.limpiar()
+            return len(por_usuario)
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+from asesor import metricas
+
+
+# ---------------------------------------------------------
+# Esquema compacto de los movimientos en memoria
+# ---------------------------------------------------------
+# En disco (CSV, Arrow, SQLite) el monto va en pesos con decimales. En memoria
+# load_movimientos entrega los textos repetidos como categóricas y el monto
+# como enteros de centavos, que suman sin errores de redondeo. Solo se vuelve
+# a pesos y a texto al mostrar o al escribir.
+TIPOS = pd.CategoricalDtype(["Gasto", "Ingreso"])
+COLUMNAS = ["username", "fecha", "tipo", "categoria", "etiqueta", "centavos"]
+# Fechas que admite un movimiento (incluidas). Fuera de este rango no caben en
+# datetime64[ns] y la compactación fallaría con el movimiento ya guardado.
+FECHA_MIN = pd.Timestamp("1900-01-01")
+FECHA_MAX = pd.Timestamp("2100-12-31 23:59:59.999999")
+
+
+def centavos(df):
+    """Montos de `df` en centavos (int64), venga con `centavos` o con `monto`."""
+    if "centavos" in df:
+        return df["centavos"].to_numpy(dtype=np.int64)
+    return np.rint(df["monto"].to_numpy(dtype=float) * 100).astype(np.int64)
+
+def fecha_valida(fechas):
+    """True donde `fechas` (Timestamp o Serie) cae en [FECHA_MIN, FECHA_MAX]."""
+    if isinstance(fechas, pd.Series):
+        return fechas.between(FECHA_MIN, FECHA_MAX)
+    return not pd.isna(fechas) and FECHA_MIN <= fechas <= FECHA_MAX
+
+def pesos(df):
+    return centavos(df) / 100
+
+def texto(serie):
+    # Columna de texto sin nulos, sea categórica o no
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype(object)
+    return serie.fillna("").astype(str)
+
+@metricas.medido(filas=len)
+def compactar(df):
+    """Movimientos recién leídos (texto y monto en pesos) con el esquema compacto."""
+    return pd.DataFrame({
+        "username": df["username"].astype("category"),
+        "fecha": pd.to_datetime(df["fecha"], format="ISO8601"),
+        "tipo": df["tipo"].astype(TIPOS),
+        "categoria": df["categoria"].astype("category"),
+        "etiqueta": texto(df["etiqueta"]).astype("category"),
+        "centavos": centavos(df),
+    }, index=df.index)
+
+def vacio():
+    return compactar(pd.DataFrame({
+        "username": pd.Series(dtype=str),
+        "fecha": pd.Series(dtype="datetime64[ns]"),
+        "tipo": pd.Series(dtype=str),
+        "categoria": pd.Series(dtype=str),
+        "etiqueta": pd.Series(dtype=str),
+        "monto": pd.Series(dtype=float),
+    }))
+
+def para_mostrar(df, columnas=("fecha", "tipo", "categoria", "etiqueta", "monto")):
+    """Filas listas para una tabla: textos planos y monto en pesos."""
+    salida = pd.DataFrame(index=df.index)
+    for columna in columnas:
+        if columna == "monto":
+            salida["monto"] = pesos(df)
+        elif columna == "fecha":
+            salida["fecha"] = df["fecha"]
+        else:
+            salida[columna] = texto(df[columna])
+    return salida
@@ -0,0 +1,263 @@
+import bisect
+import heapq
+import json
+import os
+import sys
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+
+from asesor import esquema, metricas, storage
+from asesor.derivados import DerivadoPorUsuario
+
+
+# ---------------------------------------------------------
+# Autocompletado de etiquetas y categoría sugerida
+# ---------------------------------------------------------
+# Por usuario, un JSON con {etiqueta: {categoria: n}} y un log al que cada
+# escritura de movimientos anexa una línea con lo nuevo; cuando el log crece
+# se funde con el JSON. En memoria cada usuario tiene un IndiceEtiquetas con
+# las etiquetas normalizadas en orden: un prefijo es una búsqueda binaria, no
+# un recorrido de los movimientos.
+ETIQUETAS_DIR = os.path.join(storage.DATA_DIR, "etiquetas")
+SUGERENCIAS = 5
+# Tamaño del log de un usuario a partir del cual se reescribe su JSON
+MAX_LOG_BYTES = 256 * 1024
+# Prefijos que abarcan más etiquetas que esto ("a", "c") guardan su resultado
+MEMO_DESDE = 256
+# Bytes aproximados por etiqueta en memoria (claves, entrada y categorías)
+BYTES_ETIQUETA = 400
+
+
+def normalizar(texto):
+    """Clave de búsqueda: sin mayúsculas, tildes ni espacios repetidos."""
+    texto = str(texto).casefold()
+    if not texto.isascii():
+        texto = unicodedata.normalize("NFKD", texto)
+        texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.split())
+
+
+@dataclass(slots=True)
+class Entrada:
+    # Cómo se muestra (la forma más usada), cuántas veces y en qué categorías
+    texto: str
+    usos_texto: int
+    usos: int
+    categorias: dict
+    categoria: str
+
+
+class IndiceEtiquetas:
+    """Etiquetas de un usuario ordenadas por su forma normalizada.
+
+    No se modifica: actualizada() devuelve otro índice, así los hilos que
+    están sugiriendo con el anterior no ven un estado a medias.
+    """
+
+    def __init__(self, conteos, entradas=None, claves=None):
+        self.conteos = conteos
+        if entradas is None:
+            entradas = {}
+            for etiqueta, categorias in conteos.items():
+                _sumar_entrada(entradas, etiqueta, categorias, sum(categorias.values()))
+            claves = sorted(entradas)
+        self.entradas = entradas
+        self.claves = claves
+        self._memo = {}
+
+    @property
+    def nbytes(self):
+        return BYTES_ETIQUETA * len(self.conteos)
+
+    def actualizada(self, nuevas):
+        """Índice con los usos de `nuevas` ({etiqueta: {categoria: n}}) sumados."""
+        conteos = dict(self.conteos)
+        entradas = dict(self.entradas)
+        claves = self.claves
+        copiadas = False
+        for etiqueta, categorias in nuevas.items():
+            previas = conteos.get(etiqueta, {})
+            conteos[etiqueta] = {
+                cat: previas.get(cat, 0) + categorias.get(cat, 0) for cat in previas | categorias
+            }
+            clave = normalizar(etiqueta)
+            if clave and clave not in entradas:
+                if not copiadas:
+                    claves = list(claves)
+                    copiadas = True
+                bisect.insort(claves, clave)
+            _sumar_entrada(entradas, etiqueta, categorias, sum(conteos[etiqueta].values()))
+        return IndiceEtiquetas(conteos, entradas, claves)
+
+    def sugerir(self, prefijo, limite=SUGERENCIAS):
+        clave = normalizar(prefijo)
+        if not clave:
+            return []
+        memo = self._memo.get((clave, limite))
+        if memo is not None:
+            return memo
+        ini = bisect.bisect_left(self.claves, clave)
+        fin = bisect.bisect_left(self.claves, clave + "\U0010ffff", ini)
+        # Las más usadas; a igual uso, en orden alfabético
+        mejores = heapq.nlargest(
+            limite, self.claves[ini:fin], key=lambda c: self.entradas[c].usos
+        )
+        sugerencias = [self.entradas[c].texto for c in mejores]
+        if fin - ini > MEMO_DESDE:
+            self._memo[(clave, limite)] = sugerencias
+        return sugerencias
+
+    def categoria(self, etiqueta):
+        entrada = self.entradas.get(normalizar(etiqueta))
+        return entrada.categoria if entrada is not None else None
+
+
+def _sumar_entrada(entradas, etiqueta, categorias, usos_etiqueta):
+    # Suma `categorias` a la entrada de la forma normalizada de `etiqueta`;
+    # `usos_etiqueta` es el total de esa forma exacta, ya incluidas las nuevas
+    clave = normalizar(etiqueta)
+    if not clave:
+        return
+    anterior = entradas.get(clave)
+    if anterior is None:
+        por_categoria = dict(categorias)
+        entradas[clave] = Entrada(
+            etiqueta, usos_etiqueta, usos_etiqueta,
+            por_categoria, max(por_categoria, key=por_categoria.get),
+        )
+        return
+    por_categoria = dict(anterior.categorias)
+    for cat, n in categorias.items():
+        por_categoria[cat] = por_categoria.get(cat, 0) + n
+    texto, usos_texto = anterior.texto, anterior.usos_texto
+    if etiqueta == texto or usos_etiqueta > usos_texto:
+        texto, usos_texto = etiqueta, usos_etiqueta
+    entradas[clave] = Entrada(
+        texto, usos_texto, anterior.usos + sum(categorias.values()),
+        por_categoria, max(por_categoria, key=por_categoria.get),
+    )
+
+
+# ---------------------------------------------------------
+# Persistencia y actualización
+# ---------------------------------------------------------
+def _sumar_conteos(conteos, nuevas):
+    for etiqueta, categorias in nuevas.items():
+        acumulado = conteos.setdefault(etiqueta, {})
+        for cat, n in categorias.items():
+            acumulado[cat] = acumulado.get(cat, 0) + n
+
+
+class ConteosEtiquetas(DerivadoPorUsuario):
+    contenido = "conteos"
+
+    def archivos(self, username):
+        return [self.ruta(username), self.ruta(username, ".log")]
+
+    def leer(self, username):
+        conteos = super().leer(username)
+        if conteos is not None and os.path.exists(self.ruta(username, ".log")):
+            with open(self.ruta(username, ".log"), "r", encoding="utf-8") as f:
+                for linea in f:
+                    _sumar_conteos(conteos, json.loads(linea))
+        return conteos
+
+    def escribir(self, username, conteos):
+        super().escribir(username, conteos)
+        if os.path.exists(self.ruta(username, ".log")):
+            os.remove(self.ruta(username, ".log"))
+
+    def anotar(self, username, nuevas):
+        # Una línea en el log en vez de reescribir todas las etiquetas del
+        # usuario; los conteos enteros se escriben cuando el log es grande
+        if not os.path.exists(self.ruta(username)):
+            return False
+        # Se parte del índice en memoria (si está) y se publica el nuevo con
+        # la firma de los archivos recién escritos: no hace falta releerlos
+        nuevo = indice(username).actualizada(nuevas)
+        with open(self.ruta(username, ".log"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(nuevas, ensure_ascii=False) + "\n")
+            largo = f.tell()
+        self._nueva_version(username)
+        if largo > MAX_LOG_BYTES:
+            self.escribir(username, nuevo.conteos)
+        self.cache.obtener(username, self.firma(username), lambda: nuevo, medir=lambda i: i.nbytes)
+        return True
+
+    def agregar(self, df):
+        # {username: {etiqueta: {categoria: n}}} de movimientos crudos o compactos
+        if df.empty:
+            return {}
+        contados = (
+            df.assign(
+                username=esquema.texto(df["username"]),
+                etiqueta=esquema.texto(df["etiqueta"]).str.strip(),
+                categoria=esquema.texto(df["categoria"]),
+            )
+            .query("etiqueta != ''")
+            .groupby(["username", "etiqueta", "categoria"], sort=False)
+            .size()
+        )
+        por_usuario = defaultdict(lambda: defaultdict(dict))
+        for (username, etiqueta, categoria), n in contados.items():
+            por_usuario[username][etiqueta][categoria] = int(n)
+        return por_usuario
+
+    def de_filas(self, filas):
+        por_usuario = defaultdict(lambda: defaultdict(dict))
+        for fila in filas:
+            etiqueta = str(fila.get("etiqueta") or "").strip()
+            if etiqueta:
+                categorias = por_usuario[fila["username"]][etiqueta]
+                categorias[fila["categoria"]] = categorias.get(fila["categoria"], 0) + 1
+        return por_usuario
+
+    def acumular(self, conteos, nuevas):
+        _sumar_conteos(conteos, nuevas)
+
+
+usos = ConteosEtiquetas(ETIQUETAS_DIR, max_entradas=256, max_bytes=128 * 1024 * 1024)
+
+
+def reconstruir(username=None):
+    """Recalcula los conteos desde los movimientos (de un usuario o de todos)."""
+    return usos.reconstruir(username)
+
+def _cargar(username):
+    if storage.BACKEND == "sqlite":
+        # SQLite cuenta con GROUP BY; no hay archivos que mantener
+        return IndiceEtiquetas(storage.base_sqlite().conteos_etiquetas(username))
+    datos = usos.leer(username)
+    if datos is None:
+        reconstruir(username)
+        datos = usos.leer(username) or {}
+    return IndiceEtiquetas(datos)
+
+
+# ---------------------------------------------------------
+# Consultas
+# ---------------------------------------------------------
+def indice(username):
+    """IndiceEtiquetas del usuario, compartido entre sesiones mientras sus
+    conteos no cambien."""
+    return usos.obtener(username, lambda: _cargar(username), medir=lambda i: i.nbytes)
+
+@metricas.medido()
+def sugerir(username, prefijo, limite=SUGERENCIAS):
+    """Hasta `limite` etiquetas ya usadas que empiezan por `prefijo` (sin
+    distinguir mayúsculas ni tildes), las más frecuentes primero."""
+    return indice(username).sugerir(prefijo, limite)
+
+def categoria_sugerida(username, etiqueta):
+    """Categoría más usada con esa etiqueta, o None si es nueva."""
+    return indice(username).categoria(etiqueta)
+
+
+if __name__ == "__main__":
+    # python -m asesor.etiquetas reconstruir [usuario]
+    if len(sys.argv) in (2, 3) and sys.argv[1] == "reconstruir":
+        print(f"Usuarios reconstruidos: {reconstruir(sys.argv[2] if len(sys.argv) == 3 else None)}")
+    else:
+        print("Uso: python -m asesor.etiquetas reconstruir [usuario]")
+        sys.exit(2)
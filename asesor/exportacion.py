@@ -0,0 +1,121 @@
+import argparse
+import itertools
+import sys
+from datetime import date
+
+import pandas as pd
+
+from asesor import esquema, recurrentes, storage
+from asesor.importacion import CAMPOS
+
+
+# ---------------------------------------------------------
+# Exportación del historial de un usuario
+# ---------------------------------------------------------
+# El archivo se produce de a trozos de FILAS_POR_TROZO movimientos a partir de
+# storage.iterar_movimientos (un mes archivado, la base o un log a la vez), así
+# la memoria no depende del tamaño del historial y quien descarga recibe el
+# primer trozo antes de que exista el último. Las columnas son las de
+# asesor.importacion: un CSV exportado se puede volver a importar (mejor sin
+# las ocurrencias de los recurrentes, que ya salen de sus definiciones).
+#
+# Formato -> tipo MIME
+FORMATOS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+FILAS_POR_TROZO = 10_000
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+
+
+def _codificar(df, formato):
+    filas = esquema.para_mostrar(df, CAMPOS)
+    filas["fecha"] = filas["fecha"].dt.strftime(FORMATO_FECHA)
+    if formato == "csv":
+        return filas.to_csv(header=False, index=False, lineterminator="\n").encode("utf-8")
+    # Una línea JSON por movimiento (pandas ya termina la última con \n)
+    return filas.to_json(orient="records", lines=True, force_ascii=False).encode("utf-8")
+
+def _ocurrencias(username, desde, hasta):
+    # Las de los recurrentes hasta hoy, como en el historial; son pocas (una
+    # por semana a lo sumo por definición), así que van en una sola parte
+    defs = recurrentes.definiciones(storage.load_user(username))
+    if not defs:
+        return
+    hoy = pd.Timestamp(date.today())
+    desde = desde if desde is not None else pd.Timestamp(min(r.inicio for r in defs))
+    hasta = min(hasta, hoy) if hasta is not None else hoy
+    yield recurrentes.movimientos(username, defs, desde, hasta)
+
+def _trozos(username, formato, desde, hasta, filas_por_trozo, con_recurrentes):
+    if formato == "csv":
+        yield (",".join(CAMPOS) + "\n").encode("utf-8")
+    partes = storage.iterar_movimientos(username, desde, hasta)
+    if con_recurrentes:
+        partes = itertools.chain(partes, _ocurrencias(username, desde, hasta))
+    for parte in partes:
+        parte = parte.sort_values("fecha", kind="stable")
+        for inicio in range(0, len(parte), filas_por_trozo):
+            yield _codificar(parte.iloc[inicio:inicio + filas_por_trozo], formato)
+
+def exportar(
+    username, formato="csv", desde=None, hasta=None, filas_por_trozo=FILAS_POR_TROZO, recurrentes=True
+):
+    """Generador con los bytes del archivo de movimientos de `username`.
+
+    `desde`/`hasta` (fechas, incluidas) acotan el rango. Los movimientos van
+    por fecha dentro de cada parte del almacenamiento (mes archivado, base,
+    log); los anotados con fecha pasada desde la última compactación salen al
+    final. Con `recurrentes`, al final van también las ocurrencias de los
+    movimientos recurrentes hasta hoy, con la etiqueta marcada con
+    recurrentes.MARCA como en el historial. Los argumentos se validan al
+    llamar, antes del primer trozo.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportación desconocido: {formato}")
+    if filas_por_trozo < 1:
+        raise ValueError("filas_por_trozo debe ser mayor que 0")
+    try:
+        desde = pd.Timestamp(desde).normalize() if desde is not None else None
+        hasta = pd.Timestamp(hasta).normalize() if hasta is not None else None
+    except (TypeError, ValueError):
+        raise ValueError(f"Fecha no válida: {desde} / {hasta}") from None
+    return _trozos(username, formato, desde, hasta, filas_por_trozo, recurrentes)
+
+def nombre_archivo(username, formato, desde=None, hasta=None):
+    rango = "".join(f"_{pd.Timestamp(d):%Y%m%d}" for d in (desde, hasta) if d is not None)
+    return f"movimientos_{username}{rango}.{formato}"
+
+
+if __name__ == "__main__":
+    # python -m asesor.exportacion ana [--formato jsonl] [--desde 2024-01-01] [--hasta ...] [--salida archivo]
+    parser = argparse.ArgumentParser(description="Exporta los movimientos de un usuario.")
+    parser.add_argument("usuario")
+    parser.add_argument("--formato", choices=list(FORMATOS), default="csv")
+    parser.add_argument("--desde")
+    parser.add_argument("--hasta")
+    parser.add_argument("--salida", default="-", help="archivo de salida (- = salida estándar)")
+    parser.add_argument("--filas", type=int, default=FILAS_POR_TROZO, help="movimientos por trozo")
+    parser.add_argument(
+        "--sin-recurrentes", action="store_true", help="solo los movimientos registrados"
+    )
+    args = parser.parse_args()
+
+    if storage.load_user(args.usuario) is None:
+        print(f"Usuario no encontrado: {args.usuario}", file=sys.stderr)
+        sys.exit(2)
+    try:
+        trozos = exportar(
+            args.usuario, args.formato, args.desde, args.hasta, args.filas,
+            recurrentes=not args.sin_recurrentes,
+        )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    salida = sys.stdout.buffer if args.salida == "-" else open(args.salida, "wb")
+    try:
+        escritos = 0
+        for trozo in trozos:
+            salida.write(trozo)
+            escritos += len(trozo)
+    finally:
+        if salida is not sys.stdout.buffer:
+            salida.close()
+    print(f"Exportados {escritos / 2**20:,.1f} MB.", file=sys.stderr)
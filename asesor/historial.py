@@ -0,0 +1,131 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from asesor import esquema, metricas, recurrentes, rollups, storage
+
+
+# ---------------------------------------------------------
+# Historial paginado y filtrado
+# ---------------------------------------------------------
+# Orden pedido -> columna del esquema compacto
+ORDENES = {"fecha": "fecha", "monto": "centavos"}
+COLUMNAS_TABLA = ["fecha", "tipo", "categoria", "etiqueta", "monto"]
+
+
+def _filtrar(df, desde, hasta, tipo, categorias, texto):
+    mascara = np.ones(len(df), dtype=bool)
+    if desde is not None:
+        mascara &= (df["fecha"] >= desde).to_numpy()
+    if hasta is not None:
+        mascara &= (df["fecha"] < hasta + pd.Timedelta(days=1)).to_numpy()
+    if tipo:
+        mascara &= (df["tipo"] == tipo).to_numpy()
+    if categorias:
+        mascara &= df["categoria"].isin(categorias).to_numpy()
+    if texto:
+        mascara &= df["etiqueta"].str.contains(texto, case=False, regex=False, na=False).to_numpy()
+    return df[mascara]
+
+
+def _con_recurrentes(df, username, defs, desde, hasta):
+    # Movimientos de [desde, hasta] más las ocurrencias de los recurrentes
+    # (solo hasta hoy), generadas para ese rango y nada más
+    if not defs:
+        return df
+    hoy = pd.Timestamp(date.today())
+    desde = desde if desde is not None else pd.Timestamp(min(r.inicio for r in defs))
+    virtuales = recurrentes.movimientos(username, defs, desde, min(hasta, hoy) if hasta is not None else hoy)
+    if virtuales.empty:
+        return df
+    if df.empty:
+        return virtuales
+    return pd.concat([df, virtuales], ignore_index=True)
+
+def _dias_de_la_pagina(username, defs, desde, hasta, tipo, categorias, descendente, inicio, fin):
+    # Con los conteos diarios (rollups) se sabe cuántas filas hay y en qué
+    # días cae la página sin leer ningún movimiento.
+    r = recurrentes.combinar(rollups.cargar(username), defs)
+    mascara = np.ones(len(r), dtype=bool)
+    if desde is not None:
+        mascara &= (r["dia"] >= desde).to_numpy()
+    if hasta is not None:
+        mascara &= (r["dia"] <= hasta).to_numpy()
+    if tipo:
+        mascara &= (r["tipo"] == tipo).to_numpy()
+    if categorias:
+        mascara &= r["categoria"].isin(categorias).to_numpy()
+    por_dia = r[mascara].groupby("dia", sort=True)["n"].sum()
+    if descendente:
+        por_dia = por_dia.iloc[::-1]
+    total = int(por_dia.sum())
+    if inicio >= total:
+        return total, None, None, 0
+
+    hasta_aqui = np.cumsum(por_dia.to_numpy())
+    i = int(np.searchsorted(hasta_aqui, inicio, side="right"))
+    j = int(np.searchsorted(hasta_aqui, min(fin, total) - 1, side="right"))
+    antes = int(hasta_aqui[i - 1]) if i else 0
+    dias = por_dia.index[[i, j]]
+    return total, dias.min(), dias.max(), inicio - antes
+
+
+@metricas.medido(filas=lambda r: len(r[0]))
+def consultar_movimientos(
+    username,
+    desde=None,
+    hasta=None,
+    tipo=None,
+    categorias=None,
+    texto=None,
+    orden="fecha",
+    descendente=True,
+    pagina=0,
+    por_pagina=50,
+):
+    """Una página del historial de `username` y el total de filas que cumplen
+    los filtros.
+
+    `desde`/`hasta` son fechas (incluidas), `tipo` "Gasto" o "Ingreso",
+    `categorias` una lista y `texto` se busca en la etiqueta sin distinguir
+    mayúsculas. Ordenando por fecha sin texto, solo se leen los días de la
+    página; la búsqueda por texto y el orden por monto recorren el rango.
+    Las ocurrencias de los movimientos recurrentes hasta hoy se incluyen,
+    con la etiqueta marcada con recurrentes.MARCA.
+    """
+    if orden not in ORDENES:
+        raise ValueError(f"Orden no soportado: {orden}")
+    desde = pd.Timestamp(desde).normalize() if desde is not None else None
+    hasta = pd.Timestamp(hasta).normalize() if hasta is not None else None
+    inicio = max(0, int(pagina)) * por_pagina
+
+    defs = recurrentes.definiciones(storage.load_user(username))
+
+    # SQLite pagina con la consulta; las ocurrencias recurrentes no son filas
+    # de la tabla, así que con recurrentes se pagina como en los archivos
+    if storage.BACKEND == "sqlite" and not defs:
+        return storage.base_sqlite().consultar(
+            username, desde, hasta, tipo, categorias, texto, orden, descendente, inicio, por_pagina
+        )
+
+    if orden == "fecha" and not texto:
+        total, dia_a, dia_b, saltar = _dias_de_la_pagina(
+            username, defs, desde, hasta, tipo, categorias, descendente, inicio, inicio + por_pagina
+        )
+        if dia_a is None:
+            return esquema.para_mostrar(storage.movimientos_vacio(), COLUMNAS_TABLA), total
+        df = storage.load_movimientos(username, desde=dia_a, hasta=dia_b)
+        df = _con_recurrentes(df, username, defs, dia_a, dia_b)
+        df = _filtrar(df, desde, hasta, tipo, categorias, None)
+        df = df.sort_values("fecha", ascending=not descendente, kind="stable")
+        pagina_df = df.iloc[saltar:saltar + por_pagina].reset_index(drop=True)
+        return esquema.para_mostrar(pagina_df, COLUMNAS_TABLA), total
+
+    df = storage.load_movimientos(username, desde=desde, hasta=hasta)
+    df = _con_recurrentes(df, username, defs, desde, hasta)
+    df = _filtrar(df, desde, hasta, tipo, categorias, texto)
+    # En memoria el monto está en centavos
+    df = df.sort_values(ORDENES[orden], ascending=not descendente, kind="stable")
+    pagina_df = df.iloc[inicio:inicio + por_pagina].reset_index(drop=True)
+    return esquema.para_mostrar(pagina_df, COLUMNAS_TABLA), len(df)
@@ -0,0 +1,262 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from asesor import esquema, storage
+from asesor.bloqueo import Bloqueo
+
+
+# ---------------------------------------------------------
+# Importación masiva de extractos bancarios (CSV)
+# ---------------------------------------------------------
+# Huellas (uint64, ordenadas) de los movimientos ya cargados de cada usuario,
+# para no duplicar filas al importar dos veces el mismo extracto.
+IMPORTADOS_DIR = os.path.join(storage.DATA_DIR, "importados")
+# Filas que se leen, deduplican y guardan de una vez
+TAM_BLOQUE = 50_000
+CAMPOS = ["fecha", "tipo", "categoria", "etiqueta", "monto"]
+CATEGORIA_POR_DEFECTO = "Otros"
+
+# Una importación a la vez: dos sobre el mismo usuario se saltarían la
+# deduplicación mutuamente
+_lock_importacion = Bloqueo(os.path.join(storage.DATA_DIR, ".importacion.lock"))
+
+
+def _ruta_indice(username):
+    return storage.ruta_por_usuario(IMPORTADOS_DIR, username, ".npy")
+
+
+class _Ocurrencias:
+    """Cuántas veces se ha visto ya cada contenido en la importación en curso.
+
+    Dos filas idénticas en un extracto (dos cafés iguales el mismo día) son
+    movimientos distintos: la huella incluye el número de ocurrencia, así que
+    solo se descartan si ya se importaron antes tantas como ahora.
+    """
+
+    def __init__(self):
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.cuentas = np.empty(0, dtype=np.int64)
+
+    def numerar(self, contenido):
+        if not len(contenido):
+            # Bloque sin filas válidas
+            return np.empty(0, dtype=np.int64)
+        unicos, inversa, cuentas = np.unique(contenido, return_inverse=True, return_counts=True)
+        previas = np.zeros(len(unicos), dtype=np.int64)
+        if len(self.hashes):
+            pos = np.minimum(np.searchsorted(self.hashes, unicos), len(self.hashes) - 1)
+            vistos = self.hashes[pos] == unicos
+            previas[vistos] = self.cuentas[pos[vistos]]
+        # Ocurrencia dentro del bloque: orden de aparición entre iguales
+        orden = np.argsort(inversa, kind="stable")
+        inicio_grupo = np.concatenate(([0], np.cumsum(cuentas)[:-1]))
+        dentro = np.empty(len(contenido), dtype=np.int64)
+        dentro[orden] = np.arange(len(contenido)) - np.repeat(inicio_grupo, cuentas)
+        ocurrencia = previas[inversa] + dentro
+
+        todos = np.concatenate((self.hashes, unicos))
+        sumas = np.concatenate((self.cuentas, cuentas))
+        self.hashes, idx = np.unique(todos, return_inverse=True)
+        self.cuentas = np.bincount(idx, weights=sumas).astype(np.int64)
+        return ocurrencia
+
+
+def _normalizar(df):
+    # Forma canónica de las columnas que entran en la huella; sirve igual
+    # para un bloque del extracto que para lo que devuelve load_movimientos
+    return pd.DataFrame({
+        "username": esquema.texto(df["username"]),
+        "fecha": pd.to_datetime(df["fecha"]).dt.strftime("%Y-%m-%d %H:%M:%S"),
+        "tipo": esquema.texto(df["tipo"]),
+        "categoria": esquema.texto(df["categoria"]),
+        "etiqueta": esquema.texto(df["etiqueta"]),
+        "monto": esquema.pesos(df).round(2),
+    })
+
+def huellas(df, ocurrencias):
+    """Huella uint64 de cada movimiento: contenido + número de ocurrencia."""
+    canon = _normalizar(df)
+    contenido = pd.util.hash_pandas_object(canon, index=False).to_numpy()
+    canon["ocurrencia"] = ocurrencias.numerar(contenido)
+    return pd.util.hash_pandas_object(canon, index=False).to_numpy()
+
+def _unir(indice, claves):
+    # Índice ordenado y sin repetidos con las claves nuevas incorporadas
+    todo = np.sort(np.concatenate((indice, claves)))
+    return todo[np.concatenate(([True], todo[1:] != todo[:-1]))]
+
+def _contiene(indice, claves):
+    # Pertenencia por búsqueda binaria sobre el índice ordenado
+    if not len(indice):
+        return np.zeros(len(claves), dtype=bool)
+    pos = np.minimum(np.searchsorted(indice, claves), len(indice) - 1)
+    return indice[pos] == claves
+
+def _construir_indice(username):
+    # Primera importación del usuario: se parte de lo que ya tiene registrado
+    df = storage.load_movimientos(username)
+    if df.empty:
+        return np.empty(0, dtype=np.uint64)
+    return np.unique(huellas(df, _Ocurrencias()))
+
+def _cargar_indice(username):
+    ruta = _ruta_indice(username)
+    if os.path.exists(ruta):
+        return np.load(ruta)
+    return _construir_indice(username)
+
+def _guardar_indice(username, indice):
+    os.makedirs(IMPORTADOS_DIR, exist_ok=True)
+    ruta = _ruta_indice(username)
+    tmp = storage.ruta_temporal(ruta)
+    with open(tmp, "wb") as f:
+        np.save(f, indice)
+    os.replace(tmp, ruta)
+
+
+def _preparar_bloque(bloque, username, mapeo, decimal, dayfirst):
+    # Renombra columnas del banco al esquema de movimientos y descarta filas
+    # sin fecha o monto válidos (fecha fuera de rango, monto cero o infinito)
+    df = pd.DataFrame(index=bloque.index)
+    for campo in CAMPOS:
+        origen = mapeo.get(campo)
+        if origen:
+            df[campo] = bloque[origen]
+
+    df["fecha"] = pd.to_datetime(df["fecha"], dayfirst=dayfirst, errors="coerce")
+    monto = df["monto"]
+    if not pd.api.types.is_numeric_dtype(monto):
+        # Importes con símbolo de moneda o separador de miles ("$1.234,56")
+        monto = monto.astype(str).str.replace(r"[^\d,.\-]", "", regex=True)
+        if decimal == ",":
+            monto = monto.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+        else:
+            monto = monto.str.replace(",", "", regex=False)
+    df["monto"] = pd.to_numeric(monto, errors="coerce")
+    validas = esquema.fecha_valida(df["fecha"]) & np.isfinite(df["monto"]) & (df["monto"] != 0)
+    df = df[validas]
+
+    # Extracto con un solo importe con signo: negativo = gasto
+    por_signo = np.where(df["monto"] < 0, "Gasto", "Ingreso")
+    if "tipo" not in df:
+        df["tipo"] = por_signo
+    else:
+        # "Ingreso", "Abono", "Crédito"... cuentan como ingreso; el resto,
+        # gasto. Con la celda vacía decide el signo, como sin columna de tipo
+        tipo = df["tipo"].fillna("").astype(str).str.strip().str.lower()
+        df["tipo"] = np.where(
+            tipo == "",
+            por_signo,
+            np.where(tipo.str.startswith(("ing", "abono", "cr")), "Ingreso", "Gasto"),
+        )
+    df["monto"] = df["monto"].abs()
+    if "categoria" not in df:
+        df["categoria"] = CATEGORIA_POR_DEFECTO
+    df["categoria"] = df["categoria"].fillna(CATEGORIA_POR_DEFECTO).astype(str)
+    if "etiqueta" not in df:
+        df["etiqueta"] = ""
+    df["etiqueta"] = df["etiqueta"].fillna("").astype(str).str.strip()
+    df.insert(0, "username", username)
+    return df[storage.COLUMNAS_MOV], int((~validas).sum())
+
+
+def importar_csv(
+    fuente,
+    username,
+    mapeo,
+    sep=",",
+    decimal=".",
+    dayfirst=False,
+    encoding="utf-8",
+    tam_bloque=TAM_BLOQUE,
+    al_avanzar=None,
+):
+    """Importa un extracto CSV por bloques sin cargarlo entero en memoria.
+
+    `mapeo` es {campo: columna del archivo} para fecha, monto y,
+    opcionalmente, tipo, categoria y etiqueta. Sin columna de tipo (o con la
+    celda vacía), el signo del monto decide si es gasto o ingreso. Cada bloque se guarda en un solo
+    lote; las filas ya importadas antes se omiten. Devuelve un dict con
+    leidas, nuevas, duplicadas e invalidas; `al_avanzar` recibe ese mismo
+    dict tras cada bloque.
+    """
+    for campo in ("fecha", "monto"):
+        if not mapeo.get(campo):
+            raise ValueError(f"Falta indicar la columna de {campo}.")
+    columnas = sorted({c for c in mapeo.values() if c})
+    stats = {"leidas": 0, "nuevas": 0, "duplicadas": 0, "invalidas": 0}
+
+    with _lock_importacion:
+        indice = _cargar_indice(username)
+        ocurrencias = _Ocurrencias()
+        lector = pd.read_csv(
+            fuente,
+            sep=sep,
+            decimal=decimal,
+            encoding=encoding,
+            usecols=columnas,
+            dtype={c: str for c in columnas if c != mapeo["monto"]},
+            chunksize=tam_bloque,
+        )
+        for bloque in lector:
+            df, invalidas = _preparar_bloque(bloque, username, mapeo, decimal, dayfirst)
+            claves = huellas(df, ocurrencias)
+            nuevas = ~_contiene(indice, claves)
+            # Movimientos primero: si se corta aquí, reimportar repite el
+            # bloque en vez de perderlo
+            if nuevas.any():
+                storage.append_lote(df[nuevas])
+                indice = _unir(indice, claves[nuevas])
+                _guardar_indice(username, indice)
+
+            stats["leidas"] += len(bloque)
+            stats["invalidas"] += invalidas
+            stats["nuevas"] += int(nuevas.sum())
+            stats["duplicadas"] += int((~nuevas).sum())
+            if al_avanzar is not None:
+                al_avanzar(dict(stats))
+
+        if stats["nuevas"] and storage.BACKEND == "archivos":
+            # Una sola compactación al final deja el histórico indexado
+            storage.compact_movimientos()
+    return stats
+
+
+if __name__ == "__main__":
+    # python -m asesor.importacion extracto.csv --usuario ana --fecha Fecha --monto Importe
+    parser = argparse.ArgumentParser(description="Importa un extracto bancario CSV.")
+    parser.add_argument("archivo")
+    parser.add_argument("--usuario", required=True)
+    for campo in CAMPOS:
+        parser.add_argument(f"--{campo}", help=f"columna del archivo con {campo}")
+    parser.add_argument("--sep", default=",")
+    parser.add_argument("--decimal", default=".")
+    parser.add_argument("--encoding", default="utf-8")
+    parser.add_argument("--dayfirst", action="store_true", help="fechas DD/MM/AAAA")
+    parser.add_argument("--bloque", type=int, default=TAM_BLOQUE)
+    args = parser.parse_args()
+
+    mapeo = {campo: getattr(args, campo) for campo in CAMPOS}
+    try:
+        stats = importar_csv(
+            args.archivo,
+            args.usuario,
+            mapeo,
+            sep=args.sep,
+            decimal=args.decimal,
+            dayfirst=args.dayfirst,
+            encoding=args.encoding,
+            tam_bloque=args.bloque,
+            al_avanzar=lambda s: print(f"  {s['leidas']:,} filas leídas...", file=sys.stderr),
+        )
+    except ValueError as e:
+        print(e)
+        sys.exit(2)
+    print(
+        f"Leídas {stats['leidas']:,}: {stats['nuevas']:,} nuevas, "
+        f"{stats['duplicadas']:,} duplicadas, {stats['invalidas']:,} inválidas."
+    )
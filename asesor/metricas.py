@@ -0,0 +1,166 @@
+import bisect
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+# ---------------------------------------------------------
+# Latencias de las funciones calientes
+# ---------------------------------------------------------
+# Se mide siempre salvo con ASESOR_METRICAS=0: cada medición es un par de
+# perf_counter y un lock, despreciable frente a lo que se mide.
+ACTIVAS = os.environ.get("ASESOR_METRICAS", "1") != "0"
+# Límites superiores (ms) de los cubos del histograma; el último es +inf
+LIMITES_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class Histograma:
+    __slots__ = ("llamadas", "total_ms", "max_ms", "filas", "cubos")
+
+    def __init__(self):
+        self.llamadas = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.filas = 0
+        self.cubos = [0] * (len(LIMITES_MS) + 1)
+
+    def registrar(self, ms, filas):
+        self.llamadas += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        if filas is not None:
+            self.filas += filas
+        self.cubos[bisect.bisect_left(LIMITES_MS, ms)] += 1
+
+    def percentil(self, p):
+        # Límite superior del cubo donde cae el percentil (cota, no exacto)
+        objetivo = p / 100 * self.llamadas
+        acumulado = 0
+        for i, n in enumerate(self.cubos):
+            acumulado += n
+            if n and acumulado >= objetivo:
+                return LIMITES_MS[i] if i < len(LIMITES_MS) else self.max_ms
+        return 0.0
+
+    def a_dict(self):
+        return {
+            "llamadas": self.llamadas,
+            "total_ms": self.total_ms,
+            "media_ms": self.total_ms / self.llamadas if self.llamadas else 0.0,
+            "p50_ms": self.percentil(50),
+            "p95_ms": self.percentil(95),
+            "p99_ms": self.percentil(99),
+            "max_ms": self.max_ms,
+            "filas": self.filas,
+            "cubos": dict(zip([str(l) for l in LIMITES_MS] + ["inf"], self.cubos)),
+        }
+
+
+_metricas = {}
+_lock = threading.Lock()
+_desde = datetime.now()
+
+
+def registrar(nombre, segundos, filas=None):
+    with _lock:
+        hist = _metricas.get(nombre)
+        if hist is None:
+            hist = _metricas[nombre] = Histograma()
+        hist.registrar(segundos * 1000, filas)
+
+
+@contextmanager
+def medir(nombre, filas=None):
+    """Mide el bloque `with`; `filas` es el número de filas que procesa."""
+    if not ACTIVAS:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(nombre, time.perf_counter() - inicio, filas)
+
+
+def medido(nombre=None, filas=None):
+    """Decorador: registra la latencia de cada llamada.
+
+    `filas(resultado)` devuelve cuántas filas produjo la llamada (p. ej.
+    len del DataFrame); por defecto no se cuentan.
+    """
+    def decorador(fn):
+        etiqueta = nombre or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def envoltura(*args, **kwargs):
+            if not ACTIVAS:
+                return fn(*args, **kwargs)
+            inicio = time.perf_counter()
+            resultado = fn(*args, **kwargs)
+            registrar(etiqueta, time.perf_counter() - inicio, filas(resultado) if filas else None)
+            return resultado
+
+        return envoltura
+    return decorador
+
+
+def resumen():
+    """{nombre: estadísticas} de todo lo medido desde el arranque o el último reinicio."""
+    with _lock:
+        return {nombre: hist.a_dict() for nombre, hist in sorted(_metricas.items())}
+
+
+def reiniciar():
+    global _desde
+    with _lock:
+        _metricas.clear()
+        _desde = datetime.now()
+
+
+def exportar():
+    """Métricas y estado de las cachés, listo para json.dump."""
+    from asesor import etiquetas, rollups, storage
+
+    return {
+        "desde": _desde.isoformat(timespec="seconds"),
+        "hasta": datetime.now().isoformat(timespec="seconds"),
+        "metricas": resumen(),
+        "caches": {
+            "movimientos": storage.cache_stats(),
+            "rollups": rollups.totales.cache.stats(),
+            "etiquetas": etiquetas.usos.cache.stats(),
+        },
+    }
+
+
+# ---------------------------------------------------------
+# Perfilado puntual con cProfile
+# ---------------------------------------------------------
+class Perfil:
+    def __init__(self):
+        self.texto = ""
+
+
+@contextmanager
+def perfilar(activo=True, lineas=40):
+    """Perfila el bloque con cProfile; al salir, `texto` tiene las funciones
+    con más tiempo acumulado."""
+    perfil = Perfil()
+    if not activo:
+        yield perfil
+        return
+    perfilador = cProfile.Profile()
+    perfilador.enable()
+    try:
+        yield perfil
+    finally:
+        perfilador.disable()
+        salida = io.StringIO()
+        pstats.Stats(perfilador, stream=salida).sort_stats("cumulative").print_stats(lineas)
+        perfil.texto = salida.getvalue()
@@ -0,0 +1,162 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from datetime import date, datetime
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from asesor import metricas, proyeccion, rollups, storage
+from asesor.analytics import ResumenUsuario, recomendaciones, resumir
+from asesor.proyeccion import ProyeccionUsuario
+
+
+# ---------------------------------------------------------
+# Resúmenes y recomendaciones precalculados por lotes
+# ---------------------------------------------------------
+# Un archivo por usuario con el resumen y las alertas del día; el panel lo
+# usa mientras los datos del usuario no hayan cambiado desde el cálculo.
+PRECALCULO_DIR = os.path.join(storage.DATA_DIR, "precalculo")
+# Usuarios por tarea enviada a cada proceso
+USUARIOS_POR_TAREA = 500
+
+
+def _ruta(username):
+    return storage.ruta_por_usuario(PRECALCULO_DIR, username, repartir=True)
+
+
+def _firma_datos(username):
+    # Lo que cambia cuando cambian los movimientos o el presupuesto del
+    # usuario, y solo entonces. Sin el contador de versión del proceso: se
+    # compara entre procesos.
+    if storage.BACKEND == "sqlite":
+        return ["sqlite", storage.version_usuario(username)]
+    firma = []
+    for ruta in [rollups.totales.ruta(username), storage.ruta_usuario(username)]:
+        try:
+            st_ruta = os.stat(ruta)
+            firma.append([st_ruta.st_mtime_ns, st_ruta.st_size])
+        except FileNotFoundError:
+            firma.append(None)
+    return firma
+
+
+def calcular_lote(usuarios, hoy=None):
+    """Resumen, proyección de fin de mes y recomendaciones de cada usuario,
+    listos para guardar. La proyección de todo el lote es una sola llamada."""
+    hoy = hoy or date.today()
+    totales = [rollups.cargar(username, cache=False) for username in usuarios]
+    perfiles = [storage.load_user(username) or {} for username in usuarios]
+    # Después de cargar: cargar() crea o reescribe el archivo de totales si
+    # faltaba o era de un formato anterior, y eso cambia su firma
+    firmas = [_firma_datos(username) for username in usuarios]
+    juntos = pd.concat(totales, ignore_index=True)
+    juntos["usuario"] = np.repeat(np.arange(len(usuarios)), [len(df) for df in totales])
+    proyectados = proyeccion.proyectar(juntos, perfiles, hoy)
+
+    generado = datetime.now().isoformat(timespec="seconds")
+    entradas = []
+    for i, username in enumerate(usuarios):
+        resumen = resumir(totales[i], perfiles[i], hoy)
+        proyeccion_mes = proyectados.usuario(i)
+        mensajes = recomendaciones(resumen, hoy) + proyeccion.alertas(proyeccion_mes)
+        entradas.append({
+            "username": username,
+            "hoy": hoy.isoformat(),
+            "generado": generado,
+            "firma": firmas[i],
+            "resumen": asdict(resumen),
+            "proyeccion": asdict(proyeccion_mes),
+            "recomendaciones": [list(r) for r in mensajes],
+        })
+    return entradas
+
+def calcular(username, hoy=None):
+    return calcular_lote([username], hoy)[0]
+
+
+def guardar(entrada):
+    ruta = _ruta(entrada["username"])
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    # Sin fsync: siempre se puede recalcular
+    storage.escribir_json_atomico(ruta, entrada, durable=False)
+
+
+@metricas.medido()
+def cargar(username, hoy=None):
+    """(ResumenUsuario, recomendaciones, ProyeccionUsuario) precalculados, o
+    None si no hay o ya no valen (otro día, o el usuario registró algo o
+    cambió su presupuesto)."""
+    hoy = hoy or date.today()
+    try:
+        with open(_ruta(username), "r", encoding="utf-8") as f:
+            entrada = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if (
+        entrada["hoy"] != hoy.isoformat()
+        or "proyeccion" not in entrada  # de una versión anterior
+        or entrada["firma"] != _firma_datos(username)
+    ):
+        return None
+    resumen = ResumenUsuario(**entrada["resumen"])
+    proyeccion_mes = ProyeccionUsuario(**entrada["proyeccion"])
+    return resumen, [tuple(r) for r in entrada["recomendaciones"]], proyeccion_mes
+
+
+def _procesar(usuarios, hoy):
+    # Tarea de un proceso del pool: cada usuario lee solo sus totales diarios
+    niveles = Counter()
+    for entrada in calcular_lote(usuarios, hoy):
+        guardar(entrada)
+        niveles.update(nivel for nivel, _ in entrada["recomendaciones"])
+    return len(usuarios), niveles
+
+
+def precalcular_todos(procesos=None, hoy=None, por_tarea=USUARIOS_POR_TAREA, al_avanzar=None):
+    """Precalcula a todos los usuarios repartiéndolos en un pool de procesos.
+
+    Devuelve (usuarios procesados, Counter de alertas por nivel).
+    """
+    hoy = hoy or date.today()
+    usuarios = sorted(storage.load_users())
+    tareas = [usuarios[i:i + por_tarea] for i in range(0, len(usuarios), por_tarea)]
+
+    def reunir(resultados):
+        hechos, niveles = 0, Counter()
+        for n, c in resultados:
+            hechos += n
+            niveles.update(c)
+            if al_avanzar is not None:
+                al_avanzar(hechos, len(usuarios))
+        return hechos, niveles
+
+    if procesos == 1:
+        return reunir(map(_procesar, tareas, repeat(hoy)))
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        return reunir(pool.map(_procesar, tareas, repeat(hoy)))
+
+
+if __name__ == "__main__":
+    # python -m asesor.precalculo [--procesos N]
+    parser = argparse.ArgumentParser(description="Precalcula resúmenes y alertas de todos los usuarios.")
+    parser.add_argument("--procesos", type=int, default=None, help="por defecto, uno por CPU")
+    parser.add_argument("--por-tarea", type=int, default=USUARIOS_POR_TAREA)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    hechos, niveles = precalcular_todos(
+        args.procesos,
+        por_tarea=args.por_tarea,
+        al_avanzar=lambda n, total: print(f"  {n:,}/{total:,} usuarios", file=sys.stderr),
+    )
+    segundos = time.perf_counter() - inicio
+    print(f"{hechos:,} usuarios precalculados en {segundos:.1f} s en {PRECALCULO_DIR}.")
+    for nivel, n in sorted(niveles.items()):
+        print(f"  {nivel}: {n:,}")
@@ -0,0 +1,240 @@
+import calendar
+from dataclasses import dataclass, field
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from asesor import metricas, recurrentes
+from asesor.analytics import DIAS_MES
+
+
+# ---------------------------------------------------------
+# Proyección de fin de mes
+# ---------------------------------------------------------
+# El gasto de los días que faltan se estima con el promedio diario de los
+# últimos VENTANA días completos, ponderado para que pesen más los recientes.
+VENTANA = 28
+VIDA_MEDIA = 7
+# Categoría que cubre cada presupuesto fijo: (campo en users.json, factor)
+PRESUPUESTOS = {
+    "Vivienda": ("housing_budget", 1),
+    "Comida": ("market_budget", 1),
+    "Transporte": ("transport_daily", DIAS_MES),
+}
+# Pesos de los días 1..VENTANA hacia atrás y su suma acumulada (con 0 delante)
+_PESOS = 0.5 ** (np.arange(VENTANA) / VIDA_MEDIA)
+_PESOS_ACUM = np.concatenate(([0.0], np.cumsum(_PESOS)))
+
+
+def _por_celda(celda, valores, tam):
+    # Suma de `valores` por celda; float también cuando no hay filas
+    return np.bincount(celda, weights=valores, minlength=tam).astype(float)
+
+
+@dataclass(slots=True)
+class ProyeccionUsuario:
+    gasto_mes: float = 0.0
+    gasto_diario: float = 0.0
+    gasto_proyectado: float = 0.0
+    ingreso_esperado: float = 0.0
+    saldo_fin_mes: float = 0.0
+    # {categoria: [proyectado, presupuesto]}
+    por_categoria: dict = field(default_factory=dict)
+
+    @property
+    def excesos(self):
+        """{categoria: exceso} de las categorías con presupuesto que se pasarían."""
+        return {
+            cat: proyectado - presupuesto
+            for cat, (proyectado, presupuesto) in self.por_categoria.items()
+            if presupuesto > 0 and proyectado > presupuesto
+        }
+
+
+@dataclass(slots=True)
+class Proyeccion:
+    """Proyección de varios usuarios a la vez: una fila por usuario."""
+
+    categorias: np.ndarray
+    gasto_mes: np.ndarray
+    gasto_diario: np.ndarray
+    ingreso_esperado: np.ndarray
+    # Matrices usuario x categoría
+    mes_cat: np.ndarray
+    proyectado_cat: np.ndarray
+    presupuesto_cat: np.ndarray
+
+    @property
+    def gasto_proyectado(self):
+        return self.proyectado_cat.sum(axis=1)
+
+    @property
+    def saldo_fin_mes(self):
+        # Un presupuesto fijo se gasta entero aunque aún no esté registrado;
+        # si lo registrado supera al presupuesto, cuenta lo registrado
+        comprometido = np.maximum(self.proyectado_cat, self.presupuesto_cat).sum(axis=1)
+        return self.ingreso_esperado - comprometido
+
+    @property
+    def excesos(self):
+        con_presupuesto = self.presupuesto_cat > 0
+        return np.where(con_presupuesto, np.maximum(0.0, self.proyectado_cat - self.presupuesto_cat), 0.0)
+
+    def usuario(self, i):
+        saldo = self.saldo_fin_mes
+        return ProyeccionUsuario(
+            gasto_mes=float(self.gasto_mes[i]),
+            gasto_diario=float(self.gasto_diario[i]),
+            gasto_proyectado=float(self.proyectado_cat[i].sum()),
+            ingreso_esperado=float(self.ingreso_esperado[i]),
+            saldo_fin_mes=float(saldo[i]),
+            por_categoria={
+                str(c): [float(p), float(b)]
+                for c, p, b in zip(self.categorias, self.proyectado_cat[i], self.presupuesto_cat[i])
+                if p > 0 or b > 0
+            },
+        )
+
+
+def _recurrentes_del_mes(perfiles, hoy):
+    # Una fila por (usuario, tipo, categoría) con lo que suman sus recurrentes
+    # hasta hoy y en todo el mes, contando ocurrencias sin generarlas
+    inicio_mes = hoy.replace(day=1)
+    fin_mes = hoy.replace(day=calendar.monthrange(hoy.year, hoy.month)[1])
+    filas = []
+    for i, perfil in enumerate(perfiles):
+        defs = recurrentes.definiciones(perfil)
+        if not defs:
+            continue
+        ocurrido = recurrentes.totales(defs, inicio_mes, hoy)
+        for (tipo, categoria), monto in recurrentes.totales(defs, inicio_mes, fin_mes).items():
+            filas.append((i, tipo, categoria, ocurrido.get((tipo, categoria), 0.0), monto))
+    return pd.DataFrame(filas, columns=["usuario", "tipo", "categoria", "ocurrido", "mes"])
+
+
+@metricas.medido()
+def proyectar(df_rollups, perfiles, hoy=None):
+    """Proyecta el fin de mes de todos los usuarios de una vez.
+
+    `df_rollups` son los totales diarios (ver asesor.rollups) de varios
+    usuarios juntos, con una columna `usuario` que es la posición de su
+    registro en `perfiles`. Todo se calcula con operaciones sobre arrays,
+    sin recorrer usuarios en Python (salvo para contar los recurrentes de
+    quienes los tienen).
+    """
+    hoy = hoy or date.today()
+    u = len(perfiles)
+    hoy64 = np.datetime64(hoy, "D")
+    inicio_mes = np.datetime64(hoy.replace(day=1), "D")
+    dias_mes = calendar.monthrange(hoy.year, hoy.month)[1]
+    restantes = dias_mes - hoy.day
+
+    gastos = df_rollups[df_rollups["tipo"] == "Gasto"]
+    ingresos = df_rollups[df_rollups["tipo"] == "Ingreso"]
+    presupuestos = np.array(
+        [[float(p.get(campo, 0.0)) * factor for campo, factor in PRESUPUESTOS.values()] for p in perfiles]
+    ).reshape(u, len(PRESUPUESTOS))
+
+    fijos = _recurrentes_del_mes(perfiles, hoy)
+    fijos_gasto = fijos[fijos["tipo"] == "Gasto"]
+    fijos_ingreso = fijos[fijos["tipo"] == "Ingreso"]
+
+    # Categorías por hash (factorize) y no ordenando el millón de textos
+    cat_idx, vistas = pd.factorize(gastos["categoria"])
+    categorias = np.unique(np.concatenate((
+        np.asarray(vistas, dtype=str), list(PRESUPUESTOS), fijos_gasto["categoria"].to_numpy(dtype=str)
+    )))
+    cat_idx = np.searchsorted(categorias, np.asarray(vistas, dtype=str))[cat_idx]
+    c = len(categorias)
+    quien = gastos["usuario"].to_numpy(dtype=np.int64)
+    dias = gastos["dia"].to_numpy().astype("datetime64[D]")
+    monto = gastos["monto"].to_numpy(dtype=float)
+    celda = quien * c + cat_idx
+
+    en_mes = (dias >= inicio_mes) & (dias < inicio_mes + dias_mes)
+    mes_cat = _por_celda(celda, np.where(en_mes, monto, 0.0), u * c).reshape(u, c)
+    # Los recurrentes que ya ocurrieron cuentan como gastados; los que faltan
+    # se suman enteros a la proyección (no entran en el ritmo diario)
+    celda_fija = fijos_gasto["usuario"].to_numpy(dtype=np.int64) * c + np.searchsorted(
+        categorias, fijos_gasto["categoria"].to_numpy(dtype=str)
+    )
+    ocurrido = fijos_gasto["ocurrido"].to_numpy(dtype=float)
+    mes_cat += _por_celda(celda_fija, ocurrido, u * c).reshape(u, c)
+    pendiente_cat = _por_celda(
+        celda_fija, fijos_gasto["mes"].to_numpy(dtype=float) - ocurrido, u * c
+    ).reshape(u, c)
+
+    # Ritmo diario por categoría: promedio ponderado de los días completos de
+    # la ventana; un usuario nuevo solo promedia los días desde que empezó
+    atras = (hoy64 - dias).astype(np.int64)
+    en_ventana = (atras >= 1) & (atras <= VENTANA)
+    peso = np.where(en_ventana, _PESOS[np.clip(atras - 1, 0, VENTANA - 1)], 0.0)
+    ritmo_cat = _por_celda(celda, monto * peso, u * c).reshape(u, c)
+    # Días de historia de cada usuario (hasta VENTANA): el más antiguo con datos
+    atras_todos = np.clip(
+        (hoy64 - df_rollups["dia"].to_numpy().astype("datetime64[D]")).astype(np.int64), 0, VENTANA
+    )
+    hay = np.bincount(
+        df_rollups["usuario"].to_numpy(dtype=np.int64) * (VENTANA + 1) + atras_todos,
+        minlength=u * (VENTANA + 1),
+    ).reshape(u, VENTANA + 1) > 0
+    dias_validos = VENTANA - np.argmax(hay[:, ::-1], axis=1)
+    normalizador = _PESOS_ACUM[dias_validos]
+    ritmo_cat = np.divide(
+        ritmo_cat, normalizador[:, None], out=np.zeros_like(ritmo_cat), where=normalizador[:, None] > 0
+    )
+
+    presupuesto_cat = np.zeros((u, c))
+    presupuesto_cat[:, np.searchsorted(categorias, list(PRESUPUESTOS))] = presupuestos
+
+    dias_ingreso = ingresos["dia"].to_numpy().astype("datetime64[D]")
+    ingreso_mes = _por_celda(
+        ingresos["usuario"].to_numpy(dtype=np.int64),
+        np.where(
+            (dias_ingreso >= inicio_mes) & (dias_ingreso < inicio_mes + dias_mes),
+            ingresos["monto"].to_numpy(dtype=float),
+            0.0,
+        ),
+        u,
+    )
+    # Un ingreso recurrente del mes se espera entero aunque aún no llegue
+    ingreso_mes += _por_celda(
+        fijos_ingreso["usuario"].to_numpy(dtype=np.int64), fijos_ingreso["mes"].to_numpy(dtype=float), u
+    )
+    ingreso_mensual = np.array([float(p.get("monthly_income", 0.0)) for p in perfiles]).reshape(u)
+    return Proyeccion(
+        categorias=categorias,
+        gasto_mes=mes_cat.sum(axis=1),
+        gasto_diario=ritmo_cat.sum(axis=1),
+        ingreso_esperado=np.maximum(ingreso_mensual, ingreso_mes),
+        mes_cat=mes_cat,
+        proyectado_cat=mes_cat + ritmo_cat * restantes + pendiente_cat,
+        presupuesto_cat=presupuesto_cat,
+    )
+
+def proyectar_usuario(df_rollup, user_info, hoy=None):
+    """ProyeccionUsuario de un solo usuario (el panel en vivo)."""
+    return proyectar(df_rollup.assign(usuario=0), [user_info], hoy).usuario(0)
+
+def alertas(p):
+    """Lista de (nivel, mensaje) de una ProyeccionUsuario, como recomendaciones."""
+    if p.gasto_mes <= 0 and p.gasto_diario <= 0:
+        return []
+    mensajes = []
+    presupuestos = sum(b for _, b in p.por_categoria.values())
+    # Si los presupuestos fijos ya no caben en el ingreso el panel lo avisa aparte
+    if p.saldo_fin_mes < 0 and presupuestos < p.ingreso_esperado:
+        mensajes.append((
+            "warning",
+            f"🔮 Al ritmo de los últimos días terminarías el mes con un saldo de "
+            f"**${p.saldo_fin_mes:,.2f}**. Reduce gastos para no quedar en negativo.",
+        ))
+    for cat, exceso in sorted(p.excesos.items(), key=lambda x: -x[1]):
+        proyectado, presupuesto = p.por_categoria[cat]
+        mensajes.append((
+            "info",
+            f"🔮 En **{cat}** proyectas gastar ${proyectado:,.2f} este mes, "
+            f"${exceso:,.2f} más que tu presupuesto de ${presupuesto:,.2f}.",
+        ))
+    return mensajes
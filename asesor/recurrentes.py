@@ -0,0 +1,172 @@
+import calendar
+from dataclasses import asdict, dataclass
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from asesor import esquema
+
+
+# ---------------------------------------------------------
+# Movimientos recurrentes
+# ---------------------------------------------------------
+# Arriendo, sueldo o suscripciones se definen una sola vez (en el registro del
+# usuario, clave "recurrentes") en lugar de guardar la misma fila cada mes.
+# Sus ocurrencias se generan solo para el rango que se consulta y la suma de
+# un rango sale de contarlas, sin generarlas.
+#
+# Frecuencia -> días entre ocurrencias; las mensuales caen el mismo día del
+# mes que el inicio (o el último día, en los meses más cortos)
+FRECUENCIAS = {"Mensual": None, "Quincenal": 14, "Semanal": 7}
+# Prefijo de la etiqueta de las ocurrencias en el historial
+MARCA = "↻ "
+COLUMNAS_ROLLUP = ["dia", "tipo", "categoria", "monto", "n"]
+
+
+def _dia(valor):
+    return pd.Timestamp(valor).date()
+
+def _mes(dia):
+    # Meses desde el año 0: el mes siguiente es +1
+    return dia.year * 12 + dia.month - 1
+
+
+@dataclass(slots=True, frozen=True)
+class Recurrente:
+    id: str
+    tipo: str
+    categoria: str
+    monto: float
+    frecuencia: str
+    inicio: date
+    # Última fecha posible (incluida); None si no termina
+    fin: date | None = None
+    etiqueta: str = ""
+
+    @classmethod
+    def desde_registro(cls, datos):
+        return cls(
+            id=str(datos["id"]),
+            tipo=datos["tipo"],
+            categoria=datos["categoria"],
+            monto=float(datos["monto"]),
+            frecuencia=datos["frecuencia"],
+            inicio=_dia(datos["inicio"]),
+            fin=_dia(datos["fin"]) if datos.get("fin") else None,
+            etiqueta=datos.get("etiqueta", ""),
+        )
+
+    def a_registro(self):
+        datos = asdict(self)
+        datos["inicio"] = self.inicio.isoformat()
+        datos["fin"] = self.fin.isoformat() if self.fin else None
+        return datos
+
+    def _rango(self, desde, hasta):
+        desde = max(_dia(desde), self.inicio)
+        hasta = _dia(hasta)
+        if self.fin is not None:
+            hasta = min(hasta, self.fin)
+        return desde, hasta
+
+    def _en_mes(self, mes):
+        anio, m = divmod(mes, 12)
+        return date(anio, m + 1, min(self.inicio.day, calendar.monthrange(anio, m + 1)[1]))
+
+    def contar(self, desde, hasta):
+        """Ocurrencias en [desde, hasta] (incluidos), sin generarlas."""
+        desde, hasta = self._rango(desde, hasta)
+        if desde > hasta:
+            return 0
+        paso = FRECUENCIAS[self.frecuencia]
+        if paso is None:
+            # Una por mes; sobran la del primer mes si cae antes de `desde` y
+            # la del último si cae después de `hasta`
+            primero, ultimo = _mes(desde), _mes(hasta)
+            n = ultimo - primero + 1
+            n -= self._en_mes(primero) < desde
+            n -= self._en_mes(ultimo) > hasta
+            return max(0, n)
+        k0, k1 = self._pasos(desde, hasta, paso)
+        return max(0, k1 - k0 + 1)
+
+    def _pasos(self, desde, hasta, paso):
+        # Primera y última k con inicio + k * paso dentro de [desde, hasta]
+        return -(-(desde - self.inicio).days // paso), (hasta - self.inicio).days // paso
+
+    def fechas(self, desde, hasta):
+        """Días (datetime64[D]) de las ocurrencias en [desde, hasta]."""
+        desde, hasta = self._rango(desde, hasta)
+        if desde > hasta:
+            return np.array([], dtype="datetime64[D]")
+        a, b = np.datetime64(desde, "D"), np.datetime64(hasta, "D")
+        paso = FRECUENCIAS[self.frecuencia]
+        if paso is None:
+            meses = np.arange(np.datetime64(desde, "M"), np.datetime64(hasta, "M") + 1)
+            primeros = meses.astype("datetime64[D]")
+            largos = ((meses + 1).astype("datetime64[D]") - primeros).astype(np.int64)
+            dias = primeros + np.minimum(self.inicio.day, largos) - 1
+        else:
+            k0, k1 = self._pasos(desde, hasta, paso)
+            dias = np.datetime64(self.inicio, "D") + np.arange(k0, k1 + 1) * paso
+        return dias[(dias >= a) & (dias <= b)]
+
+
+def definiciones(user_info):
+    """Recurrentes del registro del usuario, como tupla (sirve de firma)."""
+    return tuple(Recurrente.desde_registro(r) for r in (user_info or {}).get("recurrentes", []))
+
+def totales(defs, desde, hasta):
+    """{(tipo, categoria): monto} de las ocurrencias en [desde, hasta]."""
+    suma = {}
+    for r in defs:
+        n = r.contar(desde, hasta)
+        if n:
+            suma[(r.tipo, r.categoria)] = suma.get((r.tipo, r.categoria), 0.0) + n * r.monto
+    return suma
+
+def _ocurrencias(defs, desde, hasta):
+    # (días, posición en `defs` de cada ocurrencia)
+    fechas = [r.fechas(desde, hasta) for r in defs]
+    dias = np.concatenate(fechas) if fechas else np.array([], dtype="datetime64[D]")
+    cual = np.repeat(np.arange(len(defs)), [len(f) for f in fechas])
+    return dias, cual
+
+def rollup(defs, desde, hasta):
+    """Ocurrencias de [desde, hasta] como filas de totales diarios
+    (ver asesor.rollups), una por ocurrencia."""
+    dias, cual = _ocurrencias(defs, desde, hasta)
+    return pd.DataFrame({
+        "dia": dias.astype("datetime64[ns]"),
+        "tipo": np.array([r.tipo for r in defs], dtype=object)[cual],
+        "categoria": np.array([r.categoria for r in defs], dtype=object)[cual],
+        "monto": np.array([r.monto for r in defs], dtype=float)[cual],
+        "n": np.ones(len(dias), dtype=np.int64),
+    }, columns=COLUMNAS_ROLLUP)
+
+def combinar(df_rollup, defs, hoy=None):
+    """Totales diarios del usuario más las ocurrencias hasta `hoy` incluido."""
+    if not defs:
+        return df_rollup
+    hoy = hoy or date.today()
+    virtuales = rollup(defs, min(r.inicio for r in defs), hoy)
+    if virtuales.empty:
+        return df_rollup
+    if df_rollup.empty:
+        return virtuales
+    return pd.concat([df_rollup, virtuales], ignore_index=True)
+
+def movimientos(username, defs, desde, hasta):
+    """Ocurrencias de [desde, hasta] como movimientos con el esquema compacto."""
+    dias, cual = _ocurrencias(defs, desde, hasta)
+    if not len(dias):
+        return esquema.vacio()
+    return esquema.compactar(pd.DataFrame({
+        "username": username,
+        "fecha": dias.astype("datetime64[ns]"),
+        "tipo": np.array([r.tipo for r in defs], dtype=object)[cual],
+        "categoria": np.array([r.categoria for r in defs], dtype=object)[cual],
+        "etiqueta": np.array([MARCA + (r.etiqueta or r.categoria) for r in defs], dtype=object)[cual],
+        "monto": np.array([r.monto for r in defs], dtype=float)[cual],
+    }))
@@ -0,0 +1,175 @@
+import os
+import sys
+from collections import defaultdict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from asesor import esquema, metricas, recurrentes, storage
+from asesor.analytics import IndiceTemporal
+from asesor.derivados import DerivadoPorUsuario
+
+
+# ---------------------------------------------------------
+# Totales diarios por (username, día, tipo, categoría)
+# ---------------------------------------------------------
+# Un archivo por usuario con {"AAAA-MM-DD|tipo|categoria": [centavos, n]}. Se
+# actualiza al anexar movimientos, así el panel no recorre el histórico. Se
+# suma en centavos enteros para que cada total sea exacto; a pesos solo se
+# pasa al cargar.
+ROLLUPS_DIR = os.path.join(storage.DATA_DIR, "rollups")
+COLUMNAS_ROLLUP = ["dia", "tipo", "categoria", "monto", "n"]
+
+
+def _clave(dia, tipo, categoria):
+    return f"{dia}|{tipo}|{categoria}"
+
+
+class TotalesDiarios(DerivadoPorUsuario):
+    contenido = "celdas"
+
+    def a_archivo(self, celdas):
+        return {"unidad": "centavos", "celdas": celdas}
+
+    def desde_archivo(self, archivo):
+        # Los archivos con montos en pesos (versiones anteriores) se reconstruyen
+        return archivo["celdas"] if archivo.get("unidad") == "centavos" else None
+
+    def agregar(self, df):
+        # {username: {clave: [centavos, n]}} a partir de movimientos crudos o compactos
+        if df.empty:
+            return {}
+        dias = pd.to_datetime(df["fecha"], format="ISO8601").dt.strftime("%Y-%m-%d")
+        agrupado = (
+            pd.DataFrame({
+                "username": esquema.texto(df["username"]),
+                "dia": dias,
+                "tipo": esquema.texto(df["tipo"]),
+                "categoria": esquema.texto(df["categoria"]),
+                "centavos": esquema.centavos(df),
+            })
+            .groupby(["username", "dia", "tipo", "categoria"], sort=False)["centavos"]
+            .agg(["sum", "count"])
+        )
+        por_usuario = defaultdict(dict)
+        for (username, dia, tipo, categoria), (centavos, n) in zip(
+            agrupado.index, agrupado.itertuples(index=False)
+        ):
+            por_usuario[username][_clave(dia, tipo, categoria)] = [int(centavos), int(n)]
+        return por_usuario
+
+    def de_filas(self, filas):
+        por_usuario = defaultdict(dict)
+        for fila in filas:
+            dia = pd.Timestamp(fila["fecha"]).strftime("%Y-%m-%d")
+            clave = _clave(dia, fila["tipo"], fila["categoria"])
+            celda = por_usuario[fila["username"]].setdefault(clave, [0, 0])
+            # Mismo redondeo que esquema.centavos
+            celda[0] += int(np.rint(float(fila["monto"]) * 100))
+            celda[1] += 1
+        return por_usuario
+
+    def acumular(self, celdas, nuevas):
+        for clave, (centavos, n) in nuevas.items():
+            celda = celdas.setdefault(clave, [0, 0])
+            celda[0] += centavos
+            celda[1] += n
+
+
+totales = TotalesDiarios(ROLLUPS_DIR, max_entradas=1024, max_bytes=64 * 1024 * 1024)
+
+
+def reconstruir(username=None):
+    """Recalcula los totales desde los movimientos (de un usuario o de todos)."""
+    return totales.reconstruir(username)
+
+def _cargar_disco(username):
+    celdas = totales.leer(username)
+    if celdas is None:
+        reconstruir(username)
+        celdas = totales.leer(username) or {}
+    # Columnas armadas con NumPy: construir el DataFrame fila a fila era lo
+    # más caro de cargar un usuario
+    partes = [clave.split("|", 2) for clave in celdas]
+    valores = list(celdas.values())
+    dias = np.array([p[0] for p in partes], dtype="datetime64[D]")
+    orden = np.argsort(dias, kind="stable")
+    return pd.DataFrame({
+        "dia": dias[orden].astype("datetime64[ns]"),
+        "tipo": np.array([p[1] for p in partes], dtype=object)[orden],
+        "categoria": np.array([p[2] for p in partes], dtype=object)[orden],
+        "monto": np.array([v[0] for v in valores], dtype=np.int64)[orden] / 100,
+        "n": np.array([v[1] for v in valores], dtype=np.int64)[orden],
+    }, columns=COLUMNAS_ROLLUP)
+
+def _medir(df):
+    return int(df.memory_usage(index=True).sum())
+
+@metricas.medido(filas=len)
+def cargar(username, cache=True):
+    """DataFrame con columnas dia, tipo, categoria, monto y n del usuario.
+
+    Con cache=False se lee sin pasar por la caché (procesos por lotes que
+    recorren a todos los usuarios una sola vez).
+    """
+    if storage.BACKEND == "sqlite":
+        # SQLite agrega con GROUP BY; no hay archivos de totales que mantener
+        cargar_df = lambda: storage.base_sqlite().rollup_diario(username)
+    else:
+        cargar_df = lambda: _cargar_disco(username)
+    if not cache:
+        return cargar_df()
+    df = totales.obtener(username, cargar_df, medir=_medir)
+    return df.copy(deep=False)
+
+@metricas.medido()
+def indice(username):
+    """analytics.IndiceTemporal del usuario, armado una vez y compartido entre
+    sesiones mientras sus totales no cambien.
+
+    Incluye las ocurrencias de sus movimientos recurrentes hasta hoy, así que
+    también se rearma al cambiar de día o de recurrentes.
+    """
+    defs = recurrentes.definiciones(storage.load_user(username))
+    hoy = date.today()
+    return totales.cache.obtener(
+        ("indice", username),
+        (totales.firma(username), defs, hoy),
+        lambda: IndiceTemporal(recurrentes.combinar(cargar(username), defs, hoy)),
+        medir=lambda i: i.nbytes,
+    )
+
+def verificar(username=None):
+    """Usuarios cuyos totales no cuadran con los movimientos crudos."""
+    if storage.BACKEND == "sqlite":
+        return []
+    df = storage.load_movimientos(username)
+    esperado = totales.agregar(df)
+    usuarios = [username] if username is not None else sorted(esperado)
+    distintos = []
+    for u in usuarios:
+        actual = totales.leer(u) or {}
+        esp = esperado.get(u, {})
+        # Centavos enteros: tienen que coincidir exactamente
+        if actual != esp:
+            distintos.append(u)
+    return distintos
+
+
+if __name__ == "__main__":
+    # python -m asesor.rollups reconstruir [usuario]
+    # python -m asesor.rollups verificar [usuario]
+    accion = sys.argv[1] if len(sys.argv) > 1 else None
+    usuario = sys.argv[2] if len(sys.argv) > 2 else None
+    if accion == "reconstruir":
+        print(f"Usuarios reconstruidos: {reconstruir(usuario)}")
+    elif accion == "verificar":
+        distintos = verificar(usuario)
+        if distintos:
+            print("Totales inconsistentes para: " + ", ".join(distintos))
+            sys.exit(1)
+        print("Totales consistentes con los movimientos.")
+    else:
+        print("Uso: python -m asesor.rollups {reconstruir,verificar} [usuario]")
+        sys.exit(2)
@@ -0,0 +1,197 @@
+import hashlib
+import math
+import uuid
+from dataclasses import replace
+from datetime import date, datetime
+
+import pandas as pd
+
+from asesor import esquema, metricas, precalculo, proyeccion, recurrentes, rollups
+from asesor.analytics import IndiceTemporal, ResumenUsuario, recomendaciones, resumir
+from asesor.storage import (
+    actualizar_usuario,
+    append_movimientos,
+    crear_usuario,
+    load_user,
+)
+
+
+# ---------------------------------------------------------
+# Funciones de negocio sin Streamlit
+# ---------------------------------------------------------
+# Las usan app.py, la API HTTP (asesor.api) y cualquier script; importar este
+# módulo no crea carpetas ni necesita una sesión de Streamlit.
+CATEGORIAS = [
+    "Vivienda",
+    "Comida",
+    "Transporte",
+    "Servicios",
+    "Ocio",
+    "Salud",
+    "Deudas",
+    "Otros",
+]
+TIPOS = ["Gasto", "Ingreso"]
+
+
+def hash_password(password: str) -> str:
+    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+def autenticar(username, password):
+    """True si `username` existe y la contraseña es la suya."""
+    user_info = load_user(username)
+    return user_info is not None and hash_password(password) == user_info["password_hash"]
+
+def registrar_usuario(username, password):
+    """Crea la cuenta; False si el nombre ya existe."""
+    return crear_usuario(username, {
+        "password_hash": hash_password(password),
+        "monthly_income": 0.0,
+        "created_at": datetime.now().isoformat()
+    })
+
+def actualizar_presupuesto(username, ingreso, vivienda, mercado, transporte_diario):
+    actualizar_usuario(username, {
+        "monthly_income": float(ingreso),
+        "housing_budget": float(vivienda),
+        "market_budget": float(mercado),
+        "transport_daily": float(transporte_diario),
+    })
+
+@metricas.medido()
+def obtener_resumen_usuario(username: str) -> ResumenUsuario:
+    user_info = load_user(username) or {}
+
+    # Totales diarios precalculados: no dependen de cuántos movimientos haya
+    return resumir(rollups.cargar(username), user_info)
+
+def obtener_proyeccion_usuario(username: str) -> proyeccion.ProyeccionUsuario:
+    return proyeccion.proyectar_usuario(rollups.cargar(username), load_user(username) or {})
+
+def obtener_indice_usuario(username: str) -> IndiceTemporal:
+    # Totales de cualquier rango de fechas con búsqueda binaria + resta; el
+    # índice se arma una vez y se comparte hasta que cambien los totales
+    return rollups.indice(username)
+
+def obtener_panel(username):
+    """(ResumenUsuario, recomendaciones, ProyeccionUsuario) del panel.
+
+    Del lote nocturno si sigue vigente; si no, se calcula al momento.
+    """
+    precalculado = precalculo.cargar(username)
+    if precalculado is not None:
+        return precalculado
+    resumen = obtener_resumen_usuario(username)
+    proyeccion_mes = obtener_proyeccion_usuario(username)
+    return resumen, recomendaciones(resumen) + proyeccion.alertas(proyeccion_mes), proyeccion_mes
+
+
+# ---------------------------------------------------------
+# Registro de movimientos
+# ---------------------------------------------------------
+def movimiento(username, fecha, tipo, categoria, monto, etiqueta=""):
+    """Fila lista para storage.append_movimientos; ValueError si no es válida."""
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo desconocido: {tipo}")
+    try:
+        monto = float(monto)
+    except (TypeError, ValueError):
+        raise ValueError(f"Monto no numérico: {monto}") from None
+    if not math.isfinite(monto):
+        raise ValueError(f"Monto no válido: {monto}")
+    if not monto > 0:
+        raise ValueError("El monto debe ser mayor que 0.")
+    try:
+        marca = pd.Timestamp(fecha)
+    except (TypeError, ValueError):
+        raise ValueError(f"Fecha no válida: {fecha}") from None
+    if pd.isna(marca):
+        raise ValueError("Falta la fecha.")
+    if not esquema.fecha_valida(marca):
+        raise ValueError(
+            f"Fecha fuera de rango: {fecha} (entre {esquema.FECHA_MIN:%Y-%m-%d} y {esquema.FECHA_MAX:%Y-%m-%d})"
+        )
+    return {
+        "username": username,
+        "fecha": marca.to_pydatetime(),
+        "tipo": tipo,
+        "categoria": str(categoria or "Otros"),
+        "etiqueta": str(etiqueta or ""),
+        "monto": monto,
+    }
+
+def registrar_movimientos(username, movimientos):
+    """Valida y anexa varios movimientos de `username` en una sola escritura.
+
+    `movimientos` son dicts con fecha, tipo, categoria, monto y etiqueta
+    (opcional). Si alguno no es válido no se guarda ninguno.
+    """
+    filas = [
+        movimiento(
+            username,
+            m.get("fecha"),
+            m.get("tipo"),
+            m.get("categoria"),
+            m.get("monto"),
+            m.get("etiqueta", ""),
+        )
+        for m in movimientos
+    ]
+    if filas:
+        append_movimientos(filas)
+    return len(filas)
+
+
+# ---------------------------------------------------------
+# Movimientos recurrentes
+# ---------------------------------------------------------
+# Se guardan como definiciones en el registro del usuario; el panel, las
+# gráficas y el historial generan sus ocurrencias al consultar.
+def obtener_recurrentes(username):
+    return list(recurrentes.definiciones(load_user(username)))
+
+def agregar_recurrente(username, tipo, categoria, monto, frecuencia, inicio, fin=None, etiqueta=""):
+    """Guarda una definición nueva y la devuelve; ValueError si no es válida."""
+    datos = movimiento(username, inicio, tipo, categoria, monto, etiqueta)
+    if frecuencia not in recurrentes.FRECUENCIAS:
+        raise ValueError(f"Frecuencia desconocida: {frecuencia}")
+    inicio = datos["fecha"].date()
+    if fin:
+        try:
+            fin = pd.Timestamp(fin).date()
+        except (TypeError, ValueError):
+            raise ValueError(f"Fecha no válida: {fin}") from None
+        if fin < inicio:
+            raise ValueError("La fecha final es anterior a la inicial.")
+    nuevo = recurrentes.Recurrente(
+        id=uuid.uuid4().hex[:12],
+        tipo=tipo,
+        categoria=datos["categoria"],
+        monto=datos["monto"],
+        frecuencia=frecuencia,
+        inicio=inicio,
+        fin=fin or None,
+        etiqueta=datos["etiqueta"],
+    )
+    actuales = obtener_recurrentes(username)
+    actualizar_usuario(username, {"recurrentes": [r.a_registro() for r in actuales + [nuevo]]})
+    return nuevo
+
+def terminar_recurrente(username, id_recurrente, fin=None):
+    """Deja de generar ocurrencias después de `fin` (hoy si no se indica);
+    las anteriores siguen contando. Una definición que empieza después de
+    `fin` no llegó a tener ocurrencias: se elimina."""
+    fin = pd.Timestamp(fin or date.today()).date()
+    definiciones = []
+    for r in obtener_recurrentes(username):
+        if r.id == id_recurrente:
+            if fin < r.inicio:
+                continue
+            r = replace(r, fin=min(fin, r.fin or fin))
+        definiciones.append(r)
+    actualizar_usuario(username, {"recurrentes": [r.a_registro() for r in definiciones]})
+
+def eliminar_recurrente(username, id_recurrente):
+    """Quita una definición con todas sus ocurrencias, también las pasadas."""
+    restantes = [r for r in obtener_recurrentes(username) if r.id != id_recurrente]
+    actualizar_usuario(username, {"recurrentes": [r.a_registro() for r in restantes]})
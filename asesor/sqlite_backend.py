@@ -0,0 +1,366 @@
+import json
+import queue
+import re
+import sqlite3
+import sys
+from contextlib import contextmanager
+from datetime import timedelta
+
+import pandas as pd
+
+from asesor import esquema
+
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    username TEXT PRIMARY KEY,
+    datos TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS movimientos (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    categoria TEXT NOT NULL,
+    etiqueta TEXT,
+    monto REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_mov_usuario_fecha ON movimientos (username, fecha);
+CREATE INDEX IF NOT EXISTS idx_mov_usuario_categoria ON movimientos (username, categoria);
+CREATE TABLE IF NOT EXISTS versiones (
+    username TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+FORMATO_FECHA = "%Y-%m-%d %H:%M:%S"
+INSERT_MOV = (
+    "INSERT INTO movimientos (username, fecha, tipo, categoria, etiqueta, monto) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+SUBIR_VERSION = (
+    "INSERT INTO versiones (username, version) VALUES (?, 1) "
+    "ON CONFLICT (username) DO UPDATE SET version = version + 1"
+)
+
+
+def _centavos(monto):
+    # Como esquema.centavos (np.rint): los medios centavos van al par; el
+    # round() de SQL los aleja del cero
+    return None if monto is None else int(round(monto * 100))
+
+
+def _contiene(etiqueta, texto):
+    # Como str.contains(case=False, regex=False) en historial: LIKE solo
+    # ignora mayúsculas en ASCII ("Á", "Ñ")
+    return etiqueta is not None and re.search(re.escape(texto), etiqueta, re.IGNORECASE) is not None
+
+
+class PoolConexiones:
+    """Conexiones reutilizables: cada hilo toma una en exclusiva mientras la
+    usa y la devuelve al terminar (Streamlit crea un hilo por ejecución del
+    script, así que no sirve atar la conexión al hilo)."""
+
+    def __init__(self, ruta, max_libres=8):
+        self.ruta = ruta
+        self._libres = queue.LifoQueue(maxsize=max_libres)
+
+    def _nueva(self):
+        con = sqlite3.connect(self.ruta, timeout=30, check_same_thread=False, isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("PRAGMA foreign_keys=ON")
+        con.create_function("centavos", 1, _centavos, deterministic=True)
+        con.create_function("contiene", 2, _contiene, deterministic=True)
+        return con
+
+    @contextmanager
+    def conexion(self):
+        try:
+            con = self._libres.get_nowait()
+        except queue.Empty:
+            con = self._nueva()
+        try:
+            yield con
+        finally:
+            if con.in_transaction:
+                con.rollback()
+            try:
+                self._libres.put_nowait(con)
+            except queue.Full:
+                con.close()
+
+    def cerrar(self):
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class SqliteStore:
+    """Usuarios y movimientos en una base SQLite en modo WAL."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.pool = PoolConexiones(ruta)
+        with self.pool.conexion() as con:
+            con.executescript(ESQUEMA)
+
+    @contextmanager
+    def transaccion(self):
+        # BEGIN IMMEDIATE toma el lock de escritura al empezar, así dos
+        # lectura-modificación-escritura no se cruzan
+        with self.pool.conexion() as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                yield con
+            except BaseException:
+                con.rollback()
+                raise
+            con.commit()
+
+    # Cada escritura sube, en su misma transacción, la versión de los usuarios
+    # que toca: otros procesos detectan así qué usuarios cambiaron sin mirar
+    # toda la base
+    @staticmethod
+    def _subir_versiones(con, usuarios):
+        con.executemany(SUBIR_VERSION, [(u,) for u in sorted(set(usuarios))])
+
+    @staticmethod
+    def _subir_todas(con):
+        # Antes de reemplazar una tabla entera: también los usuarios sin
+        # versión todavía (bases anteriores a la tabla versiones)
+        con.execute(
+            "INSERT OR IGNORE INTO versiones (username, version) "
+            "SELECT username, 0 FROM usuarios UNION SELECT username, 0 FROM movimientos"
+        )
+        con.execute("UPDATE versiones SET version = version + 1")
+
+    def version(self, username):
+        with self.pool.conexion() as con:
+            fila = con.execute(
+                "SELECT version FROM versiones WHERE username = ?", (username,)
+            ).fetchone()
+        return fila[0] if fila else 0
+
+    # ---------------- Usuarios ----------------
+    def load_users(self):
+        with self.pool.conexion() as con:
+            filas = con.execute("SELECT username, datos FROM usuarios").fetchall()
+        return {username: json.loads(datos) for username, datos in filas}
+
+    def load_user(self, username):
+        with self.pool.conexion() as con:
+            fila = con.execute(
+                "SELECT datos FROM usuarios WHERE username = ?", (username,)
+            ).fetchone()
+        return json.loads(fila[0]) if fila else None
+
+    def save_users(self, users):
+        with self.transaccion() as con:
+            self._subir_todas(con)
+            con.execute("DELETE FROM usuarios")
+            con.executemany(
+                "INSERT INTO usuarios (username, datos) VALUES (?, ?)",
+                [(u, json.dumps(d, ensure_ascii=False)) for u, d in users.items()],
+            )
+            self._subir_versiones(con, users)
+
+    def crear_usuario(self, username, datos):
+        with self.transaccion() as con:
+            cur = con.execute(
+                "INSERT OR IGNORE INTO usuarios (username, datos) VALUES (?, ?)",
+                (username, json.dumps(datos, ensure_ascii=False)),
+            )
+            if cur.rowcount != 1:
+                return False
+            self._subir_versiones(con, [username])
+            return True
+
+    def actualizar_usuario(self, username, cambios):
+        with self.transaccion() as con:
+            fila = con.execute(
+                "SELECT datos FROM usuarios WHERE username = ?", (username,)
+            ).fetchone()
+            datos = json.loads(fila[0]) if fila else {}
+            datos.update(cambios)
+            con.execute(
+                "INSERT OR REPLACE INTO usuarios (username, datos) VALUES (?, ?)",
+                (username, json.dumps(datos, ensure_ascii=False)),
+            )
+            self._subir_versiones(con, [username])
+
+    # ---------------- Movimientos ----------------
+    @staticmethod
+    def _filtro(username, desde, hasta):
+        condiciones, params = [], []
+        if username is not None:
+            condiciones.append("username = ?")
+            params.append(username)
+        if desde is not None:
+            condiciones.append("fecha >= ?")
+            params.append(pd.Timestamp(desde).normalize().strftime(FORMATO_FECHA))
+        if hasta is not None:
+            condiciones.append("fecha < ?")
+            fin = pd.Timestamp(hasta).normalize() + timedelta(days=1)
+            params.append(fin.strftime(FORMATO_FECHA))
+        where = " WHERE " + " AND ".join(condiciones) if condiciones else ""
+        return where, params
+
+    def load_movimientos(self, username=None, desde=None, hasta=None):
+        where, params = self._filtro(username, desde, hasta)
+        with self.pool.conexion() as con:
+            df = pd.read_sql_query(
+                "SELECT username, fecha, tipo, categoria, etiqueta, monto "
+                f"FROM movimientos{where} ORDER BY username, fecha, id",
+                con,
+                params=params,
+            )
+        df["fecha"] = pd.to_datetime(df["fecha"], format=FORMATO_FECHA)
+        return esquema.compactar(df)
+
+    def iterar_movimientos(self, username=None, desde=None, hasta=None, filas=50_000):
+        # Como load_movimientos, de a `filas` por vez con un cursor abierto:
+        # la lectura ve una sola instantánea de la base aunque haya escrituras
+        where, params = self._filtro(username, desde, hasta)
+        with self.pool.conexion() as con:
+            for df in pd.read_sql_query(
+                "SELECT username, fecha, tipo, categoria, etiqueta, monto "
+                f"FROM movimientos{where} ORDER BY username, fecha, id",
+                con,
+                params=params,
+                chunksize=filas,
+            ):
+                df["fecha"] = pd.to_datetime(df["fecha"], format=FORMATO_FECHA)
+                yield esquema.compactar(df)
+
+    @staticmethod
+    def _valores(filas):
+        for fila in filas:
+            etiqueta = fila.get("etiqueta")
+            yield (
+                str(fila["username"]),
+                pd.Timestamp(fila["fecha"]).strftime(FORMATO_FECHA),
+                fila["tipo"],
+                fila["categoria"],
+                etiqueta if isinstance(etiqueta, str) and etiqueta else None,
+                float(fila["monto"]),
+            )
+
+    @staticmethod
+    def _valores_df(df):
+        # Como _valores, pero convirtiendo por columnas
+        # Acepta movimientos crudos o con el esquema compacto
+        etiqueta = esquema.texto(df["etiqueta"])
+        return zip(
+            esquema.texto(df["username"]).tolist(),
+            pd.to_datetime(df["fecha"]).dt.strftime(FORMATO_FECHA).tolist(),
+            esquema.texto(df["tipo"]).tolist(),
+            esquema.texto(df["categoria"]).tolist(),
+            etiqueta.where(etiqueta != "", None).tolist(),
+            esquema.pesos(df).tolist(),
+        )
+
+    def append_movimientos(self, filas):
+        with self.transaccion() as con:
+            con.executemany(INSERT_MOV, self._valores(filas))
+            self._subir_versiones(con, (str(fila["username"]) for fila in filas))
+
+    def append_df(self, df):
+        with self.transaccion() as con:
+            con.executemany(INSERT_MOV, self._valores_df(df))
+            self._subir_versiones(con, esquema.texto(df["username"]).unique())
+
+    def save_movimientos(self, df):
+        with self.transaccion() as con:
+            self._subir_todas(con)
+            con.execute("DELETE FROM movimientos")
+            con.executemany(INSERT_MOV, self._valores_df(df))
+            self._subir_versiones(con, esquema.texto(df["username"]).unique())
+
+    def consultar(self, username, desde, hasta, tipo, categorias, texto, orden, descendente, inicio, limite):
+        # Página del historial: filtra y ordena SQLite sobre los índices y a
+        # pandas solo llegan `limite` filas
+        where, params = self._filtro(username, desde, hasta)
+        if tipo:
+            where += " AND tipo = ?"
+            params.append(tipo)
+        if categorias:
+            where += f" AND categoria IN ({', '.join('?' * len(categorias))})"
+            params.extend(categorias)
+        if texto:
+            where += " AND contiene(etiqueta, ?)"
+            params.append(texto)
+        direccion = "DESC" if descendente else "ASC"
+        columna = {"fecha": "fecha", "monto": "monto"}[orden]
+        with self.pool.conexion() as con:
+            total = con.execute(f"SELECT COUNT(*) FROM movimientos{where}", params).fetchone()[0]
+            df = pd.read_sql_query(
+                "SELECT fecha, tipo, categoria, coalesce(etiqueta, '') AS etiqueta, monto "
+                f"FROM movimientos{where} ORDER BY {columna} {direccion}, id {direccion} "
+                "LIMIT ? OFFSET ?",
+                con,
+                params=params + [limite, inicio],
+            )
+        df["fecha"] = pd.to_datetime(df["fecha"], format=FORMATO_FECHA)
+        df["monto"] = df["monto"].astype(float)
+        return df, int(total)
+
+    def rollup_diario(self, username):
+        # Mismo esquema que asesor.rollups.cargar, agregado por SQLite sobre el
+        # índice (username, fecha): a pandas solo llegan los totales. Se suma
+        # en centavos enteros para que cada total sea exacto.
+        with self.pool.conexion() as con:
+            df = pd.read_sql_query(
+                "SELECT substr(fecha, 1, 10) AS dia, tipo, categoria, "
+                "SUM(centavos(monto)) / 100.0 AS monto, COUNT(*) AS n "
+                "FROM movimientos WHERE username = ? "
+                "GROUP BY dia, tipo, categoria ORDER BY dia",
+                con,
+                params=(username,),
+            )
+        df["dia"] = pd.to_datetime(df["dia"], format="%Y-%m-%d")
+        df["monto"] = df["monto"].astype(float)
+        df["n"] = df["n"].astype("int64")
+        return df
+
+    def conteos_etiquetas(self, username):
+        # Mismo formato que los archivos de asesor.etiquetas: {etiqueta: {categoria: n}}
+        with self.pool.conexion() as con:
+            filas = con.execute(
+                "SELECT trim(etiqueta), categoria, COUNT(*) FROM movimientos "
+                "WHERE username = ? AND trim(coalesce(etiqueta, '')) != '' "
+                "GROUP BY 1, 2",
+                (username,),
+            ).fetchall()
+        conteos = {}
+        for etiqueta, categoria, n in filas:
+            conteos.setdefault(etiqueta, {})[categoria] = n
+        return conteos
+
+
+def importar_archivos(store):
+    """Copia a SQLite las cuentas y los movimientos del backend de archivos."""
+    from asesor import storage
+
+    if storage.BACKEND != "archivos":
+        raise RuntimeError("La importación lee los archivos: córrela sin ASESOR_BACKEND=sqlite.")
+    users = storage.load_users()
+    movimientos = storage.load_movimientos()
+    store.save_users(users)
+    store.save_movimientos(movimientos)
+    return len(users), len(movimientos)
+
+
+if __name__ == "__main__":
+    # python -m asesor.sqlite_backend importar
+    from asesor import storage
+
+    if sys.argv[1:] == ["importar"]:
+        n_users, n_mov = importar_archivos(SqliteStore(storage.DB_FILE))
+        print(f"Importados {n_users} usuarios y {n_mov} movimientos a {storage.DB_FILE}.")
+        print("Arranca la app con ASESOR_BACKEND=sqlite para usarla.")
+    else:
+        print("Uso: python -m asesor.sqlite_backend importar")
+        sys.exit(2)
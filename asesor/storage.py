@@ -0,0 +1,1117 @@
+import copy
+import csv
+import functools
+import gzip
+import hashlib
+import importlib
+import io
+import json
+import os
+import sys
+import threading
+import uuid
+import zlib
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from asesor import esquema, metricas
+from asesor.bloqueo import Bloqueo
+from asesor.cache import CacheLRU
+
+try:
+    import pyarrow as pa
+    from pyarrow import ipc
+except ImportError:  # pyarrow es opcional (solo para el formato "arrow")
+    pa = ipc = None
+
+
+# ---------------------------------------------------------
+# Rutas de datos
+# ---------------------------------------------------------
+DATA_DIR = "data"
+# Un archivo por usuario, repartidos en 256 subcarpetas por el hash del nombre
+USERS_DIR = os.path.join(DATA_DIR, "usuarios")
+# Formato anterior (todos los usuarios en un JSON); se migra a USERS_DIR
+USERS_FILE = os.path.join(DATA_DIR, "users.json")
+# Base compactada con los meses calientes, ordenada por (username, fecha)
+MOV_FILE = os.path.join(DATA_DIR, "movimientos.csv")
+# Índice de la base: rango de bytes de cada usuario y de cada uno de sus meses
+MOV_INDEX_FILE = os.path.join(DATA_DIR, "movimientos.idx.json")
+# Base en formato columnar (Arrow IPC sin comprimir, se lee con memory-map)
+MOV_ARROW_FILE = os.path.join(DATA_DIR, "movimientos.arrow")
+# Índice de la base columnar: rango de filas por usuario y mes
+MOV_ARROW_INDEX_FILE = os.path.join(DATA_DIR, "movimientos.arrow.idx.json")
+# Log de solo-anexar con los movimientos nuevos desde la última compactación
+MOV_LOG_FILE = os.path.join(DATA_DIR, "movimientos.log.csv")
+# Log que se está fusionando con la base durante una compactación
+MOV_COMPACTANDO_FILE = os.path.join(DATA_DIR, "movimientos.compactando.csv")
+# Meses cerrados, un segmento de solo lectura por mes en el formato de la
+# base; la base solo guarda los meses calientes
+ARCHIVO_DIR = os.path.join(DATA_DIR, "archivo")
+# Base SQLite (usuarios y movimientos) cuando ASESOR_BACKEND=sqlite
+DB_FILE = os.path.join(DATA_DIR, "asesor.db")
+
+COLUMNAS_MOV = ["username", "fecha", "tipo", "categoria", "etiqueta", "monto"]
+# Sin esto pandas convierte usuarios o etiquetas numéricas en enteros
+DTYPES_CSV = {
+    "username": "str",
+    "tipo": "str",
+    "categoria": "str",
+    "etiqueta": "str",
+    "monto": "float64",
+}
+
+# Dónde viven usuarios y movimientos: "archivos" (users.json y base + log de
+# movimientos, por defecto) o "sqlite" (DB_FILE, ver asesor.sqlite_backend)
+BACKEND = os.environ.get("ASESOR_BACKEND", "archivos")
+if BACKEND not in ("archivos", "sqlite"):
+    raise ValueError(f"Backend de almacenamiento desconocido: {BACKEND}")
+
+# Formato de la base en el backend de archivos: "csv" (por defecto) o "arrow"
+MOV_BACKEND = os.environ.get("ASESOR_MOV_BACKEND", "csv")
+FORMATOS_BASE = {
+    "csv": (MOV_FILE, MOV_INDEX_FILE),
+    "arrow": (MOV_ARROW_FILE, MOV_ARROW_INDEX_FILE),
+}
+
+# Filas en el log a partir de las cuales se compacta en segundo plano
+COMPACTAR_CADA = 5000
+# Máximo de pedidos de escritura que se agrupan en un mismo volcado al log
+MAX_LOTE = 512
+# Meses que se quedan en la base (el actual y el anterior); los más antiguos
+# se archivan al compactar
+MESES_CALIENTES = 2
+
+# Protegen los renombrados base/log y las escrituras frente a otros hilos
+# (Streamlit atiende cada sesión en un hilo del mismo proceso) y frente a
+# otros procesos (CLI de mantenimiento, importaciones).
+_lock_mov = Bloqueo(os.path.join(DATA_DIR, ".movimientos.lock"))
+_lock_compactacion = Bloqueo(os.path.join(DATA_DIR, ".compactacion.lock"))
+_lock_users = Bloqueo(os.path.join(DATA_DIR, ".users.lock"))
+_filas_log = None
+
+# Datos derivados de los movimientos (totales diarios, conteos de etiquetas):
+# cada uno se registra con registrar_derivado y, en el backend de archivos,
+# storage lo mantiene al día llamando sus hooks con _lock_mov tomado:
+#   actualizar(filas)      tras append_movimientos (dicts recién anexados)
+#   actualizar_desde(df)   tras append_lote
+#   reconstruir_desde(df)  tras save_movimientos (reemplaza todo)
+# Los módulos de MODULOS_DERIVADOS se importan antes de la primera escritura:
+# un proceso que no los usa tampoco deja sus archivos desactualizados.
+MODULOS_DERIVADOS = ("asesor.rollups", "asesor.etiquetas")
+_derivados = []
+_hilo_compactacion = None
+# Ruta absoluta del users.json ya revisado por _asegurar_migracion
+_users_migrados = None
+# (ruta, mtime, tamaño) del índice y su contenido ya parseado
+_indice_cache = (None, None)
+
+# Caché de lecturas compartida por todas las sesiones. Cada entrada se valida
+# con el mtime/tamaño de los archivos y con _version, que sube en cada
+# escritura hecha desde este proceso.
+_cache = CacheLRU(max_entradas=128, max_bytes=256 * 1024 * 1024)
+_version = 0
+_store = None
+_store_lock = threading.Lock()
+
+
+def _firma(*rutas):
+    firma = [_version]
+    for ruta in rutas:
+        try:
+            st_ruta = os.stat(ruta)
+            firma.append((st_ruta.st_mtime_ns, st_ruta.st_size))
+        except FileNotFoundError:
+            firma.append(None)
+    return tuple(firma)
+
+def _firma_sqlite():
+    # En modo WAL los commits de otros procesos cambian el -wal antes que la base
+    return _firma(DB_FILE, DB_FILE + "-wal")
+
+def version_usuario(username):
+    """Con BACKEND="sqlite", contador que sube con cada escritura de datos o
+    movimientos de `username`, hecha desde cualquier proceso."""
+    return _sqlite().version(username)
+
+def base_sqlite():
+    """SqliteStore de DB_FILE, para consultas propias del backend "sqlite"."""
+    return _sqlite()
+
+def _sqlite():
+    global _store
+    # DATA_DIR es relativo: si cambia el directorio de trabajo (benchmarks,
+    # pruebas) se abre la base que corresponde
+    ruta = os.path.abspath(DB_FILE)
+    with _store_lock:
+        if _store is None or _store.ruta != ruta:
+            from asesor.sqlite_backend import SqliteStore
+
+            if _store is not None:
+                _store.pool.cerrar()
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            _store = SqliteStore(ruta)
+        return _store
+
+def _nueva_version():
+    global _version
+    _version += 1
+
+def cache_stats():
+    return _cache.stats()
+
+def limpiar_cache():
+    _cache.limpiar()
+
+def ruta_por_usuario(directorio, username, extension=".json", repartir=False):
+    """Archivo de `username` en `directorio`, nombrado por el sha1 del nombre
+    (sirve cualquier nombre de usuario). Con `repartir`, dentro de una de 256
+    subcarpetas para no juntar miles de archivos en una."""
+    clave = hashlib.sha1(str(username).encode("utf-8")).hexdigest()
+    if repartir:
+        return os.path.join(directorio, clave[:2], clave + extension)
+    return os.path.join(directorio, clave + extension)
+
+def bloqueo_movimientos():
+    """Lock (reentrante, entre hilos y procesos) de las escrituras de
+    movimientos. Quien reconstruye datos derivados lo toma para no cruzarse
+    con un anexado."""
+    return _lock_mov
+
+def registrar_derivado(derivado):
+    """Registra un objeto con los hooks actualizar, actualizar_desde y
+    reconstruir_desde (ver asesor.derivados)."""
+    if derivado not in _derivados:
+        _derivados.append(derivado)
+
+def _notificar(hook, datos):
+    for modulo in MODULOS_DERIVADOS:
+        importlib.import_module(modulo)
+    for derivado in _derivados:
+        getattr(derivado, hook)(datos)
+
+def _tamaño_df(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+def ruta_temporal(ruta):
+    # Única por proceso e hilo, para que dos escritores no pisen el temporal
+    return f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def escribir_json_atomico(ruta, datos, durable=True, **kwargs):
+    # Temporal + rename: los lectores ven el archivo viejo o el nuevo, nunca
+    # uno a medio escribir. Con `durable` se hace fsync antes del rename.
+    tmp = ruta_temporal(ruta)
+    with open(tmp, "w", encoding="utf-8") as f:
+        # dumps usa el codificador en C; dump escribe por trozos en Python
+        f.write(json.dumps(datos, ensure_ascii=False, **kwargs))
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, ruta)
+
+
+# ---------------------------------------------------------
+# Usuarios
+# ---------------------------------------------------------
+# Leer o modificar una cuenta solo toca su archivo; load_users (todas) queda
+# para procesos por lotes y mantenimiento.
+def ruta_usuario(username):
+    return ruta_por_usuario(USERS_DIR, username, repartir=True)
+
+def _leer_usuario(ruta):
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            return json.load(f)["datos"]
+    except FileNotFoundError:
+        return None
+
+def _escribir_usuario(username, datos):
+    ruta = ruta_usuario(username)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    escribir_json_atomico(ruta, {"username": username, "datos": datos})
+
+def _archivos_usuarios():
+    if not os.path.isdir(USERS_DIR):
+        return []
+    return [
+        os.path.join(USERS_DIR, sub, nombre)
+        for sub in sorted(os.listdir(USERS_DIR))
+        if os.path.isdir(os.path.join(USERS_DIR, sub))
+        for nombre in os.listdir(os.path.join(USERS_DIR, sub))
+        if nombre.endswith(".json")
+    ]
+
+def _load_users_disco():
+    # Usuarios de USERS_DIR más los de un users.json aún sin migrar
+    users = {}
+    if os.path.exists(USERS_FILE):
+        with open(USERS_FILE, "r", encoding="utf-8") as f:
+            users = json.load(f)
+    for ruta in _archivos_usuarios():
+        with open(ruta, "r", encoding="utf-8") as f:
+            registro = json.load(f)
+        users[registro["username"]] = registro["datos"]
+    return users
+
+def migrar_users():
+    """Pasa users.json a un archivo por usuario. Devuelve cuántos migró.
+
+    Los registros que ya existen por separado no se pisan: son más nuevos.
+    users.json queda renombrado como users.json.migrado.
+    """
+    with _lock_users:
+        if not os.path.exists(USERS_FILE):
+            return 0
+        with open(USERS_FILE, "r", encoding="utf-8") as f:
+            users = json.load(f)
+        migrados = 0
+        for username, datos in users.items():
+            if not os.path.exists(ruta_usuario(username)):
+                _escribir_usuario(username, datos)
+                migrados += 1
+        os.replace(USERS_FILE, USERS_FILE + ".migrado")
+        _nueva_version()
+        return migrados
+
+def _asegurar_migracion():
+    # Una comprobación por proceso (y directorio de datos); la migración en
+    # sí ocurre una sola vez
+    global _users_migrados
+    ruta = os.path.abspath(USERS_FILE)
+    if _users_migrados != ruta:
+        migrar_users()
+        _users_migrados = ruta
+
+@metricas.medido()
+def load_user(username):
+    """Registro de `username` o None si no existe; no lee las demás cuentas."""
+    if BACKEND == "sqlite":
+        return _sqlite().load_user(username)
+    _asegurar_migracion()
+    return _leer_usuario(ruta_usuario(username))
+
+def _firma_users():
+    # Cada alta o cambio renombra un archivo dentro de su subcarpeta, lo que
+    # cambia el mtime de esa subcarpeta
+    subcarpetas = []
+    if os.path.isdir(USERS_DIR):
+        subcarpetas = [os.path.join(USERS_DIR, sub) for sub in sorted(os.listdir(USERS_DIR))]
+    return _firma(USERS_FILE, USERS_DIR, *subcarpetas)
+
+@metricas.medido(filas=len)
+def load_users():
+    if BACKEND == "sqlite":
+        users = _cache.obtener(
+            ("users",),
+            _firma_sqlite(),
+            lambda: _sqlite().load_users(),
+            medir=lambda u: 512 * len(u),  # aproximado
+        )
+        return copy.deepcopy(users)
+    _asegurar_migracion()
+    users = _cache.obtener(
+        ("users",),
+        _firma_users(),
+        _load_users_disco,
+        medir=lambda u: 512 * len(u),  # aproximado
+    )
+    # Los llamadores modifican el dict antes de guardarlo
+    return copy.deepcopy(users)
+
+def save_users(users):
+    """Reemplaza todas las cuentas por las de `users`."""
+    if BACKEND == "sqlite":
+        _sqlite().save_users(users)
+        _nueva_version()
+        return
+    with _lock_users:
+        _asegurar_migracion()
+        actuales = set(_archivos_usuarios())
+        for username, datos in users.items():
+            _escribir_usuario(username, datos)
+            actuales.discard(ruta_usuario(username))
+        for ruta in actuales:
+            os.remove(ruta)
+        _nueva_version()
+
+def crear_usuario(username, datos):
+    """Da de alta `username` si no existe. Devuelve False si ya existía."""
+    if BACKEND == "sqlite":
+        creado = _sqlite().crear_usuario(username, datos)
+        _nueva_version()
+        return creado
+    with _lock_users:
+        # Se comprueba dentro del lock para no pisar altas concurrentes
+        _asegurar_migracion()
+        if os.path.exists(ruta_usuario(username)):
+            return False
+        _escribir_usuario(username, datos)
+        _nueva_version()
+        return True
+
+def actualizar_usuario(username, cambios):
+    """Aplica `cambios` al registro de `username` sin perder otras escrituras."""
+    if BACKEND == "sqlite":
+        _sqlite().actualizar_usuario(username, cambios)
+        _nueva_version()
+        return
+    with _lock_users:
+        _asegurar_migracion()
+        datos = _leer_usuario(ruta_usuario(username)) or {}
+        datos.update(cambios)
+        _escribir_usuario(username, datos)
+        _nueva_version()
+
+
+# ---------------------------------------------------------
+# Movimientos: lectura
+# ---------------------------------------------------------
+def movimientos_vacio():
+    return esquema.vacio()
+
+def _formato_activo(formato=None):
+    formato = formato or MOV_BACKEND
+    if formato not in FORMATOS_BASE:
+        raise ValueError(f"Formato de almacenamiento desconocido: {formato}")
+    if formato == "arrow" and pa is None:
+        raise RuntimeError("El formato 'arrow' requiere instalar pyarrow.")
+    return formato
+
+def _formato_existente():
+    # La base del formato activo; si aún no existe, la de otro formato
+    # (p. ej. el CSV anterior a una migración) para no perder datos.
+    activo = _formato_activo()
+    candidatos = [activo] + [f for f in FORMATOS_BASE if f != activo]
+    for formato in candidatos:
+        if os.path.exists(FORMATOS_BASE[formato][0]):
+            return formato
+    return None
+
+def _cargar_indice(formato):
+    global _indice_cache
+    ruta = FORMATOS_BASE[formato][1]
+    if not os.path.exists(ruta):
+        return None
+    st_idx = os.stat(ruta)
+    clave = (ruta, st_idx.st_mtime_ns, st_idx.st_size)
+    if _indice_cache[0] != clave:
+        with open(ruta, "r", encoding="utf-8") as f:
+            _indice_cache = (clave, json.load(f))
+    return _indice_cache[1]
+
+def _abrir_base(formato):
+    ruta = FORMATOS_BASE[formato][0]
+    if formato == "arrow":
+        return pa.memory_map(ruta, "r")
+    return open(ruta, "rb")
+
+def _abrir_fuentes(desde=None, hasta=None):
+    # Abrimos base, índice, segmentos y logs bajo el lock: los descriptores (y
+    # mapas de memoria) abiertos mantienen una foto consistente aunque una
+    # compactación reemplace los archivos después.
+    with _lock_mov:
+        formato = _formato_existente()
+        base = _abrir_base(formato) if formato else None
+        indice = _cargar_indice(formato) if formato else None
+        segmentos = _abrir_segmentos(indice, desde, hasta)
+        logs = [
+            open(ruta, "rb")
+            for ruta in (MOV_COMPACTANDO_FILE, MOV_LOG_FILE)
+            if os.path.exists(ruta)
+        ]
+    return formato, base, indice, segmentos, logs
+
+def _leer_csv(f):
+    with f, metricas.medir("storage.read_csv"):
+        df = pd.read_csv(f, dtype=DTYPES_CSV)
+    with metricas.medir("storage.to_datetime", filas=len(df)):
+        df["fecha"] = pd.to_datetime(df["fecha"], format="ISO8601")
+    return df
+
+def _rango(entrada, desde, hasta):
+    # entrada["meses"] = [[mes, inicio], ...] en orden; el bloque del usuario
+    # termina en entrada["fin"]. Los offsets son bytes (csv) o filas (arrow).
+    meses = entrada["meses"]
+    ini = entrada["fin"]
+    fin = entrada["fin"]
+    mes_desde = desde.strftime("%Y-%m") if desde is not None else None
+    mes_hasta = hasta.strftime("%Y-%m") if hasta is not None else None
+    for mes, offset in meses:
+        if mes_desde is None or mes >= mes_desde:
+            ini = offset
+            break
+    if mes_hasta is not None:
+        for mes, offset in meses:
+            if mes > mes_hasta:
+                fin = offset
+                break
+    return ini, max(ini, fin)
+
+def _leer_base_csv(f, indice, username, desde, hasta):
+    if username is None or indice is None:
+        # Sin índice (base antigua) no queda otra que leerla entera
+        df = _leer_csv(f)
+        if username is not None:
+            df = df[df["username"] == username]
+        return df
+    with f:
+        entrada = indice["usuarios"].get(username)
+        if entrada is None:
+            return None
+        ini, fin = _rango(entrada, desde, hasta)
+        if fin <= ini:
+            return None
+        f.seek(ini)
+        bloque = f.read(fin - ini)
+    cabecera = indice["cabecera"].encode("utf-8")
+    return _leer_csv(io.BytesIO(cabecera + bloque))
+
+def _leer_base_arrow(mm, indice, username, desde, hasta):
+    # La tabla queda respaldada por el mapa de memoria: solo se convierten a
+    # pandas (y se tocan en disco) las filas del rango pedido.
+    with mm:
+        tabla = ipc.open_file(mm).read_all()
+        if username is not None and indice is None:
+            df = tabla.to_pandas()
+            return df[df["username"] == username]
+        if username is not None:
+            entrada = indice["usuarios"].get(username)
+            if entrada is None:
+                return None
+            ini, fin = _rango(entrada, desde, hasta)
+            tabla = tabla.slice(ini, fin - ini)
+        return tabla.to_pandas()
+
+def _leer_base(formato, base, indice, username, desde, hasta):
+    if formato == "arrow":
+        return _leer_base_arrow(base, indice, username, desde, hasta)
+    return _leer_base_csv(base, indice, username, desde, hasta)
+
+def _firma_movimientos():
+    rutas = [r for par in FORMATOS_BASE.values() for r in par]
+    return _firma(*rutas, MOV_COMPACTANDO_FILE, MOV_LOG_FILE)
+
+@metricas.medido(filas=len)
+def load_movimientos(username=None, desde=None, hasta=None):
+    """Movimientos de todos los usuarios o solo de `username`, con el esquema
+    compacto de asesor.esquema (categóricas y monto en `centavos`).
+
+    `desde` y `hasta` (fechas, ambas incluidas) acotan el rango; con índice
+    solo se leen del disco los meses del usuario que caen en el rango. El
+    resultado se comparte entre sesiones mientras los archivos no cambien.
+    """
+    desde = pd.Timestamp(desde).normalize() if desde is not None else None
+    hasta = pd.Timestamp(hasta).normalize() if hasta is not None else None
+    if BACKEND == "sqlite":
+        firma = _firma_sqlite()
+        cargar = lambda: _sqlite().load_movimientos(username, desde, hasta)
+    else:
+        firma = _firma_movimientos()
+        cargar = lambda: _load_movimientos_disco(username, desde, hasta)
+    df = _cache.obtener(
+        ("movimientos", username, desde, hasta), firma, cargar, medir=_tamaño_df
+    )
+    # Copia superficial: los llamadores pueden añadir columnas sin tocar la
+    # copia compartida
+    return df.copy(deep=False)
+
+def _en_rango(df, desde, hasta):
+    if desde is not None:
+        df = df[df["fecha"] >= desde]
+    if hasta is not None:
+        df = df[df["fecha"] < hasta + timedelta(days=1)]
+    return df
+
+def _partes_disco(username, desde, hasta, por_mes=False):
+    # Movimientos crudos de cada fuente, del archivo (más antiguo) a los logs.
+    # Los meses archivados se leen juntos (un solo parseo o una sola
+    # conversión a pandas), salvo con `por_mes`
+    formato, base, indice, segmentos, logs = _abrir_fuentes(desde, hasta)
+    if base is not None and (
+        indice is None or formato != MOV_BACKEND or _falta_archivar(indice)
+    ):
+        # Base de una versión anterior, de otro formato o con meses ya
+        # cerrados: la compactación la ordena, archiva e indexa
+        _compactar_en_segundo_plano()
+
+    try:
+        if segmentos and por_mes:
+            for segmento in segmentos:
+                yield _leer_segmentos([segmento], username)
+        elif segmentos:
+            yield _leer_segmentos(segmentos, username)
+        if base is not None:
+            yield _leer_base(formato, base, indice, username, desde, hasta)
+        for f in logs:
+            df_log = _leer_csv(f)
+            if username is not None:
+                df_log = df_log[df_log["username"] == username]
+            yield df_log
+    finally:
+        # Si el consumidor se detiene antes, se cierra lo que quedó abierto
+        for f in [f for f, _ in segmentos] + logs:
+            f.close()
+        if base is not None:
+            base.close()
+
+def _load_movimientos_disco(username, desde, hasta):
+    partes = [
+        p for p in _partes_disco(username, desde, hasta) if p is not None and not p.empty
+    ]
+    if not partes:
+        return movimientos_vacio()
+    df = partes[0] if len(partes) == 1 else pd.concat(partes, ignore_index=True)
+    return esquema.compactar(_en_rango(df, desde, hasta).reset_index(drop=True))
+
+def iterar_movimientos(username=None, desde=None, hasta=None):
+    """Como load_movimientos, pero de a trozos (un mes archivado, la base,
+    cada log; en SQLite, bloques de filas) para recorrer todo el histórico sin
+    tenerlo entero en memoria.
+
+    No pasa por la caché; cada trozo viene con el esquema compacto.
+    """
+    desde = pd.Timestamp(desde).normalize() if desde is not None else None
+    hasta = pd.Timestamp(hasta).normalize() if hasta is not None else None
+    if BACKEND == "sqlite":
+        yield from _sqlite().iterar_movimientos(username, desde, hasta)
+        return
+    for parte in _partes_disco(username, desde, hasta, por_mes=True):
+        if parte is not None:
+            parte = _en_rango(parte, desde, hasta)
+            if not parte.empty:
+                yield esquema.compactar(parte.reset_index(drop=True))
+
+
+# ---------------------------------------------------------
+# Movimientos: archivo de meses cerrados
+# ---------------------------------------------------------
+# Con la base en CSV, cada segmento (AAAA-MM.<id>.csv.gz) es un gzip con un
+# miembro por usuario, así se puede leer un usuario descomprimiendo solo su
+# tramo, y el archivo entero sigue siendo un gzip válido para recorrer el mes
+# completo. Con la base en arrow, el segmento (AAAA-MM.<id>.arrow) es Arrow
+# IPC sin comprimir, como la base: ocupa unas dos veces lo que el gzip, pero
+# se lee con memory-map sin parsear texto (el histórico entero, unas seis
+# veces más rápido; ver bench.archivo). El índice de la base enumera los segmentos
+# vigentes en "archivo": {mes: id}; los segmentos no se modifican nunca, se
+# reemplazan por otros (también al migrar de formato).
+EXTENSIONES_SEGMENTO = {"csv": ".csv.gz", "arrow": ".arrow"}
+
+def _limite_frio():
+    # Primer mes caliente ("AAAA-MM"); los anteriores van al archivo
+    return str(np.datetime64(date.today(), "M") - (MESES_CALIENTES - 1))
+
+def _falta_archivar(indice):
+    meses = indice.get("meses")
+    if meses is None:
+        # Índice anterior al archivo: no sabemos qué meses tiene la base
+        return True
+    limite = _limite_frio()
+    archivo = indice.get("archivo", {})
+    return any(mes < limite and mes not in archivo for mes in meses)
+
+def _ruta_segmento(segmento, extension=".csv.gz"):
+    return os.path.join(ARCHIVO_DIR, segmento + extension)
+
+@functools.lru_cache(maxsize=256)
+def _indice_segmento(ruta):
+    # Los segmentos no cambian: su índice se lee una vez por proceso
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _formato_segmento(idx):
+    # Los segmentos anteriores a los de arrow no lo dicen: son CSV
+    return idx.get("formato", "csv")
+
+def _abrir_segmento(segmento):
+    # (archivo abierto, índice)
+    idx = _indice_segmento(os.path.abspath(_ruta_segmento(segmento, ".idx.json")))
+    formato = _formato_segmento(idx)
+    ruta = _ruta_segmento(segmento, EXTENSIONES_SEGMENTO[formato])
+    if formato == "arrow":
+        if pa is None:
+            raise RuntimeError("El archivo tiene meses en formato 'arrow': instala pyarrow.")
+        return pa.memory_map(ruta, "r"), idx
+    return open(ruta, "rb"), idx
+
+def _abrir_segmentos(indice, desde, hasta):
+    if not indice or not indice.get("archivo"):
+        return []
+    mes_desde = desde.strftime("%Y-%m") if desde is not None else ""
+    mes_hasta = hasta.strftime("%Y-%m") if hasta is not None else "9999-12"
+    return [
+        _abrir_segmento(segmento)
+        for mes, segmento in sorted(indice["archivo"].items())
+        if mes_desde <= mes <= mes_hasta
+    ]
+
+def _leer_segmentos(segmentos, username=None):
+    # Los meses enteros o solo el tramo de `username` en cada uno, unidos en
+    # un único CSV o una única tabla arrow (se convierte a pandas una vez, no
+    # una por mes)
+    cabecera, bloques, tablas = None, [], []
+    try:
+        for f, idx in segmentos:
+            if _formato_segmento(idx) == "arrow":
+                tabla = ipc.open_file(f).read_all()
+                if username is not None:
+                    tramo = idx["usuarios"].get(username)
+                    if tramo is None:
+                        continue
+                    tabla = tabla.slice(tramo[0], tramo[1] - tramo[0])
+                tablas.append(tabla)
+                continue
+            cabecera = idx["cabecera"].encode("utf-8")
+            if username is None:
+                # Miembro a miembro según el índice (gzip.decompress copia el
+                # resto del archivo tras cada miembro: cuadrático con miles de
+                # usuarios)
+                datos = memoryview(f.read())
+                tramos = sorted(idx["usuarios"].values())
+                bloques += [zlib.decompress(datos[a:b], wbits=31) for a, b in tramos]
+            elif username in idx["usuarios"]:
+                a, b = idx["usuarios"][username]
+                f.seek(a)
+                bloques.append(zlib.decompress(f.read(b - a), wbits=31))
+        # Un índice de antes de que la migración convirtiera también el
+        # archivo mezcla formatos hasta la próxima compactación
+        partes = []
+        if bloques:
+            partes.append(_leer_csv(io.BytesIO(cabecera + b"".join(bloques))))
+        if tablas:
+            partes.append(pa.concat_tables(tablas).to_pandas())
+    finally:
+        for f, _ in segmentos:
+            f.close()
+    if not partes:
+        return None
+    return partes[0] if len(partes) == 1 else pd.concat(partes, ignore_index=True)
+
+def _escribir_segmento(df, usuarios, meses, formato):
+    # Un mes cerrado, ya ordenado por usuario; devuelve el id del segmento.
+    # Es la única copia de esas filas, así que va con fsync.
+    os.makedirs(ARCHIVO_DIR, exist_ok=True)
+    mes = str(meses[0])
+    segmento = f"{mes}.{uuid.uuid4().hex[:12]}"
+    ruta = _ruta_segmento(segmento, EXTENSIONES_SEGMENTO[formato])
+    cortes = _cortes(usuarios, meses)
+    if formato == "arrow":
+        offsets = _escribir_base_arrow(df, cortes, ruta, durable=True)
+    else:
+        tramos = list(zip(cortes[:-1], cortes[1:]))
+        offsets = _escribir_base_csv(_filas_csv(df), tramos, ruta, comprimir=True)
+    indice = {
+        "mes": mes,
+        "formato": formato,
+        "filas": len(df),
+        "usuarios": {
+            usuarios[a]: [offsets[i], offsets[i + 1]] for i, a in enumerate(cortes[:-1])
+        },
+    }
+    if formato == "csv":
+        indice["cabecera"] = ",".join(COLUMNAS_MOV) + "\n"
+    escribir_json_atomico(_ruta_segmento(segmento, ".idx.json"), indice)
+    return segmento
+
+def _convertir_archivo(archivo, formato):
+    # Migración de formato: los meses archivados en otro formato se reescriben
+    # en `formato`, de a uno para no juntar el histórico en memoria. Los
+    # segmentos viejos se borran al publicar la base que ya no los usa.
+    nuevo = {}
+    for mes, segmento in archivo.items():
+        idx = _indice_segmento(os.path.abspath(_ruta_segmento(segmento, ".idx.json")))
+        if _formato_segmento(idx) == formato:
+            nuevo[mes] = segmento
+            continue
+        df, usuarios, meses, _ = _preparar_base(_leer_segmentos([_abrir_segmento(segmento)]))
+        nuevo[mes] = _escribir_segmento(df, usuarios, meses, formato)
+    return nuevo
+
+def _borrar_segmentos_huerfanos(archivo):
+    # Con los locks de compactación y de movimientos tomados: los lectores
+    # abren sus segmentos bajo _lock_mov y conservan el descriptor
+    if not os.path.isdir(ARCHIVO_DIR):
+        return
+    vigentes = set(archivo.values())
+    for nombre in os.listdir(ARCHIVO_DIR):
+        if ".".join(nombre.split(".")[:2]) not in vigentes:
+            os.remove(os.path.join(ARCHIVO_DIR, nombre))
+
+
+# ---------------------------------------------------------
+# Movimientos: escritura
+# ---------------------------------------------------------
+def _preparar_base(df):
+    # Normaliza tipos, ordena por (username, fecha) y calcula los cortes donde
+    # cambia el usuario o el mes.
+    # Acepta tanto movimientos crudos (monto en pesos) como el esquema compacto.
+    df = pd.DataFrame({
+        "username": esquema.texto(df["username"]),
+        "fecha": pd.to_datetime(df["fecha"], format="ISO8601").astype("datetime64[ns]"),
+        "tipo": esquema.texto(df["tipo"]),
+        "categoria": esquema.texto(df["categoria"]),
+        "etiqueta": esquema.texto(df["etiqueta"]),
+        "monto": esquema.pesos(df),
+    })
+    df = df.sort_values(["username", "fecha"], kind="stable").reset_index(drop=True)
+
+    usuarios = df["username"].to_numpy()
+    meses = df["fecha"].to_numpy().astype("datetime64[M]")
+    return df, usuarios, meses, _cortes(usuarios, meses)
+
+def _cortes(usuarios, meses):
+    n = len(usuarios)
+    if not n:
+        return [0]
+    cambia = (usuarios[1:] != usuarios[:-1]) | (meses[1:] != meses[:-1])
+    return [0] + (np.flatnonzero(cambia) + 1).tolist() + [n]
+
+def _filas_csv(df):
+    return list(zip(
+        df["username"].to_numpy(),
+        df["fecha"].dt.strftime("%Y-%m-%d %H:%M:%S").to_numpy(),
+        df["tipo"].to_numpy(),
+        df["categoria"].to_numpy(),
+        df["etiqueta"].to_numpy(),
+        df["monto"].to_numpy(),
+    ))
+
+def _escribir_base_csv(filas, tramos, tmp, comprimir=False):
+    # Devuelve el byte de inicio de cada tramo (a, b) de `filas` y el final
+    # del archivo. Con `comprimir` la cabecera y cada tramo son un miembro gzip.
+    codificar = (lambda s: gzip.compress(s.encode("utf-8"), mtime=0)) if comprimir else (
+        lambda s: s.encode("utf-8")
+    )
+    offsets = []
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    with open(tmp, "wb") as f:
+        f.write(codificar(",".join(COLUMNAS_MOV) + "\n"))
+        for a, b in tramos:
+            offsets.append(f.tell())
+            buf.seek(0)
+            buf.truncate()
+            writer.writerows(filas[a:b])
+            f.write(codificar(buf.getvalue()))
+        offsets.append(f.tell())
+        if comprimir:
+            f.flush()
+            os.fsync(f.fileno())
+    return offsets
+
+def _escribir_base_arrow(df, cortes, tmp, durable=False):
+    schema = pa.schema([
+        ("username", pa.string()),
+        ("fecha", pa.timestamp("ns")),
+        ("tipo", pa.string()),
+        ("categoria", pa.string()),
+        ("etiqueta", pa.string()),
+        ("monto", pa.float64()),
+    ])
+    tabla = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    with pa.OSFile(tmp, "wb") as sink:
+        with ipc.new_file(sink, schema) as writer:
+            writer.write_table(tabla, max_chunksize=1_000_000)
+    if durable:
+        with open(tmp, "r+b") as f:
+            os.fsync(f.fileno())
+    # En arrow los offsets del índice son directamente números de fila
+    return cortes
+
+def _escribir_base(df, formato, archivo=None):
+    # Escribe a archivos temporales la base ordenada y su índice de rangos por
+    # usuario y mes. Devuelve ambas rutas para que el llamador las reemplace
+    # bajo _lock_mov.
+    # `archivo` son los segmentos vigentes ({mes: id}); los meses fríos que aún
+    # no estén archivados se escriben como segmentos nuevos (en `formato`) y
+    # salen de la base.
+    # Las filas de un mes ya archivado (movimientos con fecha atrasada) se
+    # quedan en la base hasta la próxima reescritura completa.
+    df, usuarios, meses, cortes = _preparar_base(df)
+    archivo = dict(archivo or {})
+    archivados = np.array(list(archivo), dtype="datetime64[M]")
+    frio = (meses < np.datetime64(_limite_frio(), "M")) & ~np.isin(meses, archivados)
+    if frio.any():
+        for mes in np.unique(meses[frio]):
+            # Filas del mes, que siguen ordenadas por usuario
+            del_mes = np.flatnonzero(meses == mes)
+            archivo[str(mes)] = _escribir_segmento(
+                df.iloc[del_mes].reset_index(drop=True), usuarios[del_mes], meses[del_mes], formato
+            )
+        df = df[~frio].reset_index(drop=True)
+        usuarios = usuarios[~frio]
+        meses = meses[~frio]
+        cortes = _cortes(usuarios, meses)
+
+    ruta, ruta_idx = FORMATOS_BASE[formato]
+    tmp = ruta_temporal(ruta)
+    if formato == "arrow":
+        offsets = _escribir_base_arrow(df, cortes, tmp)
+    else:
+        offsets = _escribir_base_csv(_filas_csv(df), list(zip(cortes[:-1], cortes[1:])), tmp)
+
+    usuarios_idx = {}
+    for i, a in enumerate(cortes[:-1]):
+        entrada = usuarios_idx.setdefault(usuarios[a], {"meses": [], "fin": 0})
+        entrada["meses"].append([str(meses[a]), offsets[i]])
+        entrada["fin"] = offsets[i + 1]
+
+    indice = {
+        "formato": formato,
+        "usuarios": usuarios_idx,
+        "meses": np.unique(meses[cortes[:-1]]).astype(str).tolist(),
+        "archivo": archivo,
+    }
+    if formato == "csv":
+        indice["cabecera"] = ",".join(COLUMNAS_MOV) + "\n"
+    tmp_idx = ruta_temporal(ruta_idx)
+    with open(tmp_idx, "w", encoding="utf-8") as f:
+        f.write(json.dumps(indice, ensure_ascii=False))
+    return tmp, tmp_idx
+
+def _publicar_base(formato, tmp, tmp_idx):
+    # Con _lock_mov tomado: instala la base nueva, borra los segmentos que ya
+    # no usa y aparta la de otros formatos (queda como .bak tras una migración).
+    ruta, ruta_idx = FORMATOS_BASE[formato]
+    os.replace(tmp, ruta)
+    os.replace(tmp_idx, ruta_idx)
+    _borrar_segmentos_huerfanos(_cargar_indice(formato).get("archivo", {}))
+    for otro, (ruta_otro, idx_otro) in FORMATOS_BASE.items():
+        if otro == formato:
+            continue
+        if os.path.exists(ruta_otro):
+            os.replace(ruta_otro, ruta_otro + ".bak")
+        if os.path.exists(idx_otro):
+            os.remove(idx_otro)
+
+@metricas.medido()
+def save_movimientos(df):
+    # Reescritura completa: deja la base con todo y vacía los logs
+    global _filas_log
+    if BACKEND == "sqlite":
+        _sqlite().save_movimientos(df)
+        _nueva_version()
+        return
+    formato = _formato_activo()
+    # Bajo el lock de compactación para que ninguna borre los segmentos de la otra
+    with _lock_compactacion:
+        tmp, tmp_idx = _escribir_base(df, formato)
+        with _lock_mov:
+            _publicar_base(formato, tmp, tmp_idx)
+            for ruta in (MOV_COMPACTANDO_FILE, MOV_LOG_FILE):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            _filas_log = 0
+            _nueva_version()
+            _notificar("reconstruir_desde", df)
+
+def _formatear_fecha(fecha):
+    return pd.Timestamp(fecha).isoformat(sep=" ")
+
+def _contar_filas_log():
+    if not os.path.exists(MOV_LOG_FILE):
+        return 0
+    with open(MOV_LOG_FILE, "rb") as f:
+        return max(0, sum(1 for _ in f) - 1)
+
+class _Pedido:
+    __slots__ = ("filas", "listo", "error")
+
+    def __init__(self, filas):
+        self.filas = filas
+        self.listo = threading.Event()
+        self.error = None
+
+_cola = []
+_cola_lock = threading.Lock()
+_volcando = False
+
+@metricas.medido()
+def append_movimientos(filas):
+    """Anexa movimientos al log sin leer ni reescribir el histórico y suma
+    las filas a los totales diarios y a los conteos de etiquetas de cada
+    usuario.
+
+    Las escrituras simultáneas de varias sesiones se agrupan: el primer hilo
+    que llega vuelca al log todo lo que haya en cola en una sola escritura
+    (y un solo fsync) y los demás esperan a que su lote quede en disco.
+    """
+    global _volcando
+    filas = list(filas)
+    if not filas:
+        return
+    pedido = _Pedido(filas)
+    with _cola_lock:
+        _cola.append(pedido)
+        lider = not _volcando
+        _volcando = True
+    if lider:
+        _vaciar_cola()
+    pedido.listo.wait()
+    if pedido.error is not None:
+        raise pedido.error
+
+def _vaciar_cola():
+    global _volcando
+    while True:
+        with _cola_lock:
+            lote = _cola[:MAX_LOTE]
+            del _cola[:MAX_LOTE]
+            if not lote:
+                _volcando = False
+                return
+        try:
+            _volcar(lote)
+        except Exception as e:
+            for pedido in lote:
+                pedido.error = e
+        for pedido in lote:
+            pedido.listo.set()
+
+def _volcar(lote):
+    global _filas_log
+    filas = [fila for pedido in lote for fila in pedido.filas]
+    if BACKEND == "sqlite":
+        # Un lote, una transacción; los totales diarios salen de la base
+        _sqlite().append_movimientos(filas)
+        _nueva_version()
+        return
+    with _lock_mov:
+        if _filas_log is None:
+            _filas_log = _contar_filas_log()
+        nuevo = not os.path.exists(MOV_LOG_FILE)
+        with open(MOV_LOG_FILE, "a", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            if nuevo:
+                writer.writerow(COLUMNAS_MOV)
+            writer.writerows(
+                [
+                    fila["username"],
+                    _formatear_fecha(fila["fecha"]),
+                    fila["tipo"],
+                    fila["categoria"],
+                    fila.get("etiqueta", ""),
+                    float(fila["monto"]),
+                ]
+                for fila in filas
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        _filas_log += len(filas)
+        pendientes = _filas_log
+        _nueva_version()
+        _notificar("actualizar", filas)
+    if pendientes >= COMPACTAR_CADA:
+        _compactar_en_segundo_plano()
+
+@metricas.medido()
+def append_lote(df):
+    """Anexa un DataFrame de movimientos al log en una sola escritura.
+
+    Es la vía de las cargas masivas: formatea y suma los totales por columnas
+    en vez de fila a fila. No dispara la compactación; el llamador la pide al
+    terminar la carga.
+    """
+    global _filas_log
+    if df.empty:
+        return
+    df = df[COLUMNAS_MOV]
+    if BACKEND == "sqlite":
+        _sqlite().append_df(df)
+        _nueva_version()
+        return
+    salida = df.assign(
+        fecha=pd.to_datetime(df["fecha"]).dt.strftime("%Y-%m-%d %H:%M:%S"),
+        etiqueta=df["etiqueta"].fillna(""),
+    )
+    with _lock_mov:
+        if _filas_log is None:
+            _filas_log = _contar_filas_log()
+        nuevo = not os.path.exists(MOV_LOG_FILE)
+        with open(MOV_LOG_FILE, "a", encoding="utf-8", newline="") as f:
+            salida.to_csv(f, header=nuevo, index=False, lineterminator="\r\n")
+            f.flush()
+            os.fsync(f.fileno())
+        _filas_log += len(df)
+        _nueva_version()
+        _notificar("actualizar_desde", df)
+
+@metricas.medido()
+def compact_movimientos(formato=None):
+    """Fusiona el log con la base y archiva los meses que se cerraron.
+    Devuelve el número de filas incorporadas.
+
+    Solo se lee y reescribe la base caliente: los segmentos del archivo se
+    conservan. Con `formato` distinto del de la base actual la reescribe en
+    ese formato (es la migración de una sola vez de CSV a columnar).
+    """
+    global _filas_log
+    formato = _formato_activo(formato)
+    with _lock_compactacion:
+        with _lock_mov:
+            actual = _formato_existente()
+            indice = _cargar_indice(actual) if actual else None
+            # Si una compactación anterior quedó a medias, se retoma su archivo
+            if not os.path.exists(MOV_COMPACTANDO_FILE):
+                if os.path.exists(MOV_LOG_FILE):
+                    os.replace(MOV_LOG_FILE, MOV_COMPACTANDO_FILE)
+                    _filas_log = 0
+                elif actual is None or (
+                    actual == formato and indice is not None and not _falta_archivar(indice)
+                ):
+                    # Nada pendiente y la base ya está indexada y archivada
+                    return 0
+            base = _abrir_base(actual) if actual else None
+            log = (
+                open(MOV_COMPACTANDO_FILE, "rb")
+                if os.path.exists(MOV_COMPACTANDO_FILE)
+                else None
+            )
+        partes = []
+        if base is not None:
+            partes.append(_leer_base(actual, base, None, None, None, None))
+        if log is not None:
+            partes.append(_leer_csv(log))
+        nuevas = len(partes[-1]) if log is not None else 0
+        partes = [p for p in partes if not p.empty]
+        df = pd.concat(partes, ignore_index=True) if partes else movimientos_vacio()
+
+        archivo = (indice or {}).get("archivo")
+        if archivo:
+            archivo = _convertir_archivo(archivo, formato)
+        tmp, tmp_idx = _escribir_base(df, formato, archivo)
+        with _lock_mov:
+            _publicar_base(formato, tmp, tmp_idx)
+            if log is not None:
+                os.remove(MOV_COMPACTANDO_FILE)
+            _nueva_version()
+        return nuevas
+
+def _compactar_en_segundo_plano():
+    global _hilo_compactacion
+    with _lock_mov:
+        if _hilo_compactacion is not None and _hilo_compactacion.is_alive():
+            return
+        _hilo_compactacion = threading.Thread(
+            target=compact_movimientos, name="compactar-movimientos", daemon=True
+        )
+        _hilo_compactacion.start()
+
+
+if __name__ == "__main__":
+    # Mantenimiento bajo demanda:
+    #   python -m asesor.storage compactar
+    #   python -m asesor.storage migrar arrow
+    #   python -m asesor.storage migrar-usuarios
+    if sys.argv[1:] == ["compactar"]:
+        print(f"Filas compactadas: {compact_movimientos()}")
+    elif sys.argv[1:] == ["migrar-usuarios"]:
+        print(f"Usuarios migrados a {USERS_DIR}: {migrar_users()}")
+    elif len(sys.argv) == 3 and sys.argv[1] == "migrar":
+        compact_movimientos(sys.argv[2])
+        print(f"Base migrada a {FORMATOS_BASE[sys.argv[2]][0]}.")
+        print(f"Arranca la app con ASESOR_MOV_BACKEND={sys.argv[2]} para usarla.")
+    else:
+        print("Uso: python -m asesor.storage compactar | migrar {csv,arrow} | migrar-usuarios")
+        sys.exit(2)
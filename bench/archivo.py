@@ -0,0 +1,98 @@
+"""Base caliente + archivo de meses cerrados frente a una sola base con todo.
+
+Mide la compactación tras anexar un lote al log (lo que se repite cada
+storage.COMPACTAR_CADA filas), las lecturas de un usuario y el tamaño en
+disco, con el historial completo en la base (MESES_CALIENTES muy grande,
+como antes del archivo) y con solo dos meses calientes. Con `--formato
+arrow` la base y los segmentos son Arrow IPC en vez de CSV.
+
+Uso: python -m bench.archivo [--filas 1000000] [--repeticiones 3] [--formato csv]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+
+from asesor import storage
+from bench.datos import generar_movimientos
+
+
+def medir(fn, repeticiones, preparar=None):
+    tiempos = []
+    for _ in range(repeticiones):
+        storage.limpiar_cache()
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos)
+
+
+def megas(ruta):
+    if os.path.isfile(ruta):
+        return os.path.getsize(ruta) / 2**20
+    return sum(os.path.getsize(os.path.join(ruta, n)) for n in os.listdir(ruta)) / 2**20
+
+
+def correr(df, meses_calientes, repeticiones):
+    storage.MESES_CALIENTES = meses_calientes
+    storage.save_movimientos(df)
+    usuario = df["username"].iloc[0]
+    hoy = pd.Timestamp.today().normalize()
+    lote = df.tail(5000).assign(fecha=hoy)
+
+    resultados = {
+        "compactar 5.000 filas": medir(
+            storage.compact_movimientos, repeticiones, preparar=lambda: storage.append_lote(lote)
+        ),
+        "usuario, últimos 30 días": medir(
+            lambda: storage.load_movimientos(usuario, hoy - pd.Timedelta(days=30), hoy), repeticiones
+        ),
+        "usuario, todo": medir(lambda: storage.load_movimientos(usuario), repeticiones),
+        "todos, todo": medir(storage.load_movimientos, 1),
+    }
+    archivo = megas(storage.ARCHIVO_DIR) if os.path.isdir(storage.ARCHIVO_DIR) else 0.0
+    return resultados, megas(storage.FORMATOS_BASE[storage.MOV_BACKEND][0]), archivo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--formato", choices=list(storage.FORMATOS_BASE), default="csv")
+    args = parser.parse_args()
+
+    df = generar_movimientos(args.filas)
+    meses = storage.MESES_CALIENTES
+    backend = storage.MOV_BACKEND
+    cwd = os.getcwd()
+    filas = {}
+    for nombre, calientes in [("sin archivo", 10_000), ("con archivo", meses)]:
+        tmp = tempfile.mkdtemp(prefix="bench-archivo-")
+        try:
+            os.chdir(tmp)
+            os.makedirs(storage.DATA_DIR)
+            storage.MOV_BACKEND = args.formato
+            filas[nombre] = correr(df, calientes, args.repeticiones)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tmp, ignore_errors=True)
+            storage.MESES_CALIENTES = meses
+            storage.MOV_BACKEND = backend
+
+    print(f"\n{args.filas:,} filas en {args.formato}, {storage.MESES_CALIENTES} meses calientes")
+    print(f"  {'':<26} {'sin archivo':>12} {'con archivo':>12}")
+    for medida in filas["sin archivo"][0]:
+        a, b = filas["sin archivo"][0][medida], filas["con archivo"][0][medida]
+        print(f"  {medida:<26} {a * 1000:>9.1f} ms {b * 1000:>9.1f} ms  x{a / b:>6.1f}")
+    for i, medida in [(1, "base (MB)"), (2, "archivo (MB)")]:
+        print(f"  {medida:<26} {filas['sin archivo'][i]:>12.1f} {filas['con archivo'][i]:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""Prueba de carga de app.py: muchas sesiones de Streamlit a la vez en un proceso.
+
+Levanta `streamlit run app.py` sobre un data/ temporal y lo maneja como lo
+harían los navegadores: cada sesión es una conexión websocket que pide
+ejecuciones del script con el estado de sus widgets (texto, números, menú,
+botones) y espera a que terminen. Inicia sesión, registra movimientos, guarda
+su presupuesto y abre el panel, el historial y las gráficas. Dos sesiones
+comparten cada usuario, así que también hay guardados simultáneos sobre el
+mismo registro.
+
+No usa AppTest: cambia el Runtime global de Streamlit en cada ejecución y no
+admite varias sesiones a la vez en un proceso; el servidor real, en cambio,
+corre cada sesión en su propio hilo, que es lo que se quiere medir.
+
+Para cada cantidad de sesiones simultáneas informa la latencia de las
+ejecuciones del script (p50/p95/p99, desde que se pide hasta que termina,
+incluidas las de st.rerun()) y las ejecuciones por segundo. Con el servidor
+ya detenido, comprueba en data/ que no se perdió ni duplicó ningún guardado:
+movimientos, totales diarios y presupuestos.
+
+Uso: python -m bench.carga [--sesiones 1 4 16] [--acciones 12]
+                           [--movimientos 50000] [--backend archivos]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+
+import numpy as np
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+from asesor import rollups, servicio, storage
+from bench.datos import generar_movimientos, generar_usuarios
+
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+CLAVE = "clave-de-carga"
+# Segundos que se espera un mensaje del servidor antes de dar la sesión por caída
+ESPERA = 120
+# Lo que hace cada sesión, en ciclo: (paso, página del menú)
+PASOS = [
+    ("panel", "Panel principal"),
+    ("registrar", "Registrar movimiento"),
+    ("historial", "Historial de gastos"),
+    ("registrar", "Registrar movimiento"),
+    ("graficas", "Generar gráficas"),
+    ("presupuesto", "Configurar presupuesto fijo"),
+]
+
+
+# ---------------------------------------------------------
+# Servidor
+# ---------------------------------------------------------
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def iniciar_servidor(directorio, backend):
+    """Lanza app.py con data/ en `directorio`; devuelve (proceso, puerto)."""
+    puerto = _puerto_libre()
+    proceso = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", APP,
+            "--server.headless", "true",
+            "--server.port", str(puerto),
+            "--server.fileWatcherType", "none",
+            "--browser.gatherUsageStats", "false",
+            "--logger.level", "error",
+        ],
+        cwd=directorio,
+        env={**os.environ, "ASESOR_BACKEND": backend},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"streamlit terminó al iniciar (código {proceso.returncode})")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{puerto}/_stcore/health", timeout=1)
+            return proceso, puerto
+        except OSError:
+            time.sleep(0.2)
+    proceso.kill()
+    raise RuntimeError("streamlit no respondió en 60 s")
+
+def detener_servidor(proceso):
+    proceso.terminate()
+    try:
+        proceso.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proceso.kill()
+        proceso.wait()
+
+
+# ---------------------------------------------------------
+# Sesiones
+# ---------------------------------------------------------
+class Sesion:
+    def __init__(self, numero, username, acciones):
+        self.numero = numero
+        self.username = username
+        self.acciones = acciones
+        # {paso: [segundos de cada ejecución del script]}
+        self.tiempos = defaultdict(list)
+        self.errores = []
+        # Lo que la app confirmó haber guardado
+        self.movimientos = {}
+        self.ingresos = []
+        # Widgets de la última ejecución ({etiqueta o key: proto}) y los
+        # valores que esta sesión les puso ({id: WidgetState}), como los
+        # guarda el navegador
+        self._widgets = {}
+        self._valores = {}
+
+    def _poner(self, etiqueta, campo, valor):
+        estado = WidgetState(id=self._widgets[etiqueta].id)
+        setattr(estado, campo, valor)
+        self._valores[estado.id] = estado
+
+    async def _ejecutar(self, ws, paso, boton=None):
+        # Pide una ejecución y espera a que termine; devuelve los textos de
+        # los avisos (st.success, st.warning, ...) que mostró
+        mensaje = BackMsg()
+        mensaje.rerun_script.query_string = ""
+        mensaje.rerun_script.page_script_hash = ""
+        vigentes = {w.id for w in self._widgets.values()}
+        estados = mensaje.rerun_script.widget_states.widgets
+        estados.extend(e for wid, e in self._valores.items() if wid in vigentes)
+        if boton is not None:
+            estados.append(WidgetState(id=self._widgets[boton].id, trigger_value=True))
+
+        avisos = []
+        inicio = time.perf_counter()
+        await ws.send(mensaje.SerializeToString())
+        while True:
+            f = ForwardMsg.FromString(await asyncio.wait_for(ws.recv(), ESPERA))
+            tipo = f.WhichOneof("type")
+            if tipo == "new_session":
+                # Empieza una ejecución (la pedida o la de un st.rerun())
+                self._widgets = {}
+            elif tipo == "delta" and f.delta.WhichOneof("type") == "new_element":
+                elemento = f.delta.new_element
+                clase = elemento.WhichOneof("type")
+                proto = getattr(elemento, clase)
+                if clase == "exception":
+                    raise RuntimeError(f"{paso}: {proto.type}: {proto.message}")
+                if clase == "alert":
+                    avisos.append(proto.body)
+                elif getattr(proto, "id", ""):
+                    self._widgets[proto.label] = proto
+                    # Los ids de widgets con key terminan en ella: "$$ID-<hash>-<key>"
+                    if proto.id.startswith("$$ID-"):
+                        self._widgets[proto.id.split("-", 2)[2]] = proto
+            elif tipo == "script_finished" and f.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                break
+        self.tiempos[paso].append(time.perf_counter() - inicio)
+        return avisos
+
+    async def correr(self, puerto):
+        try:
+            async with websockets.connect(
+                f"ws://127.0.0.1:{puerto}/_stcore/stream", subprotocols=["streamlit"], max_size=None
+            ) as ws:
+                await self._ejecutar(ws, "login")
+                self._poner("login_user", "string_value", self.username)
+                self._poner("login_pass", "string_value", CLAVE)
+                await self._ejecutar(ws, "login", boton="Entrar")
+                if "Menú" not in self._widgets:
+                    raise RuntimeError("login: no se pudo iniciar sesión")
+                for i in range(self.acciones):
+                    paso, pagina = PASOS[i % len(PASOS)]
+                    self._poner("Menú", "string_value", pagina)
+                    await self._ejecutar(ws, paso)
+                    if paso == "registrar":
+                        await self._registrar(ws, i)
+                    elif paso == "presupuesto":
+                        await self._presupuesto(ws, i)
+        except Exception as e:
+            self.errores.append(f"sesión {self.numero}: {type(e).__name__}: {e}")
+
+    async def _registrar(self, ws, i):
+        etiqueta = f"carga {self.numero} {i}"
+        monto = float(1 + self.numero * 1000 + i)
+        self._poner("Monto", "double_value", monto)
+        self._poner("reg_etiqueta", "string_value", etiqueta)
+        avisos = await self._ejecutar(ws, "registrar", boton="Guardar movimiento")
+        if any("guardado" in a for a in avisos):
+            self.movimientos[etiqueta] = monto
+
+    async def _presupuesto(self, ws, i):
+        ingreso = float(1000 + self.numero * 1000 + i)
+        self._poner("Ingreso mensual (salario + otros ingresos)", "double_value", ingreso)
+        avisos = await self._ejecutar(ws, "presupuesto", boton="Guardar configuración")
+        if any("actualizado" in a for a in avisos):
+            self.ingresos.append(ingreso)
+
+
+def verificar(sesiones, iniciales):
+    """Errores de integridad de lo guardado, leyendo data/ desde cero."""
+    storage.limpiar_cache()
+    rollups.totales.limpiar_cache()
+    errores = []
+    df = storage.load_movimientos()
+    etiquetas = df["etiqueta"].astype(str)
+    de_carga = df[etiquetas.str.startswith("carga ")]
+    vistos = defaultdict(list)
+    for username, etiqueta, centavos in zip(
+        de_carga["username"].astype(str), de_carga["etiqueta"].astype(str), de_carga["centavos"]
+    ):
+        vistos[etiqueta].append((username, centavos / 100))
+
+    esperados = {}
+    por_usuario = defaultdict(int)
+    for s in sesiones:
+        for etiqueta, monto in s.movimientos.items():
+            esperados[etiqueta] = (s.username, monto)
+            por_usuario[s.username] += 1
+    perdidos = [e for e in esperados if e not in vistos]
+    duplicados = [e for e, filas in vistos.items() if len(filas) > 1]
+    distintos = [e for e, filas in vistos.items() if e in esperados and filas[0] != esperados[e]]
+    sobrantes = [e for e in vistos if e not in esperados]
+    for nombre, lista in [
+        ("perdidos", perdidos), ("duplicados", duplicados), ("alterados", distintos), ("sin confirmar", sobrantes)
+    ]:
+        if lista:
+            errores.append(f"movimientos {nombre}: {len(lista)}")
+    cuentas = df["username"].astype(str).value_counts()
+    for username, n in iniciales.items():
+        if cuentas.get(username, 0) != n + por_usuario[username]:
+            errores.append(f"{username}: {cuentas.get(username, 0)} movimientos, se esperaban {n + por_usuario[username]}")
+
+    inconsistentes = rollups.verificar()
+    if inconsistentes:
+        errores.append(f"totales diarios inconsistentes: {len(inconsistentes)} usuarios")
+
+    guardados = defaultdict(set)
+    for s in sesiones:
+        guardados[s.username].update(s.ingresos)
+    for username in {s.username for s in sesiones}:
+        if not servicio.autenticar(username, CLAVE):
+            errores.append(f"{username}: registro dañado (contraseña)")
+        ingreso = (storage.load_user(username) or {}).get("monthly_income")
+        if guardados[username] and ingreso not in guardados[username]:
+            errores.append(f"{username}: presupuesto {ingreso} que ninguna sesión guardó")
+    return errores
+
+
+async def _simultaneas(sesiones, puerto):
+    await asyncio.gather(*(s.correr(puerto) for s in sesiones))
+
+def correr(n_sesiones, acciones, movimientos, backend):
+    directorio = tempfile.mkdtemp(prefix="bench-carga-")
+    cwd = os.getcwd()
+    backend_antes = storage.BACKEND
+    try:
+        os.chdir(directorio)
+        os.makedirs(storage.DATA_DIR)
+        storage.BACKEND = backend
+        # Dos sesiones por usuario, con historial previo
+        usuarios = max(1, n_sesiones // 2)
+        df = generar_movimientos(movimientos, usuarios=usuarios, dias=365, semilla=n_sesiones)
+        users = generar_usuarios(usuarios)
+        for datos in users.values():
+            datos["password_hash"] = servicio.hash_password(CLAVE)
+        storage.save_users(users)
+        storage.save_movimientos(df)
+        iniciales = df["username"].value_counts().reindex(list(users), fill_value=0).to_dict()
+        nombres = list(users)
+
+        sesiones = [Sesion(i, nombres[i % usuarios], acciones) for i in range(n_sesiones)]
+        proceso, puerto = iniciar_servidor(directorio, backend)
+        try:
+            inicio = time.perf_counter()
+            asyncio.run(_simultaneas(sesiones, puerto))
+            segundos = time.perf_counter() - inicio
+        finally:
+            detener_servidor(proceso)
+
+        errores = [e for s in sesiones for e in s.errores] + verificar(sesiones, iniciales)
+        return sesiones, segundos, errores
+    finally:
+        storage.BACKEND = backend_antes
+        storage.limpiar_cache()
+        rollups.totales.limpiar_cache()
+        os.chdir(cwd)
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def percentiles(tiempos):
+    ms = np.array(tiempos) * 1000
+    return "  ".join(f"{v:>8.0f}" for v in np.percentile(ms, [50, 95, 99])) + f"  {ms.max():>8.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sesiones", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--acciones", type=int, default=12, help="páginas que abre cada sesión")
+    parser.add_argument("--movimientos", type=int, default=50_000, help="historial previo (todos los usuarios)")
+    parser.add_argument("--backend", choices=["archivos", "sqlite"], default=storage.BACKEND)
+    args = parser.parse_args()
+
+    ok = True
+    for n in args.sesiones:
+        sesiones, segundos, errores = correr(n, args.acciones, args.movimientos, args.backend)
+        por_paso = defaultdict(list)
+        for s in sesiones:
+            for paso, tiempos in s.tiempos.items():
+                por_paso[paso].extend(tiempos)
+        todas = [t for tiempos in por_paso.values() for t in tiempos]
+        print(
+            f"\n{n} sesiones simultáneas ({args.backend}): {len(todas)} ejecuciones en "
+            f"{segundos:.1f} s, {len(todas) / segundos:.1f} ejecuciones/s"
+        )
+        print(f"  {'ms':<12} {'p50':>8}  {'p95':>8}  {'p99':>8}  {'máx':>8}")
+        for paso in sorted(por_paso):
+            print(f"  {paso:<12} {percentiles(por_paso[paso])}")
+        if todas:
+            print(f"  {'todas':<12} {percentiles(todas)}")
+        guardados = sum(len(s.movimientos) for s in sesiones)
+        print(f"  integridad   {guardados} movimientos guardados: " + ("OK" if not errores else "ERROR"))
+        for e in errores:
+            print(f"    {e}")
+        ok &= not errores
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
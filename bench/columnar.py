@@ -0,0 +1,86 @@
+"""Tiempo de carga de movimientos: CSV frente a la base columnar (Arrow).
+
+Uso: python -m bench.columnar [--filas 100000 1000000 10000000] [--repeticiones 3]
+"""
+import argparse
+import glob
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+
+from asesor import storage
+from bench.datos import generar_movimientos
+
+
+def medir(fn, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        # Se mide la lectura del disco, no la caché en memoria
+        storage.limpiar_cache()
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos)
+
+
+def carga_original():
+    # Lo que hacía load_movimientos antes del índice y del formato columnar:
+    # parsear todo el histórico, que ahora son los meses archivados más la
+    # base con los calientes
+    rutas = sorted(glob.glob(os.path.join(storage.ARCHIVO_DIR, "*.csv.gz"))) + [storage.MOV_FILE]
+    df = pd.concat([pd.read_csv(ruta) for ruta in rutas], ignore_index=True)
+    df["fecha"] = pd.to_datetime(df["fecha"])
+    return df
+
+
+def correr(filas, repeticiones):
+    df = generar_movimientos(filas)
+    usuario = df["username"].iloc[0]
+    resultados = {}
+
+    storage.MOV_BACKEND = "csv"
+    storage.save_movimientos(df)
+    resultados["csv original (todo)"] = medir(carga_original, repeticiones)
+    resultados["csv (todo)"] = medir(storage.load_movimientos, repeticiones)
+    resultados["csv (un usuario)"] = medir(lambda: storage.load_movimientos(usuario), repeticiones)
+
+    inicio = time.perf_counter()
+    storage.compact_movimientos("arrow")
+    migracion = time.perf_counter() - inicio
+
+    storage.MOV_BACKEND = "arrow"
+    resultados["arrow (todo)"] = medir(storage.load_movimientos, repeticiones)
+    resultados["arrow (un usuario)"] = medir(lambda: storage.load_movimientos(usuario), repeticiones)
+
+    print(f"\n{filas:,} filas (migración CSV -> arrow: {migracion:.2f} s)")
+    base = resultados["csv original (todo)"]
+    for nombre, segundos in resultados.items():
+        print(f"  {nombre:<22} {segundos * 1000:>10.1f} ms  x{base / segundos:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    backend = storage.MOV_BACKEND
+    cwd = os.getcwd()
+    for filas in args.filas:
+        tmp = tempfile.mkdtemp(prefix="bench-columnar-")
+        try:
+            os.chdir(tmp)
+            os.makedirs(storage.DATA_DIR)
+            correr(filas, args.repeticiones)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(tmp, ignore_errors=True)
+            storage.MOV_BACKEND = backend
+
+
+if __name__ == "__main__":
+    main()
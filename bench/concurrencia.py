@@ -0,0 +1,117 @@
+"""Prueba de estrés de escrituras concurrentes sobre el almacenamiento.
+
+Lanza muchas "sesiones" (hilos, y opcionalmente varios procesos) que se dan
+de alta, actualizan su presupuesto y guardan movimientos a la vez. Al final
+comprueba que no se perdió ninguna escritura y mide el rendimiento con y sin
+agrupación de escrituras.
+
+Uso: python -m bench.concurrencia [--sesiones 48] [--movimientos 50] [--procesos 1]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from asesor import rollups, storage
+
+
+def sesion(nombre, movimientos):
+    storage.crear_usuario(nombre, {"password_hash": "x", "monthly_income": 0.0})
+    storage.actualizar_usuario(nombre, {"monthly_income": 1000.0, "housing_budget": 300.0})
+    for i in range(movimientos):
+        storage.append_movimientos([{
+            "username": nombre,
+            "fecha": "2024-01-01",
+            "tipo": "Gasto",
+            "categoria": "Comida",
+            "etiqueta": f"mov {i}",
+            "monto": 1.0,
+        }])
+
+
+def proceso(directorio, prefijo, sesiones, movimientos, max_lote):
+    os.chdir(directorio)
+    storage.MAX_LOTE = max_lote
+    hilos = [
+        threading.Thread(target=sesion, args=(f"{prefijo}-{i}", movimientos))
+        for i in range(sesiones)
+    ]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+
+def correr(sesiones, movimientos, procesos, max_lote):
+    directorio = tempfile.mkdtemp(prefix="bench-concurrencia-")
+    cwd = os.getcwd()
+    try:
+        os.chdir(directorio)
+        os.makedirs(storage.DATA_DIR)
+        por_proceso = max(1, sesiones // procesos)
+        inicio = time.perf_counter()
+        if procesos == 1:
+            proceso(directorio, "p0", por_proceso, movimientos, max_lote)
+        else:
+            ctx = multiprocessing.get_context("spawn")
+            workers = [
+                ctx.Process(
+                    target=proceso,
+                    args=(directorio, f"p{p}", por_proceso, movimientos, max_lote),
+                )
+                for p in range(procesos)
+            ]
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+        segundos = time.perf_counter() - inicio
+
+        # Integridad: nada perdido ni a medio escribir
+        storage.limpiar_cache()
+        esperados = por_proceso * procesos
+        users = storage.load_users()
+        df = storage.load_movimientos()
+        errores = []
+        if len(users) != esperados:
+            errores.append(f"usuarios: {len(users)} de {esperados}")
+        if any(u.get("monthly_income") != 1000.0 for u in users.values()):
+            errores.append("presupuestos perdidos")
+        if len(df) != esperados * movimientos:
+            errores.append(f"movimientos: {len(df)} de {esperados * movimientos}")
+        inconsistentes = rollups.verificar()
+        if inconsistentes:
+            errores.append(f"rollups inconsistentes: {len(inconsistentes)}")
+
+        total = esperados * movimientos
+        estado = "OK" if not errores else "ERROR " + "; ".join(errores)
+        print(
+            f"  lote máx {max_lote:>4}: {total:>6} movimientos en {segundos:6.2f} s "
+            f"({total / segundos:8.0f} mov/s)  {estado}"
+        )
+        return not errores
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sesiones", type=int, default=48)
+    parser.add_argument("--movimientos", type=int, default=50)
+    parser.add_argument("--procesos", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{args.sesiones} sesiones x {args.movimientos} movimientos, {args.procesos} proceso(s)")
+    ok = True
+    # Lote de 1 equivale a una escritura y un fsync por cada guardado
+    for max_lote in (1, storage.MAX_LOTE):
+        ok &= correr(args.sesiones, args.movimientos, args.procesos, max_lote)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+
+CATEGORIAS = ["Vivienda", "Comida", "Transporte", "Servicios", "Ocio", "Salud", "Deudas", "Otros"]
+# Peso relativo de cada categoría en los gastos
+PESOS_CATEGORIAS = [0.05, 0.35, 0.2, 0.08, 0.15, 0.05, 0.04, 0.08]
+# Monto mediano de un gasto en cada categoría (mismo orden)
+MEDIANAS_CATEGORIAS = [700.0, 15.0, 4.0, 60.0, 25.0, 30.0, 150.0, 20.0]
+ETIQUETAS = ["almuerzo", "bus", "arriendo", "luz", "cine", "farmacia", "tarjeta", "varios"]
+# Viernes y sábado se gasta más que entre semana
+PESOS_DIA_SEMANA = [1.0, 0.9, 0.9, 1.0, 1.4, 1.6, 1.1]
+
+
+def _nombres(usuarios):
+    return np.array([f"usuario{i:06d}" for i in range(usuarios)], dtype=object)
+
+
+def generar_movimientos(filas, usuarios=None, dias=3 * 365, semilla=0, hasta=None):
+    """DataFrame sintético con el esquema de movimientos.csv.
+
+    La actividad por usuario es desigual (unos pocos concentran muchos
+    movimientos), los gastos se cargan hacia el fin de semana y los ingresos
+    caen el 1 o el 15 de cada mes.
+    """
+    rng = np.random.default_rng(semilla)
+    usuarios = usuarios or max(1, filas // 200)
+    hasta = pd.Timestamp(hasta or pd.Timestamp.today().normalize())
+
+    actividad = rng.lognormal(0.0, 0.8, usuarios)
+    quien = rng.choice(usuarios, filas, p=actividad / actividad.sum())
+
+    calendario = hasta - pd.to_timedelta(np.arange(dias), unit="D")
+    peso_dia = np.asarray(PESOS_DIA_SEMANA)[calendario.dayofweek]
+    fechas = calendario[rng.choice(dias, filas, p=peso_dia / peso_dia.sum())]
+
+    es_ingreso = rng.random(filas) < 0.05
+    # Día de pago: el 1 o el 15 del mes del movimiento, sin pasarse de hoy
+    quincena = fechas.to_period("M").to_timestamp() + pd.to_timedelta(
+        np.where(rng.random(filas) < 0.5, 0, 14), unit="D"
+    )
+    fechas = fechas.where(~es_ingreso | (quincena > hasta), quincena)
+
+    cat = rng.choice(len(CATEGORIAS), filas, p=PESOS_CATEGORIAS)
+    gasto = rng.lognormal(np.log(np.asarray(MEDIANAS_CATEGORIAS)[cat]), 0.6)
+    montos = np.where(es_ingreso, rng.normal(1500, 300, filas).clip(100), gasto).round(2)
+    return pd.DataFrame({
+        "username": _nombres(usuarios)[quien],
+        "fecha": fechas,
+        "tipo": np.where(es_ingreso, "Ingreso", "Gasto"),
+        "categoria": np.asarray(CATEGORIAS, dtype=object)[cat],
+        "etiqueta": rng.choice(ETIQUETAS, filas),
+        "monto": montos,
+    })
+
+
+def generar_usuarios(usuarios, semilla=0):
+    """Registros de users.json para los mismos nombres que generar_movimientos."""
+    rng = np.random.default_rng(semilla)
+    ingresos = rng.normal(3000, 800, usuarios).clip(800).round(-1)
+    return {
+        nombre: {
+            "password_hash": "x",
+            "monthly_income": float(ingreso),
+            "housing_budget": float(round(ingreso * 0.3, -1)),
+            "market_budget": float(round(ingreso * 0.12, -1)),
+            "transport_daily": float(rng.integers(2, 12)),
+        }
+        for nombre, ingreso in zip(_nombres(usuarios), ingresos)
+    }
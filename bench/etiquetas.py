@@ -0,0 +1,88 @@
+"""Latencia del autocompletado de etiquetas con un historial grande.
+
+Un usuario con `--etiquetas` etiquetas distintas: tiempo de armar el índice,
+de sugerir por prefijos de 1 a 6 letras (primera vez y repetido) y de anexar
+un movimiento, que actualiza el índice sin releerlo.
+
+Uso: python -m bench.etiquetas [--etiquetas 100000] [--consultas 5000]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from asesor import etiquetas, storage
+from bench.datos import CATEGORIAS
+
+
+def percentiles(tiempos):
+    ms = np.array(tiempos) * 1000
+    return f"p50 {np.percentile(ms, 50):.3f} ms  p99 {np.percentile(ms, 99):.3f} ms  max {ms.max():.3f} ms"
+
+
+def correr(distintas, consultas):
+    rng = np.random.default_rng(0)
+    letras = np.array(list("abcdefghijklmnopqrstuvwxyzáéñ "))
+    textos = {"".join(rng.choice(letras, rng.integers(4, 20))).strip() or "x" for _ in range(distintas)}
+    textos = sorted(textos)
+    usos = rng.zipf(1.5, len(textos)).clip(max=50)
+    df = pd.DataFrame({
+        "username": "ana",
+        "fecha": pd.Timestamp.today().normalize(),
+        "tipo": "Gasto",
+        "categoria": rng.choice(CATEGORIAS, len(textos)),
+        "etiqueta": textos,
+        "monto": 1.0,
+    }).loc[lambda d: d.index.repeat(usos)]
+    storage.save_movimientos(df)
+
+    etiquetas.usos.limpiar_cache()
+    inicio = time.perf_counter()
+    etiquetas.indice("ana")
+    print(f"\n{len(textos):,} etiquetas distintas, {len(df):,} movimientos")
+    print(f"  armar el índice (leer JSON y ordenar)   {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+    prefijos = [t[: rng.integers(1, 7)] for t in rng.choice(textos, consultas)]
+    for vuelta in ("primera vez", "repetido"):
+        tiempos = []
+        for prefijo in prefijos:
+            inicio = time.perf_counter()
+            etiquetas.sugerir("ana", prefijo)
+            tiempos.append(time.perf_counter() - inicio)
+        print(f"  sugerir ({vuelta:<11})                {percentiles(tiempos)}")
+
+    tiempos = []
+    for i in range(20):
+        inicio = time.perf_counter()
+        storage.append_movimientos([{
+            "username": "ana", "fecha": pd.Timestamp.today(), "tipo": "Gasto",
+            "categoria": "Ocio", "etiqueta": f"nueva {i}", "monto": 1.0,
+        }])
+        tiempos.append(time.perf_counter() - inicio)
+    print(f"  anexar un movimiento (mediana)          {statistics.median(tiempos) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--etiquetas", type=int, default=100_000)
+    parser.add_argument("--consultas", type=int, default=5000)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    tmp = tempfile.mkdtemp(prefix="bench-etiquetas-")
+    try:
+        os.chdir(tmp)
+        os.makedirs(storage.DATA_DIR)
+        correr(args.etiquetas, args.consultas)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
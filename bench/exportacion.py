@@ -0,0 +1,82 @@
+"""Exportación por trozos frente a cargar el historial y convertirlo de una vez.
+
+Un usuario con `--filas` movimientos repartidos en `--dias` días: tiempo
+hasta el primer trozo, tiempo total y pico de memoria (tracemalloc) de
+asesor.exportacion y de load_movimientos + to_csv.
+
+Uso: python -m bench.exportacion [--filas 1000000] [--dias 1500]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from asesor import esquema, exportacion, storage
+from bench.datos import generar_movimientos
+
+
+def medir(producir):
+    # (segundos hasta el primer trozo con movimientos, segundos en total,
+    # MB de pico, bytes); el pico se mide en otra pasada, tracemalloc
+    # hace más lenta la ejecución
+    storage.limpiar_cache()
+    inicio = time.perf_counter()
+    primero = None
+    total = 0
+    for trozo in producir():
+        if primero is None and trozo.count(b"\n") > 1:
+            primero = time.perf_counter() - inicio
+        total += len(trozo)
+    fin = time.perf_counter() - inicio
+
+    storage.limpiar_cache()
+    tracemalloc.start()
+    for trozo in producir():
+        pass
+    pico = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return primero, fin, pico, total
+
+
+def de_una_vez(usuario):
+    df = storage.load_movimientos(usuario)
+    yield esquema.para_mostrar(df).to_csv(index=False).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    parser.add_argument("--dias", type=int, default=1500)
+    args = parser.parse_args()
+
+    df = generar_movimientos(args.filas, usuarios=1, dias=args.dias)
+    usuario = df["username"].iloc[0]
+    cwd = os.getcwd()
+    tmp = tempfile.mkdtemp(prefix="bench-exportacion-")
+    try:
+        os.chdir(tmp)
+        os.makedirs(storage.DATA_DIR)
+        storage.save_movimientos(df)
+        del df
+        filas = {
+            "por trozos (CSV)": lambda: exportacion.exportar(usuario, "csv"),
+            "por trozos (JSONL)": lambda: exportacion.exportar(usuario, "jsonl"),
+            "de una vez (CSV)": lambda: de_una_vez(usuario),
+        }
+        print(f"\n{args.filas:,} movimientos de un usuario, {args.dias} días")
+        print(f"  {'':<20} {'primer trozo':>13} {'total':>10} {'pico':>10} {'archivo':>10}")
+        for nombre, producir in filas.items():
+            primero, fin, pico, total = medir(producir)
+            print(
+                f"  {nombre:<20} {primero * 1000:>10.1f} ms {fin:>8.2f} s "
+                f"{pico:>7.1f} MB {total / 2**20:>7.1f} MB"
+            )
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Memoria de los movimientos cargados: esquema anterior frente al compacto.
+
+Compara el mismo DataFrame con textos como objetos de Python (pandas < 3),
+como columnas str de pandas y con el esquema de asesor.esquema (categóricas
+y centavos int64). También muestra el error de redondeo al sumar en float.
+
+Uso: python -m bench.memoria [--filas 1000000 10000000]
+"""
+import argparse
+import time
+
+from asesor import esquema
+from bench.datos import generar_movimientos
+
+
+def megas(df):
+    return df.memory_usage(index=True, deep=True).sum() / 2**20
+
+
+def correr(filas):
+    crudo = generar_movimientos(filas)
+    textos = ["username", "tipo", "categoria", "etiqueta"]
+    objetos = crudo.astype({c: object for c in textos})
+    cadenas = crudo.astype({c: "str" for c in textos})
+    inicio = time.perf_counter()
+    compacto = esquema.compactar(cadenas)
+    segundos = time.perf_counter() - inicio
+
+    print(f"\n{filas:,} filas (compactar: {segundos:.2f} s)")
+    base = megas(objetos)
+    for nombre, df in [("objetos", objetos), ("str", cadenas), ("compacto", compacto)]:
+        mb = megas(df)
+        print(f"  {nombre:<10} {mb:>10.1f} MB  {mb / base:>6.1%}")
+    por_columna = compacto.memory_usage(index=False, deep=True) / 2**20
+    print("  compacto por columna: " + ", ".join(f"{c} {mb:.1f} MB" for c, mb in por_columna.items()))
+
+    exacto = int(compacto["centavos"].sum())
+    flotante = float(crudo["monto"].astype(float).cumsum().iloc[-1])
+    print(f"  suma en centavos {exacto / 100:,.2f}; en float {flotante:,.6f} (error {flotante - exacto / 100:+.2e})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    args = parser.parse_args()
+    for filas in args.filas:
+        correr(filas)
+
+
+if __name__ == "__main__":
+    main()
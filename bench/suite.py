@@ -0,0 +1,202 @@
+"""Micro-benchmarks de la capa de datos con informe en JSON.
+
+Mide, para cada backend y tamaño (N usuarios x M movimientos de media), el
+tiempo y el pico de memoria de las funciones calientes: guardar y cargar
+movimientos, el resumen del panel y las recomendaciones.
+
+Uso: python -m bench.suite [--usuarios 100 1000] [--movimientos 200]
+                           [--backends archivos sqlite] [--repeticiones 5]
+                           [--salida bench-datos.json] [--comparar anterior.json]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from asesor import rollups, storage
+from asesor.analytics import recomendaciones
+from asesor.servicio import obtener_resumen_usuario
+from bench.datos import generar_movimientos, generar_usuarios
+
+
+BACKENDS = ["archivos", "sqlite"]
+
+
+def limpiar_caches():
+    storage.limpiar_cache()
+    rollups.totales.limpiar_cache()
+
+
+def operaciones(df, users):
+    """(nombre, antes, fn): `antes` deja el estado de partida de cada medición."""
+    por_usuario = df["username"].value_counts()
+    activo = por_usuario.index[0]
+    hoy = date.today()
+    inicio_mes = hoy.replace(day=1)
+    resumen = obtener_resumen_usuario(activo)
+    fila = {
+        "username": activo,
+        "fecha": datetime.combine(hoy, datetime.min.time()),
+        "tipo": "Gasto",
+        "categoria": "Comida",
+        "etiqueta": "bench",
+        "monto": 1.0,
+    }
+
+    def guardar():
+        storage.save_users(users)
+        storage.save_movimientos(df)
+
+    return [
+        ("save_movimientos", None, guardar),
+        ("load_movimientos (todos)", limpiar_caches, lambda: storage.load_movimientos()),
+        ("load_movimientos (usuario)", limpiar_caches, lambda: storage.load_movimientos(activo)),
+        (
+            "load_movimientos (usuario, mes)",
+            limpiar_caches,
+            lambda: storage.load_movimientos(activo, desde=inicio_mes, hasta=hoy),
+        ),
+        (
+            "load_movimientos (usuario, 30 días, caché)",
+            None,
+            lambda: storage.load_movimientos(activo, desde=hoy - timedelta(days=30)),
+        ),
+        ("obtener_resumen_usuario", limpiar_caches, lambda: obtener_resumen_usuario(activo)),
+        ("obtener_resumen_usuario (caché)", None, lambda: obtener_resumen_usuario(activo)),
+        ("recomendaciones", None, lambda: recomendaciones(resumen)),
+        ("append_movimientos (1 fila)", None, lambda: storage.append_movimientos([fila])),
+    ], int(por_usuario.iloc[0])
+
+
+def medir(antes, fn, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        if antes:
+            antes()
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - inicio)
+    # Pico de memoria en una pasada aparte: tracemalloc ralentiza la medición
+    if antes:
+        antes()
+    tracemalloc.start()
+    try:
+        fn()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "mediana_ms": statistics.median(tiempos) * 1000,
+        "min_ms": min(tiempos) * 1000,
+        "pico_mb": pico / 2**20,
+    }
+
+
+def correr(backend, usuarios, movimientos, repeticiones, semilla):
+    df = generar_movimientos(usuarios * movimientos, usuarios=usuarios, semilla=semilla)
+    users = generar_usuarios(usuarios, semilla=semilla)
+    directorio = tempfile.mkdtemp(prefix="bench-suite-")
+    cwd = os.getcwd()
+    anterior = storage.BACKEND
+    try:
+        os.chdir(directorio)
+        os.makedirs(storage.DATA_DIR)
+        storage.BACKEND = backend
+        limpiar_caches()
+        # Datos cargados antes de medir las lecturas
+        storage.save_users(users)
+        storage.save_movimientos(df)
+        ops, filas_activo = operaciones(df, users)
+        resultados = []
+        for nombre, antes, fn in ops:
+            r = medir(antes, fn, repeticiones)
+            r.update({
+                "backend": backend,
+                "usuarios": usuarios,
+                "movimientos_por_usuario": movimientos,
+                "filas": len(df),
+                "filas_usuario_activo": filas_activo,
+                "operacion": nombre,
+            })
+            resultados.append(r)
+        return resultados
+    finally:
+        os.chdir(cwd)
+        storage.BACKEND = anterior
+        limpiar_caches()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def _clave(r):
+    return (r["backend"], r["usuarios"], r["movimientos_por_usuario"], r["operacion"])
+
+
+def imprimir(resultados, previos=None):
+    previos = {_clave(r): r for r in (previos or [])}
+    actual = None
+    for r in resultados:
+        grupo = (r["backend"], r["usuarios"], r["movimientos_por_usuario"])
+        if grupo != actual:
+            actual = grupo
+            print(
+                f"\n{r['backend']}: {r['usuarios']:,} usuarios x {r['movimientos_por_usuario']:,} "
+                f"movimientos ({r['filas']:,} filas; el más activo tiene {r['filas_usuario_activo']:,})"
+            )
+        linea = f"  {r['operacion']:<44} {r['mediana_ms']:>10.2f} ms {r['pico_mb']:>9.1f} MB"
+        previo = previos.get(_clave(r))
+        if previo:
+            linea += f"  x{previo['mediana_ms'] / r['mediana_ms']:>6.2f} vs anterior"
+        print(linea)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--movimientos", type=int, nargs="+", default=[200])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", default="bench-datos.json")
+    parser.add_argument("--comparar", help="informe anterior con el que comparar")
+    args = parser.parse_args()
+
+    resultados = []
+    for backend in args.backends:
+        for usuarios in args.usuarios:
+            for movimientos in args.movimientos:
+                resultados += correr(backend, usuarios, movimientos, args.repeticiones, args.semilla)
+
+    previos = None
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            previos = json.load(f)["resultados"]
+    imprimir(resultados, previos)
+
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "entorno": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "parametros": vars(args),
+        "resultados": resultados,
+    }
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, ensure_ascii=False, indent=2)
+    print(f"\nInforme escrito en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asesor import etiquetas, rollups, storage  # noqa: E402
+
+
+@pytest.fixture
+def datos(tmp_path, monkeypatch):
+    """data/ vacío en un directorio temporal (DATA_DIR es relativo)."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, "BACKEND", "archivos")
+    # Filas pendientes del log, contadas en el data/ de la prueba anterior
+    monkeypatch.setattr(storage, "_filas_log", None)
+    os.makedirs(storage.DATA_DIR)
+    storage.limpiar_cache()
+    rollups.totales.limpiar_cache()
+    etiquetas.usos.limpiar_cache()
+    yield tmp_path
+    storage.limpiar_cache()
+    rollups.totales.limpiar_cache()
+    etiquetas.usos.limpiar_cache()
@@ -0,0 +1,87 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from asesor.analytics import IndiceTemporal, periodo_anterior
+
+
+def rollup():
+    # Un gasto por día de enero a marzo de 2024 (monto = día del año) y un
+    # ingreso de 1000 el primero de cada mes
+    dias = pd.date_range("2024-01-01", "2024-03-31", freq="D")
+    gastos = pd.DataFrame({
+        "dia": dias,
+        "tipo": "Gasto",
+        "categoria": np.where(dias.day % 2 == 0, "Comida", "Ocio"),
+        "monto": np.arange(1, len(dias) + 1, dtype=float),
+        "n": 1,
+    })
+    ingresos = pd.DataFrame({
+        "dia": pd.to_datetime(["2024-01-01", "2024-02-01", "2024-03-01"]),
+        "tipo": "Ingreso",
+        "categoria": "Sueldo",
+        "monto": 1000.0,
+        "n": 1,
+    })
+    return pd.concat([gastos, ingresos], ignore_index=True)
+
+
+@pytest.mark.parametrize("desde, hasta", [
+    (date(2024, 1, 1), date(2024, 3, 31)),
+    (date(2024, 2, 10), date(2024, 2, 10)),
+    (date(2023, 12, 1), date(2024, 1, 5)),
+    (date(2024, 3, 20), date(2024, 5, 1)),
+    (date(2024, 5, 1), date(2024, 5, 31)),
+    (date(2024, 2, 10), date(2024, 2, 1)),
+])
+def test_totales_iguales_a_filtrar(desde, hasta):
+    df = rollup()
+    dentro = df[(df["dia"] >= pd.Timestamp(desde)) & (df["dia"] <= pd.Timestamp(hasta))]
+    gastos = dentro[dentro["tipo"] == "Gasto"]
+
+    t = IndiceTemporal(df).totales(desde, hasta)
+    assert t.gasto == gastos["monto"].sum()
+    assert t.ingreso == dentro.loc[dentro["tipo"] == "Ingreso", "monto"].sum()
+    assert t.movimientos == len(dentro)
+    assert t.dias_con_gasto == len(gastos)
+    assert t.gastos_cat == gastos.groupby("categoria")["monto"].sum().to_dict()
+
+
+def test_serie_por_resolucion():
+    indice = IndiceTemporal(rollup())
+
+    mensual = indice.serie(date(2024, 1, 15), date(2024, 3, 10), "M")
+    inicios = mensual.flujo.index.strftime("%Y-%m-%d").tolist()
+    assert inicios == ["2024-01-15", "2024-02-01", "2024-03-01"]
+    # Del 15 al 31 de enero, febrero entero (días 32-60) y del 1 al 10 de marzo
+    assert mensual.flujo["Gastos"].tolist() == [
+        sum(range(15, 32)), sum(range(32, 61)), sum(range(61, 71))
+    ]
+    assert mensual.flujo["Ingresos"].tolist() == [0, 1000, 1000]
+
+    # 2024-01-03 es miércoles: la primera semana queda cortada
+    semanal = indice.serie(date(2024, 1, 3), date(2024, 1, 21), "W")
+    inicios = semanal.flujo.index.strftime("%Y-%m-%d").tolist()
+    assert inicios == ["2024-01-03", "2024-01-08", "2024-01-15"]
+    assert semanal.flujo["Gastos"].sum() == sum(range(3, 22))
+
+    diaria = indice.serie(date(2024, 1, 1), date(2024, 3, 31), "D", max_puntos=10)
+    assert diaria.periodos_por_punto == 10
+    assert len(diaria.flujo) == 10
+    assert diaria.flujo["Gastos"].sum() == sum(range(1, 92))
+    assert (diaria.categorias.sum(axis=1) == diaria.flujo["Gastos"]).all()
+
+
+@pytest.mark.parametrize("desde, hasta, esperado", [
+    # Meses completos: los mismos meses hacia atrás
+    (date(2024, 3, 1), date(2024, 3, 31), (date(2024, 2, 1), date(2024, 2, 29))),
+    (date(2024, 4, 1), date(2024, 6, 30), (date(2024, 1, 1), date(2024, 3, 31))),
+    (date(2024, 1, 1), date(2024, 12, 31), (date(2023, 1, 1), date(2023, 12, 31))),
+    # Cualquier otro rango: la misma cantidad de días
+    (date(2024, 3, 1), date(2024, 3, 15), (date(2024, 2, 15), date(2024, 2, 29))),
+    (date(2024, 3, 10), date(2024, 3, 10), (date(2024, 3, 9), date(2024, 3, 9))),
+])
+def test_periodo_anterior(desde, hasta, esperado):
+    assert periodo_anterior(desde, hasta) == esperado
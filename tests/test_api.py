@@ -0,0 +1,76 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from asesor import api, servicio
+
+
+@pytest.fixture
+def url(datos, monkeypatch):
+    monkeypatch.setattr(api, "TOKEN", "")
+    httpd = api.servidor("127.0.0.1", 0)
+    hilo = threading.Thread(target=httpd.serve_forever, daemon=True)
+    hilo.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def pedir(url, cuerpo=None):
+    datos = json.dumps(cuerpo).encode("utf-8") if cuerpo is not None else None
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=datos)) as r:
+            return r.status, json.loads(r.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_usuarios_con_tildes_y_espacios(url):
+    servicio.registrar_usuario("josé", "clave")
+    servicio.registrar_usuario("ana maría", "clave")
+
+    estado, _ = pedir(f"{url}/usuarios/jos%C3%A9/resumen")
+    assert estado == 200
+    movimiento = {"fecha": "2024-01-05", "tipo": "Gasto", "categoria": "Comida", "monto": 12}
+    estado, datos = pedir(f"{url}/usuarios/ana%20mar%C3%ADa/movimientos", movimiento)
+    assert (estado, datos) == (201, {"registrados": 1})
+    estado, datos = pedir(f"{url}/usuarios/ana%20mar%C3%ADa/movimientos?desde=2024-01-01&hasta=2024-01-31")
+    assert estado == 200 and datos["total"] == 1
+
+
+def test_error_inesperado_responde_500(url, monkeypatch):
+    servicio.registrar_usuario("ana", "clave")
+
+    def falla(username):
+        raise RuntimeError("falla")
+
+    monkeypatch.setattr(servicio, "obtener_panel", falla)
+    estado, datos = pedir(f"{url}/usuarios/ana/resumen")
+    assert estado == 500 and "error" in datos
+
+
+def test_sin_token_solo_escucha_en_local(monkeypatch):
+    monkeypatch.setattr(api, "TOKEN", "")
+    with pytest.raises(ValueError):
+        api.servidor("0.0.0.0", 0)
+
+    monkeypatch.setattr(api, "TOKEN", "secreto")
+    api.servidor("0.0.0.0", 0).server_close()
+
+
+def test_exportar_con_nombre_no_ascii(url):
+    servicio.registrar_usuario('ana "maría"', "clave")
+    movimiento = {"fecha": "2024-01-05", "tipo": "Gasto", "categoria": "Comida", "monto": 12}
+    pedir(f"{url}/usuarios/ana%20%22mar%C3%ADa%22/movimientos", movimiento)
+
+    with urllib.request.urlopen(f"{url}/usuarios/ana%20%22mar%C3%ADa%22/exportar?formato=jsonl") as r:
+        disposicion = r.headers["Content-Disposition"]
+        filas = r.read().splitlines()
+    assert disposicion == (
+        'attachment; filename="movimientos_ana__mar_a_.jsonl"; '
+        "filename*=UTF-8''movimientos_ana%20%22mar%C3%ADa%22.jsonl"
+    )
+    assert [json.loads(f)["monto"] for f in filas] == [12.0]
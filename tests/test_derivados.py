@@ -0,0 +1,33 @@
+import pandas as pd
+
+from asesor import etiquetas, rollups, storage
+
+
+def movimiento(etiqueta, monto, username="ana"):
+    return {
+        "username": username,
+        "fecha": "2024-03-01 10:00:00",
+        "tipo": "Gasto",
+        "categoria": "Comida",
+        "etiqueta": etiqueta,
+        "monto": monto,
+    }
+
+
+def test_storage_mantiene_los_derivados_registrados(datos):
+    storage.append_movimientos([movimiento("pan", 2.5)])
+    storage.append_lote(pd.DataFrame([movimiento("papas", 1.25), movimiento("té", 3, "bea")]))
+
+    assert rollups.cargar("ana")["monto"].tolist() == [3.75]
+    assert etiquetas.sugerir("ana", "pa") == ["pan", "papas"]
+    assert rollups.verificar() == []
+
+
+def test_save_movimientos_reemplaza_los_derivados(datos):
+    storage.append_movimientos([movimiento("pan", 2.5), movimiento("té", 3, "bea")])
+    storage.save_movimientos(pd.DataFrame([movimiento("arroz", 4)]))
+
+    assert etiquetas.sugerir("ana", "pa") == []
+    assert etiquetas.sugerir("ana", "ar") == ["arroz"]
+    assert rollups.totales.leer("bea") is None
+    assert rollups.verificar() == []
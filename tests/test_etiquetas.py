@@ -0,0 +1,64 @@
+import os
+
+from asesor import etiquetas, storage
+from asesor.etiquetas import IndiceEtiquetas
+
+
+def movimiento(etiqueta, categoria="Comida", username="ana"):
+    return {
+        "username": username,
+        "fecha": "2024-03-01 10:00:00",
+        "tipo": "Gasto",
+        "categoria": categoria,
+        "etiqueta": etiqueta,
+        "monto": 1,
+    }
+
+
+def test_actualizada_no_modifica_el_indice_anterior():
+    anterior = IndiceEtiquetas({"Café": {"Comida": 2}, "taxi": {"Transporte": 1}})
+    nuevo = anterior.actualizada({"cafe": {"Ocio": 3}, "arroz": {"Comida": 1}})
+
+    assert anterior.claves == ["cafe", "taxi"]
+    assert anterior.categoria("CAFÉ") == "Comida"
+    assert nuevo.claves == ["arroz", "cafe", "taxi"]
+    # "Café" y "cafe" son la misma etiqueta: se muestra la forma más usada
+    assert nuevo.sugerir("caf") == ["cafe"]
+    assert nuevo.categoria("café") == "Ocio"
+    assert nuevo.conteos["Café"] == {"Comida": 2}
+
+
+def test_sugerir_mas_usadas_primero():
+    indice = IndiceEtiquetas({
+        "pan": {"Comida": 1}, "papas": {"Comida": 3}, "palta": {"Comida": 1}, "té": {"Comida": 9},
+    })
+
+    assert indice.sugerir("PA") == ["papas", "palta", "pan"]
+    assert indice.sugerir("pa", limite=1) == ["papas"]
+    assert indice.sugerir("te") == ["té"]
+    assert indice.sugerir("  ") == []
+
+
+def test_los_anexados_van_al_log_y_al_indice_en_memoria(datos, monkeypatch):
+    storage.append_movimientos([movimiento("pan")])
+    assert etiquetas.sugerir("ana", "p") == ["pan"]
+    cargado = etiquetas.indice("ana")
+
+    storage.append_movimientos([movimiento("papas"), movimiento("papas", "Ocio")])
+    assert os.path.exists(etiquetas.usos.ruta("ana", ".log"))
+    # El índice nuevo se publicó sin releer los archivos
+    assert etiquetas.indice("ana") is not cargado
+    assert etiquetas.sugerir("ana", "p") == ["papas", "pan"]
+
+    # Con el log lleno se funde con los conteos
+    monkeypatch.setattr(etiquetas, "MAX_LOG_BYTES", 10)
+    storage.append_movimientos([movimiento("papas", "Ocio")])
+    assert not os.path.exists(etiquetas.usos.ruta("ana", ".log"))
+    assert etiquetas.categoria_sugerida("ana", "Papas") == "Ocio"
+
+    etiquetas.usos.limpiar_cache()
+    en_disco = etiquetas.usos.leer("ana")
+    etiquetas.reconstruir("ana")
+    assert en_disco == etiquetas.usos.leer("ana") == {
+        "pan": {"Comida": 1}, "papas": {"Comida": 1, "Ocio": 2},
+    }
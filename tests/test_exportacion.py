@@ -0,0 +1,67 @@
+import json
+from datetime import date
+
+import pytest
+
+from asesor import exportacion, recurrentes, servicio, storage
+from asesor.importacion import CAMPOS
+
+
+@pytest.fixture
+def ana(datos):
+    servicio.registrar_usuario("ana", "clave")
+    storage.append_movimientos([
+        {
+            "username": "ana",
+            "fecha": f"2024-03-0{dia} 10:00:00",
+            "tipo": "Gasto",
+            "categoria": "Comida",
+            "etiqueta": f"compra {dia}",
+            "monto": dia * 10,
+        }
+        for dia in (5, 1, 3, 2, 4)
+    ])
+    return "ana"
+
+
+def test_trozos_de_a_filas_por_trozo(ana):
+    trozos = list(exportacion.exportar(ana, filas_por_trozo=2))
+
+    cabecera, *resto = trozos
+    assert cabecera == (",".join(CAMPOS) + "\n").encode("utf-8")
+    assert [t.count(b"\n") for t in resto] == [2, 2, 1]
+    # Juntos son el archivo de un solo trozo, ordenado por fecha
+    assert b"".join(trozos) == b"".join(exportacion.exportar(ana, filas_por_trozo=1000))
+    lineas = b"".join(resto).decode("utf-8").splitlines()
+    assert [linea.split(",")[0] for linea in lineas] == [f"2024-03-0{d} 10:00:00" for d in range(1, 6)]
+
+
+def test_jsonl_y_rango(ana):
+    trozos = exportacion.exportar(ana, "jsonl", desde="2024-03-02", hasta="2024-03-04", filas_por_trozo=2)
+    filas = [json.loads(linea) for linea in b"".join(trozos).splitlines()]
+
+    assert [f["etiqueta"] for f in filas] == ["compra 2", "compra 3", "compra 4"]
+    assert filas[0]["monto"] == pytest.approx(20.0)
+
+
+def test_argumentos_invalidos_fallan_al_llamar(ana):
+    with pytest.raises(ValueError):
+        exportacion.exportar(ana, "xlsx")
+    with pytest.raises(ValueError):
+        exportacion.exportar(ana, desde="no es fecha")
+    with pytest.raises(ValueError):
+        exportacion.exportar(ana, filas_por_trozo=0)
+
+
+def test_ocurrencias_de_los_recurrentes(ana):
+    inicio = date.today().replace(day=1)
+    servicio.agregar_recurrente(ana, "Gasto", "Vivienda", 500, "Mensual", inicio, etiqueta="alquiler")
+
+    con = b"".join(exportacion.exportar(ana)).decode("utf-8").splitlines()
+    sin = b"".join(exportacion.exportar(ana, recurrentes=False)).decode("utf-8").splitlines()
+
+    assert len(sin) == 1 + 5
+    [ocurrencia] = [linea for linea in con if linea not in sin]
+    fila = dict(zip(CAMPOS, ocurrencia.split(",")))
+    assert fila["fecha"].startswith(f"{inicio:%Y-%m-%d}")
+    assert fila["etiqueta"] == recurrentes.MARCA + "alquiler"
@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from asesor import esquema, historial, storage
+
+
+# Movimientos por día: 1 -> 3, 3 -> 2, 4 -> 4, 5 -> 1 (el 2 no hay ninguno)
+POR_DIA = {1: 3, 3: 2, 4: 4, 5: 1}
+
+
+@pytest.fixture
+def ana(datos):
+    filas = []
+    for dia, n in POR_DIA.items():
+        for hora in range(n):
+            filas.append({
+                "username": "ana",
+                "fecha": f"2024-03-0{dia} {10 + hora}:00:00",
+                "tipo": "Ingreso" if hora == 0 else "Gasto",
+                "categoria": "Comida",
+                "etiqueta": "",
+                "monto": dia * 100 + hora,
+            })
+    storage.append_movimientos(filas)
+    return filas
+
+
+def test_dias_de_la_pagina(ana):
+    def dias(descendente, inicio, fin, tipo=None):
+        return historial._dias_de_la_pagina("ana", [], None, None, tipo, None, descendente, inicio, fin)
+
+    def dia(d):
+        return pd.Timestamp(f"2024-03-0{d}")
+
+    # Filas 3-5 en orden ascendente: las dos del 3 y la primera del 4
+    assert dias(False, 3, 6) == (10, dia(3), dia(4), 0)
+    # Descendente: 5 (1 fila), 4 (4), 3 (2)... la fila 3 es la tercera del 4
+    assert dias(True, 3, 6) == (10, dia(3), dia(4), 2)
+    assert dias(True, 0, 1) == (10, dia(5), dia(5), 0)
+    assert dias(False, 9, 50) == (10, dia(5), dia(5), 0)
+    assert dias(False, 10, 20) == (10, None, None, 0)
+    assert dias(False, 1, 3, tipo="Ingreso") == (4, dia(3), dia(4), 0)
+
+
+@pytest.mark.parametrize("descendente", [True, False])
+def test_paginas_iguales_a_ordenar_todo(ana, descendente):
+    todo = storage.load_movimientos("ana").sort_values("fecha", ascending=not descendente)
+    esperado = esquema.pesos(todo).tolist()
+
+    vistas = []
+    for pagina in range(4):
+        df, total = historial.consultar_movimientos(
+            "ana", descendente=descendente, pagina=pagina, por_pagina=3
+        )
+        assert total == 10
+        vistas += df["monto"].tolist()
+    assert vistas == esperado
@@ -0,0 +1,49 @@
+import io
+
+from asesor import storage
+from asesor.importacion import importar_csv
+
+
+MAPEO = {"fecha": "Fecha", "monto": "Importe", "etiqueta": "Detalle"}
+
+
+def extracto(*filas):
+    return io.StringIO("Fecha,Importe,Detalle\n" + "".join(f"{f}\n" for f in filas))
+
+
+def test_descarta_montos_infinitos_y_fechas_fuera_de_rango(datos):
+    stats = importar_csv(
+        extracto("2024-01-05,-12.5,café", "2024-01-06,inf,infinito", "1500-01-01,-10,antiguo"),
+        "ana",
+        MAPEO,
+    )
+
+    assert stats == {"leidas": 3, "nuevas": 1, "duplicadas": 0, "invalidas": 2}
+    df = storage.load_movimientos("ana")
+    assert df["etiqueta"].astype(str).tolist() == ["café"]
+    # La base quedó compactada: no queda un log pendiente que falle al reintentar
+    storage.compact_movimientos()
+    assert len(storage.load_movimientos("ana")) == 1
+
+
+def test_un_bloque_sin_filas_validas_no_corta_la_importacion(datos):
+    stats = importar_csv(
+        extracto(",-1,sin fecha", "2024-01-05,0,cero", "2024-01-06,-3,pan"),
+        "ana",
+        MAPEO,
+        tam_bloque=2,
+    )
+
+    assert stats == {"leidas": 3, "nuevas": 1, "duplicadas": 0, "invalidas": 2}
+    assert len(storage.load_movimientos("ana")) == 1
+
+
+def test_tipo_vacio_usa_el_signo_del_monto(datos):
+    fuente = io.StringIO(
+        "Fecha,Importe,Tipo\n2024-01-05,-12.5,\n2024-01-06,100,\n2024-01-07,30,Cargo\n"
+    )
+    importar_csv(fuente, "ana", {"fecha": "Fecha", "monto": "Importe", "tipo": "Tipo"})
+
+    df = storage.load_movimientos("ana")
+    assert df["tipo"].astype(str).tolist() == ["Gasto", "Ingreso", "Gasto"]
+    assert (df["centavos"] > 0).all()
@@ -0,0 +1,20 @@
+import shutil
+
+from asesor import precalculo, rollups, servicio
+
+
+def test_precalculo_vale_aunque_falten_los_totales(datos):
+    servicio.registrar_usuario("ana", "clave")
+    servicio.registrar_movimientos(
+        "ana", [{"fecha": "2024-03-01", "tipo": "Gasto", "categoria": "Comida", "monto": 10}]
+    )
+    # Totales de una versión anterior o borrados: calcular los reconstruye
+    shutil.rmtree(rollups.ROLLUPS_DIR)
+
+    precalculo.guardar(precalculo.calcular("ana"))
+    assert precalculo.cargar("ana") is not None
+
+    servicio.registrar_movimientos(
+        "ana", [{"fecha": "2024-03-02", "tipo": "Gasto", "categoria": "Comida", "monto": 5}]
+    )
+    assert precalculo.cargar("ana") is None
@@ -0,0 +1,82 @@
+from dataclasses import asdict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from asesor import proyeccion
+
+
+HOY = date(2024, 3, 15)
+
+
+def diarios(desde, hasta, monto, categoria="Comida", tipo="Gasto"):
+    dias = pd.date_range(desde, hasta, freq="D")
+    return pd.DataFrame(
+        {"dia": dias, "tipo": tipo, "categoria": categoria, "monto": float(monto), "n": 1}
+    )
+
+
+def test_ritmo_constante():
+    # 10 por día hasta ayer: 14 días del mes gastados y 16 por delante
+    df = diarios("2024-01-01", "2024-03-14", 10)
+    p = proyeccion.proyectar_usuario(df, {"monthly_income": 1000, "market_budget": 200}, HOY)
+
+    assert p.gasto_mes == 140
+    assert p.gasto_diario == pytest.approx(10)
+    assert p.gasto_proyectado == pytest.approx(300)
+    assert p.por_categoria["Comida"] == pytest.approx([300, 200])
+    assert p.excesos == pytest.approx({"Comida": 100})
+    assert p.saldo_fin_mes == pytest.approx(700)
+
+
+def test_usuario_nuevo_promedia_solo_sus_dias():
+    df = diarios("2024-03-13", "2024-03-14", 20)
+    p = proyeccion.proyectar_usuario(df, {}, HOY)
+
+    assert p.gasto_diario == pytest.approx(20)
+    assert p.gasto_proyectado == pytest.approx(40 + 20 * 16)
+
+
+def test_recurrentes_pendientes_se_suman_enteros():
+    perfil = {
+        "monthly_income": 0,
+        "recurrentes": [
+            {"id": "1", "tipo": "Gasto", "categoria": "Vivienda", "monto": 500,
+             "frecuencia": "Mensual", "inicio": "2024-01-20"},
+            {"id": "2", "tipo": "Ingreso", "categoria": "Sueldo", "monto": 2000,
+             "frecuencia": "Mensual", "inicio": "2024-01-30"},
+        ],
+    }
+    p = proyeccion.proyectar_usuario(diarios("2024-03-14", "2024-03-14", 0), perfil, HOY)
+
+    assert p.gasto_mes == 0
+    assert p.por_categoria["Vivienda"] == pytest.approx([500, 0])
+    assert p.ingreso_esperado == 2000
+    assert p.saldo_fin_mes == pytest.approx(1500)
+
+
+def test_lote_igual_a_cada_usuario_por_separado():
+    totales = [
+        diarios("2024-02-01", "2024-03-14", 10),
+        pd.concat([
+            diarios("2024-03-01", "2024-03-15", 7, "Ocio"),
+            diarios("2024-03-01", "2024-03-01", 900, "Sueldo", "Ingreso"),
+        ]),
+        diarios("2024-03-10", "2024-03-10", 0).iloc[:0],
+    ]
+    perfiles = [{"market_budget": 100}, {"transport_daily": 2}, {"monthly_income": 50}]
+    juntos = pd.concat(totales, ignore_index=True)
+    juntos["usuario"] = np.repeat(np.arange(len(totales)), [len(df) for df in totales])
+
+    lote = proyeccion.proyectar(juntos, perfiles, HOY)
+    for i, (df, perfil) in enumerate(zip(totales, perfiles)):
+        solo = proyeccion.proyectar_usuario(df, perfil, HOY)
+        en_lote = asdict(lote.usuario(i))
+        solo = asdict(solo)
+        por_categoria = en_lote.pop("por_categoria")
+        assert por_categoria.keys() == solo["por_categoria"].keys()
+        for cat, valores in solo.pop("por_categoria").items():
+            assert por_categoria[cat] == pytest.approx(valores)
+        assert en_lote == pytest.approx(solo)
@@ -0,0 +1,28 @@
+from datetime import date, timedelta
+
+from asesor import servicio
+
+
+def test_terminar_antes_del_inicio_la_elimina(datos):
+    servicio.registrar_usuario("ana", "clave")
+    hoy = date.today()
+    futura = servicio.agregar_recurrente("ana", "Gasto", "Vivienda", 500, "Mensual", hoy + timedelta(days=10))
+    pasada = servicio.agregar_recurrente("ana", "Gasto", "Ocio", 10, "Semanal", date(2024, 1, 1))
+
+    servicio.terminar_recurrente("ana", futura.id)
+    servicio.terminar_recurrente("ana", pasada.id, date(2023, 12, 31))
+
+    assert servicio.obtener_recurrentes("ana") == []
+
+
+def test_terminar_conserva_las_ocurrencias_anteriores(datos):
+    servicio.registrar_usuario("ana", "clave")
+    r = servicio.agregar_recurrente("ana", "Gasto", "Ocio", 10, "Semanal", date(2024, 1, 1))
+
+    servicio.terminar_recurrente("ana", r.id, date(2024, 1, 15))
+    # Terminar más tarde no la alarga
+    servicio.terminar_recurrente("ana", r.id, date(2024, 6, 1))
+
+    [terminada] = servicio.obtener_recurrentes("ana")
+    assert terminada.fin == date(2024, 1, 15)
+    assert terminada.contar(date(2024, 1, 1), date(2024, 12, 31)) == 3
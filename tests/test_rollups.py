@@ -0,0 +1,25 @@
+from asesor import rollups, storage
+from asesor.servicio import registrar_movimientos
+
+
+def gasto(monto):
+    return {"fecha": "2024-03-01", "tipo": "Gasto", "categoria": "Comida", "monto": monto}
+
+
+def test_los_totales_incrementales_son_exactos(datos):
+    for _ in range(10):
+        registrar_movimientos("ana", [gasto(0.10)])
+
+    assert rollups.totales.leer("ana") == {"2024-03-01|Gasto|Comida": [100, 10]}
+    assert rollups.cargar("ana")["monto"].tolist() == [1.0]
+    assert rollups.verificar() == []
+
+
+def test_verificar_detecta_un_centavo_de_diferencia(datos):
+    registrar_movimientos("ana", [gasto(10)])
+    rollups.totales.escribir("ana", {"2024-03-01|Gasto|Comida": [1001, 1]})
+
+    assert rollups.verificar() == ["ana"]
+    rollups.reconstruir("ana")
+    assert rollups.verificar() == []
+    assert len(storage.load_movimientos("ana")) == 1
@@ -0,0 +1,25 @@
+import pytest
+
+from asesor import servicio, storage
+
+
+@pytest.mark.parametrize("monto", ["inf", float("-inf"), "nan", 0, -5])
+def test_movimiento_rechaza_montos_no_validos(monto):
+    with pytest.raises(ValueError):
+        servicio.movimiento("ana", "2024-01-01", "Gasto", "Otros", monto)
+
+
+@pytest.mark.parametrize("fecha", ["1500-01-01", "1899-12-31", "2101-01-01"])
+def test_movimiento_rechaza_fechas_fuera_de_rango(fecha):
+    with pytest.raises(ValueError):
+        servicio.movimiento("ana", fecha, "Gasto", "Otros", 10)
+
+
+def test_un_movimiento_rechazado_no_bloquea_la_compactacion(datos):
+    validos = [{"fecha": "2024-01-01", "tipo": "Gasto", "categoria": "Otros", "monto": 10}]
+    with pytest.raises(ValueError):
+        servicio.registrar_movimientos("ana", validos + [dict(validos[0], fecha="1500-01-01")])
+    servicio.registrar_movimientos("ana", validos)
+
+    storage.compact_movimientos()
+    assert len(storage.load_movimientos("ana")) == 1
@@ -0,0 +1,54 @@
+import pytest
+
+from asesor import esquema, historial, storage
+from asesor.sqlite_backend import SqliteStore, importar_archivos
+
+
+@pytest.fixture
+def base(tmp_path):
+    store = SqliteStore(str(tmp_path / "asesor.db"))
+    yield store
+    store.pool.cerrar()
+
+
+def gasto(monto, etiqueta=None):
+    return {
+        "username": "ana",
+        "fecha": "2024-03-01 10:00:00",
+        "tipo": "Gasto",
+        "categoria": "Comida",
+        "etiqueta": etiqueta,
+        "monto": monto,
+    }
+
+
+def test_rollup_redondea_como_el_esquema(base):
+    # 12.5 y 37.5 centavos: al par, como np.rint (SQL daría 13 + 38)
+    base.append_movimientos([gasto(0.125), gasto(0.375)])
+
+    rollup = base.rollup_diario("ana")
+    assert rollup["monto"].tolist() == [0.5]
+    assert rollup["monto"].tolist() == [esquema.pesos(base.load_movimientos("ana")).sum()]
+
+
+@pytest.mark.parametrize("backend", ["archivos", "sqlite"])
+def test_busqueda_sin_mayusculas_tambien_fuera_de_ascii(datos, monkeypatch, backend):
+    monkeypatch.setattr(storage, "BACKEND", backend)
+    storage.append_movimientos([gasto(1, "Ñandú ÁGUILA"), gasto(2, "pan"), gasto(3)])
+
+    pagina, total = historial.consultar_movimientos("ana", texto="ñandú á")
+    assert total == 1 and pagina["monto"].tolist() == [1]
+
+    pagina, _ = historial.consultar_movimientos("ana", texto="a", orden="monto")
+    assert pagina["etiqueta"].tolist() == ["pan", "Ñandú ÁGUILA"]
+    pagina, _ = historial.consultar_movimientos("ana", orden="monto", descendente=False)
+    assert pagina["etiqueta"].tolist() == ["Ñandú ÁGUILA", "pan", ""]
+
+
+def test_importar_archivos(datos, base):
+    storage.save_users({"ana": {"clave": "x"}})
+    storage.append_movimientos([gasto(1, "pan"), gasto(2)])
+
+    assert importar_archivos(base) == (1, 2)
+    assert base.load_user("ana") == {"clave": "x"}
+    assert esquema.pesos(base.load_movimientos("ana")).tolist() == [1, 2]
@@ -0,0 +1,150 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from asesor import esquema, storage
+
+
+def movimiento(monto, username="ana", fecha="2024-03-01 10:00:00"):
+    return {
+        "username": username,
+        "fecha": fecha,
+        "tipo": "Gasto",
+        "categoria": "Comida",
+        "etiqueta": "",
+        "monto": monto,
+    }
+
+
+def montos(username=None):
+    return sorted(esquema.pesos(storage.load_movimientos(username)).tolist())
+
+
+def test_append_solo_escribe_el_log(datos):
+    storage.append_movimientos([movimiento(1), movimiento(2, "bea")])
+    storage.append_movimientos([movimiento(3)])
+
+    assert os.path.exists(storage.MOV_LOG_FILE)
+    assert not os.path.exists(storage.MOV_FILE)
+    assert montos("ana") == [1, 3]
+    assert montos() == [1, 2, 3]
+
+
+def test_compactar_fusiona_el_log_con_la_base(datos):
+    storage.append_movimientos([movimiento(1), movimiento(2, "bea")])
+    assert storage.compact_movimientos() == 2
+    storage.append_movimientos([movimiento(3)])
+    assert storage.compact_movimientos() == 1
+
+    assert not os.path.exists(storage.MOV_LOG_FILE)
+    assert montos() == [1, 2, 3]
+    assert storage.compact_movimientos() == 0
+
+
+def test_compactacion_en_segundo_plano_al_llenarse_el_log(datos, monkeypatch):
+    monkeypatch.setattr(storage, "COMPACTAR_CADA", 3)
+    storage.append_movimientos([movimiento(1), movimiento(2)])
+    assert storage._hilo_compactacion is None or not storage._hilo_compactacion.is_alive()
+    hilo_anterior = storage._hilo_compactacion
+
+    storage.append_movimientos([movimiento(3)])
+    assert storage._hilo_compactacion is not hilo_anterior
+    storage._hilo_compactacion.join(timeout=30)
+
+    assert not os.path.exists(storage.MOV_LOG_FILE)
+    assert montos("ana") == [1, 2, 3]
+
+
+def test_una_compactacion_a_medias_se_retoma(datos):
+    storage.append_movimientos([movimiento(1)])
+    storage.compact_movimientos()
+    storage.append_movimientos([movimiento(2)])
+    # Proceso interrumpido tras apartar el log
+    os.replace(storage.MOV_LOG_FILE, storage.MOV_COMPACTANDO_FILE)
+    storage.append_movimientos([movimiento(3)])
+    assert montos() == [1, 2, 3]
+
+    assert storage.compact_movimientos() == 1
+    assert storage.compact_movimientos() == 1
+    assert not os.path.exists(storage.MOV_COMPACTANDO_FILE)
+    assert montos() == [1, 2, 3]
+
+
+def test_indice_por_usuario_y_mes(datos):
+    # Meses calientes: quedan en la base, con su rango de bytes en el índice
+    mes = pd.Timestamp.today().normalize().replace(day=1)
+    anterior = mes - pd.DateOffset(months=1)
+    storage.append_movimientos([
+        movimiento(1, fecha=anterior + pd.Timedelta(days=3)),
+        movimiento(2, fecha=mes + pd.Timedelta(hours=1)),
+        movimiento(5, "bea", fecha=mes),
+    ])
+    storage.compact_movimientos()
+
+    with open(storage.MOV_INDEX_FILE, encoding="utf-8") as f:
+        indice = json.load(f)
+    assert sorted(indice["usuarios"]) == ["ana", "bea"]
+    assert [m for m, _ in indice["usuarios"]["ana"]["meses"]] == [
+        anterior.strftime("%Y-%m"), mes.strftime("%Y-%m")
+    ]
+
+    assert montos("ana") == [1, 2]
+    assert esquema.pesos(storage.load_movimientos("ana", desde=mes)).tolist() == [2]
+    hasta = anterior + pd.Timedelta(days=3)
+    assert esquema.pesos(storage.load_movimientos("ana", hasta=hasta)).tolist() == [1]
+    assert storage.load_movimientos("ana", desde=mes, hasta=mes - pd.Timedelta(days=1)).empty
+    assert storage.load_movimientos("carla").empty
+
+
+def test_leer_un_usuario_no_toca_las_filas_de_otros(datos):
+    fecha = pd.Timestamp.today().normalize()
+    storage.append_movimientos([movimiento(1, fecha=fecha), movimiento(2, "bea", fecha=fecha)])
+    storage.compact_movimientos()
+
+    with open(storage.MOV_INDEX_FILE, encoding="utf-8") as f:
+        entrada = json.load(f)["usuarios"]["bea"]
+    inicio, fin = entrada["meses"][0][1], entrada["fin"]
+    # Si se leyera la base entera, el bloque roto de "bea" haría fallar el parseo
+    with open(storage.MOV_FILE, "r+b") as f:
+        f.seek(inicio)
+        f.write(b'"' * (fin - inicio))
+    storage.limpiar_cache()
+
+    assert montos("ana") == [1]
+
+
+def test_archivo_en_el_formato_de_la_base(datos, monkeypatch):
+    pytest.importorskip("pyarrow")
+    hoy = pd.Timestamp.today().normalize()
+    storage.append_movimientos([
+        movimiento(1, fecha="2024-01-10"),
+        movimiento(2, "bea", fecha="2024-01-11"),
+        movimiento(3, fecha="2024-02-01"),
+        movimiento(4, fecha=hoy),
+    ])
+
+    def extensiones():
+        return sorted({n.split(".", 2)[2] for n in os.listdir(storage.ARCHIVO_DIR)})
+
+    storage.compact_movimientos()
+    assert extensiones() == ["csv.gz", "idx.json"]
+
+    # La migración también reescribe los meses archivados
+    storage.compact_movimientos("arrow")
+    monkeypatch.setattr(storage, "MOV_BACKEND", "arrow")
+    assert extensiones() == ["arrow", "idx.json"]
+    assert montos("ana") == [1, 3, 4]
+    assert montos("bea") == [2]
+    assert montos() == [1, 2, 3, 4]
+    por_mes = [esquema.pesos(p).tolist() for p in storage.iterar_movimientos("ana")]
+    assert por_mes == [[1], [3], [4]]
+
+    # Los meses que se cierran después se archivan en arrow
+    storage.save_movimientos(storage.load_movimientos())
+    assert extensiones() == ["arrow", "idx.json"]
+    storage.compact_movimientos("csv")
+    monkeypatch.setattr(storage, "MOV_BACKEND", "csv")
+    assert extensiones() == ["csv.gz", "idx.json"]
+    assert montos() == [1, 2, 3, 4]